@@ -13,6 +13,10 @@ class Config:
     REDIS_DB = int(os.getenv('DB', 1))
     REDIS_SOCKET_TIMEOUT = int(os.getenv('SOCKET_TIMEOUT', 5))
     REDIS_TIMEOUT = int(os.getenv('TIMEOUT', 5))
+    # 进程内共享连接池：最大连接数、连接全部借出时等待归还的最长秒数、空闲连接健康检查间隔（秒）
+    REDIS_POOL_MAX_CONNECTIONS = int(os.getenv('REDIS_POOL_MAX_CONNECTIONS', 50))
+    REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', 5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-here')
     
     # 权限管理Redis配置（与主配置保持一致，避免数据库不匹配）
@@ -26,4 +30,52 @@ class Config:
     APP_PORT = int(os.getenv('APP_PORT', 8075))
     
     # 日志配置
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
\ No newline at end of file
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+    # 数据拉取并发配置（每日因子刷新）
+    FETCH_MAX_WORKERS = int(os.getenv('FETCH_MAX_WORKERS', 6))
+    # 各数据源每秒最大请求数，<=0 表示不限速
+    PYWENCAI_RATE_LIMIT = float(os.getenv('PYWENCAI_RATE_LIMIT', 2))
+    TUSHARE_RATE_LIMIT = float(os.getenv('TUSHARE_RATE_LIMIT', 1))
+    # 题材历史回补（main.py theme-backfill）的并发数，限速沿用 TUSHARE_RATE_LIMIT
+    THEME_BACKFILL_WORKERS = int(os.getenv('THEME_BACKFILL_WORKERS', 4))
+
+    # Redis 批量写入时每条命令/每个 pipeline 分块携带的成员数
+    REDIS_WRITE_CHUNK_SIZE = int(os.getenv('REDIS_WRITE_CHUNK_SIZE', 1000))
+
+    # 数据版本切换后延迟多少秒回收旧版本（给进行中的请求留出时间）
+    VERSION_RECLAIM_DELAY = int(os.getenv('VERSION_RECLAIM_DELAY', 30))
+
+    # 定时任务是否以增量方式更新因子集合（只应用 SADD/SREM 差量，不重建版本）
+    INGEST_INCREMENTAL = os.getenv('INGEST_INCREMENTAL', 'false').lower() in ('1', 'true', 'yes')
+
+    # 上游原始响应的本地缓存（按交易日分目录），重跑/补数时直接读盘
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join(PROJECT_ROOT, 'backend', 'data', 'cache'))
+    RESPONSE_CACHE_RETENTION_DAYS = int(os.getenv('RESPONSE_CACHE_RETENTION_DAYS', 7))
+
+    # 导入运行性能报告（meta:ingest:{run_id} 保留天数、JSON 报告目录）
+    INGEST_REPORT_TTL_DAYS = int(os.getenv('INGEST_REPORT_TTL_DAYS', 30))
+    INGEST_REPORT_DIR = os.getenv('INGEST_REPORT_DIR', os.path.join(PROJECT_ROOT, 'backend', 'data', 'reports'))
+    # 导入时是否用 tracemalloc 记录内存峰值（会拖慢每一次内存分配，只在排查内存问题时开启）
+    INGEST_TRACE_MEMORY = os.getenv('INGEST_TRACE_MEMORY', 'false').lower() in ('1', 'true', 'yes')
+
+    # 因子/题材/指标集合同时维护位图（bm:*），筛选时用 BITOP AND 求交集
+    BITMAP_INDEX_ENABLED = os.getenv('BITMAP_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # 每日全市场快照（Parquet，每个交易日一个文件）
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(PROJECT_ROOT, 'backend', 'data', 'snapshots'))
+
+    # 进程内筛选引擎：从每日快照加载 NumPy 数组回答 /stock/filter/*，未加载时回退到 Redis
+    SCREEN_ENGINE_ENABLED = os.getenv('SCREEN_ENGINE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # 版本切换热加载：Web 进程订阅版本事件，在后台线程中预加载并替换进程内数据
+    HOT_RELOAD_ENABLED = os.getenv('HOT_RELOAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    HOT_RELOAD_RETRY_SECONDS = int(os.getenv('HOT_RELOAD_RETRY_SECONDS', 5))
+
+    # 服务端 Lua 筛选：引擎不可用时，集合求交和字段投影在一次 EVALSHA 中完成
+    # 脚本内按版本指针拼出数据键，只支持单实例 Redis，Redis Cluster 下需关闭
+    LUA_SCREEN_ENABLED = os.getenv('LUA_SCREEN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # 交集缓存（cache:inter:*）的过期时间（秒），<=0 表示不缓存
+    INTERSECT_CACHE_TTL = int(os.getenv('INTERSECT_CACHE_TTL', 300))
\ No newline at end of file
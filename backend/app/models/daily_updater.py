@@ -2,30 +2,55 @@ import schedule
 import time
 from datetime import datetime
 
-from ..services.data_service import main as update_factors
+from ..config import Config
+from ..services.data_service import main as update_factors, connect_redis
+from ..services.ingest_profiler import IngestProfiler
+from ..services.universe_snapshot import write_snapshot
 from ...data.sources.kaipanla.theme_to_redis import theme_to_redis
 
-def update_all_data():
+def update_all_data(incremental: bool | None = None):
     """
     每日更新所有数据：题材、技术面、资金面、基本面因子及指标
+    incremental:bool 因子是否增量更新，默认取 Config.INGEST_INCREMENTAL
     """
+    if incremental is None:
+        incremental = Config.INGEST_INCREMENTAL
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始每日数据更新...")
+    # 题材和因子两个阶段共用一份性能记录，结束后统一保存
+    profiler = IngestProfiler()
     
     try:
         # 1. 更新题材数据
         print("正在更新题材数据...")
-        theme_to_redis()
+        theme_to_redis(profiler=profiler)
         print("题材数据更新完成")
         
         # 2. 更新因子和指标数据
         print("正在更新因子和指标数据...")
-        update_factors()
+        update_factors(incremental=incremental, profiler=profiler)
         print("因子和指标数据更新完成")
+
+        # 3. 生成当日全市场快照
+        print("正在生成全市场快照...")
+        r = connect_redis()
+        try:
+            with profiler.step('universe_snapshot'):
+                write_snapshot(r)
+        finally:
+            r.close()
         
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 每日数据更新完成")
         
     except Exception as e:
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 数据更新失败: {e}")
+    finally:
+        try:
+            r = connect_redis()
+            report = profiler.save(r)
+            r.close()
+            print(f"本次导入 {profiler.run_id} 共 {len(report['steps'])} 个步骤，耗时 {report['wall_s']}s")
+        except Exception as e:
+            print(f"保存导入报告失败: {e}")
 
 def main():
     # 设置每天8:30执行更新任务
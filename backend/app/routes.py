@@ -2,14 +2,27 @@ from flask import request, jsonify
 from .services.info_service import (
     get_factors_info, get_themes_info, get_multi_theme_and_factor_all_info,
     get_detail_info_by_code, get_themes_key, get_zhibiao_info, 
-    get_zhibiao_factor_theme_info
+    get_zhibiao_factor_theme_info, get_factor_catalog, get_ingest_report, get_stock_themes,
+    get_theme_stocks, get_redis_pool_stats, get_screen_count, get_filter_page
 )
+from .services.hot_reload import current_versions, start_listener
+from .services.screen_engine import preload_engine
+from .services.lua_scripts import preload_scripts
 from .utils import generate_token
 from flask import Blueprint
 
 main = Blueprint('main', __name__)
 
 
+# 蓝图注册时预加载筛选引擎和 Lua 脚本，并订阅版本事件以便数据更新后热加载
+# （在本模块中启动，保证与路由使用的是同一份服务模块）
+@main.record_once
+def start_hot_reload(state):
+    preload_scripts()
+    preload_engine()
+    start_listener()
+
+
 # 健康检查
 @main.route('/health', methods=['GET'])
 def health_check():
@@ -97,28 +110,61 @@ def login():
     })
 
 
+# 筛选接口的分页参数：limit / offset / cursor（上一页返回的 next_cursor）/ sort_by / order，
+# 以及指标区间 ranges（[{metric, min, max}]，只在分页模式下支持）；都未传时保持原有的全量返回
+FILTER_PAGE_PARAMS = ('limit', 'offset', 'cursor', 'sort_by', 'ranges')
+
+
+def filter_page_response(kind, data, themes=None, factors=None, zhibiao=None):
+    """
+    请求带分页参数或指标区间时返回分页筛选的响应（按 sort_by 排序，只读取当页行），否则返回 None
+    """
+    if not any(data.get(name) is not None for name in FILTER_PAGE_PARAMS):
+        return None
+    order = data.get('order', 'desc')
+    if order not in ('desc', 'asc'):
+        return jsonify({'code': 400, 'error': '排序参数不正确'}), 400
+    try:
+        offset = max(int(data.get('cursor') or data.get('offset') or 0), 0)
+        limit = min(max(int(data.get('limit') or 50), 1), 500)
+    except (TypeError, ValueError):
+        return jsonify({'code': 400, 'error': '分页参数不正确'}), 400
+    try:
+        result = get_filter_page(kind, themes, factors, zhibiao, data.get('sort_by'), order, offset, limit,
+                                 data.get('ranges'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'error': str(e)}), 400
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
+
+
 # 因子筛选
 @main.route('/stock/filter/factors', methods=['POST'])
 def get_factors_info_route():
     data = request.get_json()
     factors = data.get('factors')
+    paged = filter_page_response('factors', data, factors=factors)
+    if paged is not None:
+        return paged
     result = get_factors_info(factors)
-    return jsonify({'code': 200, 'data': result})
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
 
 
 # 获取所有题材列表
 @main.route('/theme/list', methods=['GET'])
 def get_all_themes_route():
     themes = get_themes_key()
-    return jsonify({'themes': themes})
+    return jsonify({'themes': themes, 'version': current_versions()})
 
 # 题材筛选
 @main.route('/stock/filter/themes', methods=['POST'])
 def get_themes_info_route():
     data = request.get_json()
     themes = data.get('themes')
+    paged = filter_page_response('themes', data, themes=themes)
+    if paged is not None:
+        return paged
     result = get_themes_info(themes)
-    return jsonify({'code': 200, 'data': result})
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
 
 
 # 题材和因子筛选
@@ -127,8 +173,11 @@ def get_multi_theme_and_factor_all_info_route():
     data = request.get_json()
     themes = data.get('themes')
     factors = data.get('factors')
+    paged = filter_page_response('themes-and-factors', data, themes, factors)
+    if paged is not None:
+        return paged
     result = get_multi_theme_and_factor_all_info(themes, factors)
-    return jsonify({'code': 200, 'data': result})
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
 
 
 # 股票详情
@@ -150,6 +199,65 @@ def get_detail_info_by_code_route():
     return jsonify({'code': 200, 'data': result})
 
 
+# 只返回筛选结果数量（题材 / 因子 / 特色指标任意组合求交）
+@main.route('/stock/filter/count', methods=['POST'])
+def get_screen_count_route():
+    """
+    入参：themes - 题材列表；factors - 因子列表；zhibiao - 特色指标名称；
+         ranges - 指标区间列表 [{metric, min, max}]（均可选，至少一个）
+    返回：交集中的股票数量
+    """
+    data = request.get_json() or {}
+    themes = data.get('themes') or []
+    factors = data.get('factors') or []
+    zhibiao = data.get('zhibiao')
+    ranges = data.get('ranges') or []
+    if not (themes or factors or zhibiao or ranges):
+        return jsonify({'code': 400, 'error': '筛选条件不能为空'}), 400
+    try:
+        count = get_screen_count(themes, factors, zhibiao, ranges)
+    except ValueError as e:
+        return jsonify({'code': 400, 'error': str(e)}), 400
+    if count is None:
+        return jsonify({'code': 500, 'error': '统计筛选结果数量失败，请稍后再试'}), 500
+    return jsonify({'code': 200, 'data': {'count': count}, 'version': current_versions()})
+
+
+# 题材成分股分页（服务端排序）
+@main.route('/theme/stocks', methods=['GET'])
+def get_theme_stocks_route():
+    """
+    入参：theme - 题材名；sort_by - hot_num / code；order - desc / asc；page、page_size - 分页
+    返回：当前页成分股明细及成分股总数
+    """
+    theme = request.args.get('theme')
+    if not theme:
+        return jsonify({'code': 400, 'error': '题材名称不能为空'}), 400
+    sort_by = request.args.get('sort_by', 'hot_num')
+    order = request.args.get('order', 'desc')
+    if sort_by not in ('hot_num', 'code') or order not in ('desc', 'asc'):
+        return jsonify({'code': 400, 'error': '排序参数不正确'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', 50, type=int), 1), 500)
+    result = get_theme_stocks(theme, sort_by, order, page, page_size)
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
+
+
+# 个股所属题材（个股画像）
+@main.route('/stock/themes', methods=['POST'])
+def get_stock_themes_route():
+    """
+    入参：codes - 股票代码列表（或 code - 单个股票代码）
+    返回：每只股票所属的全部题材明细
+    """
+    data = request.get_json()
+    codes = data.get('codes') or ([data['code']] if data.get('code') else [])
+    if not codes:
+        return jsonify({'code': 400, 'error': '股票代码不能为空'}), 400
+    result = get_stock_themes(codes)
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
+
+
 # 特色指标查询
 @main.route('/stock/filter/zhibiao', methods=['POST'])
 def get_zhibiao_info_route():
@@ -162,8 +270,11 @@ def get_zhibiao_info_route():
     zhibiao = data.get('zhibiao')
     if not zhibiao:
         return jsonify({'code': 400, 'error': '特色指标名称不能为空'}), 400
+    paged = filter_page_response('zhibiao', data, zhibiao=zhibiao)
+    if paged is not None:
+        return paged
     result = get_zhibiao_info(zhibiao)
-    return jsonify({'code': 200, 'data': result})
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
 
 
 # 特色指标 + 题材 + 因子 交集筛选
@@ -175,5 +286,30 @@ def get_zhibiao_theme_factor_route():
     factors = data.get('factors') or []
     if not zhibiao:
         return jsonify({'code': 400, 'error': '特色指标名称不能为空'}), 400
+    paged = filter_page_response('themes-factors-zhibiao', data, themes, factors, zhibiao)
+    if paged is not None:
+        return paged
     result = get_zhibiao_factor_theme_info(zhibiao, themes, factors)
+    return jsonify({'code': 200, 'data': result, 'version': current_versions()})
+
+
+# 因子目录：每个因子集合的大小和更新时间
+@main.route('/meta/factors', methods=['GET'])
+def get_factor_catalog_route():
+    return jsonify({'code': 200, 'data': get_factor_catalog()})
+
+
+# 当前 worker 进程的 Redis 连接池使用情况
+@main.route('/meta/redis-pool', methods=['GET'])
+def get_redis_pool_stats_route():
+    return jsonify({'code': 200, 'data': get_redis_pool_stats()})
+
+
+# 导入运行性能报告（默认最近一次）
+@main.route('/meta/ingest', methods=['GET'])
+def get_ingest_report_route():
+    run_id = request.args.get('run_id')
+    result = get_ingest_report(run_id)
+    if not result:
+        return jsonify({'code': 404, 'error': '导入报告不存在'}), 404
     return jsonify({'code': 200, 'data': result})
@@ -11,7 +11,14 @@ from .info_service import (
     get_detail_info_by_code,
     get_themes_key,
     get_zhibiao_info,
-    get_zhibiao_factor_theme_info
+    get_zhibiao_factor_theme_info,
+    get_factor_catalog,
+    get_ingest_report,
+    get_stock_themes,
+    get_theme_stocks,
+    get_redis_pool_stats,
+    get_screen_count,
+    get_filter_page
 )
 
 __all__ = [
@@ -23,5 +30,12 @@ __all__ = [
     'get_detail_info_by_code',
     'get_themes_key',
     'get_zhibiao_info',
-    'get_zhibiao_factor_theme_info'
+    'get_zhibiao_factor_theme_info',
+    'get_factor_catalog',
+    'get_ingest_report',
+    'get_stock_themes',
+    'get_theme_stocks',
+    'get_redis_pool_stats',
+    'get_screen_count',
+    'get_filter_page'
 ]
@@ -0,0 +1,170 @@
+import threading
+import uuid
+
+import numpy as np
+
+# 股票代码 <-> 稠密整数ID 字典（全局、不随数据版本变化，ID 只增不改）
+CODE_TO_ID_KEY = 'meta:ids:code'
+ID_TO_CODE_KEY = 'meta:ids:id'
+ID_SEQ_KEY = 'meta:ids:seq'
+# ID字典的纪元标识：首次分配ID时随机生成，字典被清空后重新分配会得到新的标识
+ID_EPOCH_KEY = 'meta:ids:epoch'
+
+# 进程内的 ID 字典缓存
+# _stamp 为缓存对应的 (meta:ids:epoch, meta:ids:seq)；Redis 中的值不同时（其他进程分配了新ID、FLUSH、
+# 从备份恢复）整体丢弃缓存，避免ID字典被重置后位图解码成错误的股票代码
+_lock = threading.Lock()
+_code_to_id = {}
+_id_to_code = []
+_stamp = None
+
+
+def bitmap_key(prefix: str, key: str) -> str:
+    """集合键对应的位图键，如 ('v3:', 'factor:MACD_金叉') -> 'v3:bm:factor:MACD_金叉'"""
+    return f"{prefix}bm:{key}"
+
+
+def _remember(mapping: dict) -> None:
+    with _lock:
+        for code, id_ in mapping.items():
+            _code_to_id[code] = id_
+            if id_ >= len(_id_to_code):
+                _id_to_code.extend([None] * (id_ + 1 - len(_id_to_code)))
+            _id_to_code[id_] = code
+
+
+def _check_stamp(epoch, seq) -> None:
+    """Redis 中的 ID 字典标识（纪元 + 序号）与缓存对应的值不同时清空进程内缓存"""
+    global _stamp
+    stamp = (epoch.decode() if isinstance(epoch, bytes) else epoch, None if seq is None else int(seq))
+    with _lock:
+        if stamp != _stamp:
+            _code_to_id.clear()
+            _id_to_code.clear()
+            _stamp = stamp
+
+
+def ensure_ids(r, codes) -> dict:
+    """
+    获取股票代码对应的稠密ID，不存在的代码按顺序分配新ID
+    使用 HSETNX 保证并发导入时同一代码只有一个ID
+    r:redis.Redis 连接对象
+    codes: 股票代码列表
+    返回:dict 代码 -> ID
+    """
+    codes = list(dict.fromkeys(codes))
+    _check_stamp(*r.mget(ID_EPOCH_KEY, ID_SEQ_KEY))
+    result = {code: _code_to_id[code] for code in codes if code in _code_to_id}
+    unknown = [code for code in codes if code not in result]
+    if not unknown:
+        return result
+
+    existing = r.hmget(CODE_TO_ID_KEY, unknown)
+    found = {code: int(id_) for code, id_ in zip(unknown, existing) if id_ is not None}
+    missing = [code for code in unknown if code not in found]
+    if missing:
+        end = int(r.incrby(ID_SEQ_KEY, len(missing)))
+        pipe = r.pipeline(transaction=False)
+        pipe.set(ID_EPOCH_KEY, uuid.uuid4().hex, nx=True)
+        for offset, code in enumerate(missing):
+            pipe.hsetnx(CODE_TO_ID_KEY, code, end - len(missing) + offset)
+        pipe.execute()
+        # 以 HSETNX 的胜出者为准（并发导入时可能被其他进程抢先分配）
+        winners = r.hmget(CODE_TO_ID_KEY, missing)
+        assigned = {code: int(id_) for code, id_ in zip(missing, winners)}
+        r.hset(ID_TO_CODE_KEY, mapping={id_: code for code, id_ in assigned.items()})
+        found.update(assigned)
+
+    _remember(found)
+    result.update(found)
+    return result
+
+
+def encode_bitmap(ids) -> bytes:
+    """将ID列表编码为 Redis 位图（第 0 位为首字节最高位，与 SETBIT 一致）"""
+    ids = np.asarray(list(ids), dtype=np.int64)
+    if ids.size == 0:
+        return b''
+    bits = np.zeros(int(ids.max()) + 1, dtype=bool)
+    bits[ids] = True
+    return np.packbits(bits).tobytes()
+
+
+def decode_bitmap(data) -> np.ndarray:
+    """将 Redis 位图解码为置位的ID数组"""
+    if not data:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8)))
+
+
+def write_bitmap(r, key: str, codes) -> int:
+    """
+    将集合成员整体写成位图（一次 SET，覆盖旧值）
+    r:redis.Redis 连接对象
+    key:str 位图键
+    codes: 完整的股票代码列表
+    返回:int 命令数
+    """
+    ids = ensure_ids(r, codes)
+    r.set(key, encode_bitmap(ids.values()))
+    return 1
+
+
+def write_bitmaps(r, groups: dict, chunk_size: int = 1000) -> int:
+    """
+    批量写入多个位图：一次性分配全部代码的ID，SET 命令分块通过非事务 pipeline 发送
+    r:redis.Redis 连接对象
+    groups:dict 位图键 -> 完整的股票代码列表
+    chunk_size:int 每次发送的命令数
+    返回:int 命令数
+    """
+    ids = ensure_ids(r, [code for codes in groups.values() for code in codes])
+    pipe = r.pipeline(transaction=False)
+    for key, codes in groups.items():
+        pipe.set(key, encode_bitmap([ids[code] for code in codes]))
+        if len(pipe) >= chunk_size:
+            pipe.execute()
+    if len(pipe):
+        pipe.execute()
+    return len(groups)
+
+
+def ids_to_codes(r, ids, stamp=None) -> set:
+    """
+    将ID数组转换为股票代码集合（本地缓存未覆盖的ID从 Redis 补齐）
+    stamp:list 与位图同一次读取的 [meta:ids:epoch, meta:ids:seq]，不传时单独读取；与缓存不一致时先清空缓存
+    """
+    ids = [int(i) for i in ids]
+    if not ids:
+        return set()
+    _check_stamp(*(r.mget(ID_EPOCH_KEY, ID_SEQ_KEY) if stamp is None else stamp))
+    if max(ids) >= len(_id_to_code) or any(_id_to_code[i] is None for i in ids):
+        mapping = r.hgetall(ID_TO_CODE_KEY) or {}
+        _remember({(c.decode() if isinstance(c, bytes) else c): int(i) for i, c in mapping.items()})
+    return {_id_to_code[i] for i in ids if i < len(_id_to_code) and _id_to_code[i] is not None}
+
+
+def bitmap_intersect(raw, keys: list):
+    """
+    用位图计算多个集合的交集：MGET ID字典标识 + EXISTS + BITOP AND + GET + DEL 在一次事务往返中完成
+    raw:redis.Redis 不解码响应的连接（位图为二进制）
+    keys:list 位图键
+    返回:set 股票代码集合；任一位图不存在（旧数据未建位图）时返回 None，由调用方回退到集合
+    """
+    if not keys:
+        return None
+    pipe = raw.pipeline(transaction=True)
+    pipe.mget(ID_EPOCH_KEY, ID_SEQ_KEY)
+    pipe.exists(*keys)
+    if len(keys) == 1:
+        pipe.get(keys[0])
+    else:
+        dest = f"tmp:bitop:{uuid.uuid4().hex}"
+        pipe.bitop('AND', dest, *keys)
+        pipe.get(dest)
+        pipe.delete(dest)
+    stamp, found, *results = pipe.execute()
+    if found != len(keys):
+        return None
+    data = results[0] if len(keys) == 1 else results[1]
+    return ids_to_codes(raw, decode_bitmap(data), stamp)
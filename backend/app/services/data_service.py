@@ -1,40 +1,103 @@
 import pywencai
-import redis
 import time
-import pandas as pd
 from ..config import Config
+from .fetch_pool import FetchPool
+from .response_cache import cached_fetch, prune_cache
+from .ingest_profiler import IngestProfiler, count_rows, count_members, update_factor_catalog
+from .redis_writer import extract_codes, select_columns, bulk_sadd, bulk_hset, sync_set
+from .factor_buckets import METRIC_BUCKETS, assign_buckets
+from .bitmap_index import bitmap_key, write_bitmap
+from .metric_index import metric_members, write_metrics
+from .query_planner import bump_content_epoch
+from .redis_pool import get_client
+from .keyspace import (
+    allocate_version, version_prefix, get_active_version, get_active_prefix, publish_version, discard_version
+)
 
 config = Config()
 
 # 当前日期
-date = '20250915'
 now_date = time.strftime('%Y%m%d', time.localtime(time.time()))
 # 新日期
 new_date =20250630
 
-def connect_redis():
+def connect_redis(decode_responses: bool = True):
     """
-    连接Redis数据库
-    host:str 主机名
-    port:int 端口
-    db:int 数据库
-    password:str 密码
-    socket_timeout:int 超时时间
+    从进程内共享的连接池借用 Redis 客户端（见 redis_pool），不再每次新建 TCP 连接和 AUTH
+    连接参数取自 Config；调用方用完后 close() 只会归还连接
+    decode_responses:bool 是否将响应解码为字符串（读取位图等二进制数据时传 False）
     返回:redis.Redis 连接对象
     """
     try:
-        return redis.Redis(
-            host=config.REDIS_LOCALHOST,
-            port=config.REDIS_PORT, 
-            db=config.REDIS_DB,
-            password=config.REDIS_PASSWORD,
-            socket_timeout=config.REDIS_SOCKET_TIMEOUT,
-            decode_responses=True
-        )
+        return get_client(decode_responses)
     except Exception as e:
         print(f"连接redis失败: {e}")
         exit(1)
 
+def fetch_wencai(query: str):
+    """
+    通过 pywencai 拉取查询结果（在拉取线程池中执行）
+    同一交易日内重复拉取直接读取本地缓存
+    query:str 查询语句
+    返回:DataFrame 或 dict
+    """
+    return cached_fetch('pywencai', query, None, lambda: pywencai.get(
+        query=query, sort_key=query, sort_order='asc', loop=True))
+
+def write_set(r, key: str, codes: list, incremental: bool = False, prefix: str = '') -> dict:
+    """
+    写入集合成员，并同步维护对应的位图（bm:{key}）
+    key:str 不含版本前缀的集合键名，如 factor:MACD_金叉
+    incremental:bool True 时与线上集合做差集，只应用 SADD/SREM 增量；否则直接批量 SADD
+    prefix:str 版本键前缀
+    """
+    if incremental:
+        stats = sync_set(r, f"{prefix}{key}", codes)
+    else:
+        stats = bulk_sadd(r, f"{prefix}{key}", codes)
+    if config.BITMAP_INDEX_ENABLED:
+        stats['commands'] += write_bitmap(r, bitmap_key(prefix, key), codes)
+    return stats
+
+def write_code_set(r, key: str, name: str, df, label: str, incremental: bool = False, prefix: str = ''):
+    """
+    将拉取结果中的整列股票代码一次性写入集合
+    r:redis.Redis 连接对象
+    key:str 不含版本前缀的集合键名
+    name:str 因子/指标名称
+    df: 拉取结果（DataFrame 或 dict）
+    label:str 因子类别，仅用于日志
+    incremental:bool 是否以增量方式同步
+    prefix:str 版本键前缀
+    返回:dict 写入统计，失败返回 None（增量模式下拉取结果不可用时也返回 None，线上集合保持原样）
+    """
+    try:
+        codes = extract_codes(df, name)
+        if codes is None:
+            if incremental:
+                print(f"{name} 拉取结果不可用，保持线上集合不变")
+                return None
+            codes = []
+        if not codes and not incremental:
+            print(f"{name} 为空")
+            return {'added': 0, 'existing': 0, 'commands': 0}
+        return write_set(r, key, codes, incremental, prefix)
+    except Exception as e:
+        print(f"处理{label} {name} 失败: {e}")
+        return None
+
+def write_technical_factor(r, factor, df, prefix: str = '', incremental: bool = False):
+    """
+    将技术面因子结果写入redis
+    r:redis.Redis 连接对象
+    factor:str 因子名称
+    df:DataFrame 拉取结果
+    prefix:str 版本键前缀
+    incremental:bool 是否以增量方式同步
+    返回:dict 写入统计
+    """
+    return write_code_set(r, f"factor:{factor}", factor, df, '技术面因子', incremental, prefix)
+
 def technical2factor(factor):
     """ 
     获取技术面因子并且写入redis
@@ -43,260 +106,110 @@ def technical2factor(factor):
     """
     try:
         r = connect_redis()
-        df = pywencai.get(query=factor, sort_key=factor, sort_order='asc', loop=True)
-        if df is not None and 'code' in df.columns and df['code'] is not None:
-            for code in df['code']:
-                if code is not None and code != '':
-                    if code not in r.smembers(f"factor:{factor}"):
-                        r.sadd(f"factor:{factor}", code)
-                    else: 
-                        print(f"{code} 已存在")
-        else:
-            print(f"{factor} 为空")
+        write_technical_factor(r, factor, fetch_wencai(factor), get_active_prefix(r))
         r.close()
     except Exception as e:
         print(f"处理技术面因子 {factor} 失败: {e}")
 
-def capital2code(factor) -> None:
+def write_capital_factor(r, factor, df, prefix: str = '', incremental: bool = False):
     """
-    获取资金面因子并且写入redis
+    将资金面因子结果写入redis
+    r:redis.Redis 连接对象
     factor:str 因子名称
-    返回:None
+    df:DataFrame 拉取结果
+    prefix:str 版本键前缀
+    incremental:bool 是否以增量方式同步
+    返回:dict 写入统计
     """
-    try:
-        r = connect_redis()
-        df = pywencai.get(query=factor, sort_key=factor, sort_order='asc', loop=True)
-        
-        if df is None:
-            print(f"{factor} 为空")
-            return
-            
-        # 添加类型检查
-        if isinstance(df, dict):
-            print(f"{factor} 返回的是字典格式，需要特殊处理")
-            # 处理字典格式的数据
-            return
-        elif not hasattr(df, 'iterrows'):
-            print(f"{factor} 数据类型不支持: {type(df)}")
-            return
-            
-        # 原有的 DataFrame 处理逻辑
-        column = f'dde{factor}[{date}]'
-        if column in df.columns:
-            for _, row in safe_iterate_data(df, factor):
-                if row['code'] != '' and row[column] != '':
-                    if factor not in r.hkeys(f"code:{row['code']}"):
-                        r.hset(f"code:{row['code']}", mapping={factor: row[column]})
-                    else: 
-                        print(f"{row['code']} {factor} 已存在")
-                else:
-                    print(f"{row['code']} {factor} 为空")
-        r.close()
-    except Exception as e:
-        print(f"处理资金面因子 {factor} 失败: {e}")
+    return write_code_set(r, f"factor:{factor}", factor, df, '资金面因子', incremental, prefix)
+
+# 基本面查询 -> {源列名: code:{code} 哈希中的字段名}
+fundamental_queries = {
+    '净利润': {f'归属于母公司所有者的净利润[{new_date}]': '净利润'},
+    'ROE': {f'净资产收益率roe(加权,公布值)[{new_date}]': 'ROE'},
+    '销售毛利率': {
+        f'销售毛利率[{new_date}]': '销售毛利率',
+        f'营业收入[{new_date}]': '营业收入',
+        '股票简称': '股票简称',
+    },
+    '资产负债率': {f'资产负债率[{new_date}]': '资产负债率'},
+    '市净率': {f'市净率(pb)[{now_date}]': '市净率', f'市盈率(pe)[{now_date}]': '市盈率'},
+}
+
+# 资金面数值查询 -> {源列名: 字段名}，一次拉取全部股票的当日数值，区间因子在本地划分
+# 列名为 dde{指标}[日期]；结果中没有该列时改用 capital_factors 的区间查询（见 capital_fallback_jobs）
+capital_queries = {metric: {f'dde{metric}[{now_date}]': metric} for metric in ['陆股通净流入', '大单净额', '大单净量']}
 
-def capital2factor(factor) -> None:
+# 写入 code:{code} 哈希和 metric:{字段} 有序集合的全部数值查询
+code_queries = {**fundamental_queries, **capital_queries}
+
+def write_fundamental_code(r, query, df, prefix: str = '', incremental: bool = False):
     """
-    获取资金面因子并且写入redis
-    factor:str 因子名称
-    返回:None
+    将基本面、资金面数值查询结果按列写入 code:{code} 哈希（每个代码一条 HSET）和 metric:{字段} 有序集合，
+    并按 METRIC_BUCKETS 在本地划分区间，写入 factor:{指标}_{区间} 集合
+    r:redis.Redis 连接对象
+    query:str code_queries 中的查询语句
+    df:DataFrame 拉取结果
+    prefix:str 版本键前缀
+    incremental:bool 是否以增量方式同步：区间集合、有序集合和哈希中移除已不在结果中的代码
+    返回:dict 写入统计，失败返回 None
     """
     try:
-        r = connect_redis()
-        df = pywencai.get(query=factor, sort_key=factor, sort_order='asc', loop=True)
-        if df is None:
-            print(f"{factor} 为空")
-            return
-        for _, row in safe_iterate_data(df, factor):
-            if row['code'] != '':
-                if row['code'] not in r.smembers(f"factor:{factor}"):
-                    r.sadd(f"factor:{factor}", row['code'])
-                else: 
-                    print(f"{row['code']} 已存在")
-            else:
-                print(f"{row['code']} 为空")
-        r.close()
+        frame = select_columns(df, code_queries[query], query)
+        # 增量更新前先记下有序集合的旧成员，写入后移除本次结果中已没有该指标的代码；
+        # 空结果多为上游异常，不据此清空
+        prune = incremental and frame is not None and not frame.empty
+        previous = metric_members(r, frame.columns, prefix) if prune else None
+        # 退出股票池的代码删除本查询写入的字段，所有查询都不再返回时哈希随之删除，快照不再扫描到它
+        dropped = set().union(*previous.values()) - set(frame.index) if previous else ()
+        stats = bulk_hset(r, f"{prefix}code:", frame, dropped=dropped)
+        if frame is None:
+            return stats
+        # 数值字段同时写入 metric:{字段} 有序集合，供按指标排序分页和区间筛选
+        stats['commands'] += write_metrics(r, frame, prefix, previous=previous)['commands']
+        # 区间集合的写入统计（added/existing 或 added/removed/kept）累加到 stats
+        for field in frame.columns:
+            if field not in METRIC_BUCKETS:
+                continue
+            for factor, codes in assign_buckets(field, frame[field]).items():
+                result = write_set(r, f"factor:{factor}", codes, incremental, prefix)
+                for key, value in result.items():
+                    stats[key] = stats.get(key, 0) + value
+        return stats
     except Exception as e:
-        print(f"处理资金面因子 {factor} 失败: {e}")
+        print(f"处理基本面数据 {query} 失败: {e}")
+        return None
 
-def special1_fundamental2code() -> None:
-    """
-    获取净利润,roe并且写入redis
-    返回:None
-    """
+def _fundamental2code(queries: list, prefix: str = '') -> None:
+    r = connect_redis()
     try:
-        r = connect_redis()
-        df1 = pywencai.get(query='净利润', sort_key='净利润', sort_order='asc', loop=True)
-        if df1 is None:
-            print(f"净利润 为空")
-            return
-        column1 = f'归属于母公司所有者的净利润[{new_date}]'
-        column2 = f'净资产收益率roe(加权,公布值)[{new_date}]'
-        for _, row in safe_iterate_data(df1, '净利润'):
-            if row['code'] != '':
-                # 处理空值，用 'nan' 替代
-                profit = row[column1] if pd.notna(row[column1]) else 'nan'
-                if column1 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'净利润': profit})
-                else: 
-                    print(f"{row['code']} 净利润 已存在")
-
-        df2 = pywencai.get(query='ROE', sort_key='ROE', sort_order='asc', loop=True)
-        if df2 is None:
-            print(f"ROE 为空")
-            return
-        for _, row in safe_iterate_data(df2, 'ROE'):
-            if row['code'] != '':
-                # 处理空值，用 'nan' 替代
-                roe = row[column2] if pd.notna(row[column2]) else 'nan'
-                if column2 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'ROE': roe})
-                else: 
-                    print(f"{row['code']} ROE 已存在")
+        run_factor_jobs(r, [('code', query, query) for query in queries], prefix)
+    finally:
         r.close()
-    except Exception as e:
-        print(f"处理基本面因子 净利润,roe 失败: {e}")
 
-def normal_fundamental2code() -> None:
+def special1_fundamental2code(prefix: str = '') -> None:
     """
-    获取营业收入,销售毛利率,资产负债率并且写入redis
+    获取净利润,roe并且写入redis
+    prefix:str 版本键前缀
     返回:None
     """
-    try:
-        r = connect_redis()
-        df1 = pywencai.get(query='销售毛利率', sort_key='销售毛利率', sort_order='asc' , loop=True)
-        if df1 is None:
-            print(f"销售毛利率为空")
-            return
-            
-        column1 = f'销售毛利率[{new_date}]'
-        column2 = f'营业收入[{new_date}]'
-        column3 = '股票简称'
-        column4 = f'资产负债率[{new_date}]'
-        
-        
-        for _, row in safe_iterate_data(df1, '销售毛利率'):
-            if row['code'] != '':
-                # 处理空值，用 'nan' 替代
-                sales_margin = row[column1] if pd.notna(row[column1]) else 'nan'
-                revenue = row[column2] if pd.notna(row[column2]) else 'nan'
-                
-                if column1 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'销售毛利率': sales_margin})
-                else: 
-                    print(f"{row['code']} 销售毛利率 已存在")
-                    
-                if column2 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'营业收入': revenue})
-                else: 
-                    print(f"{row['code']} 营业收入 已存在")
-                if column3 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'股票简称': row[column3]})
-                else: 
-                    print(f"{row['code']} 股票简称 已存在")
-            else:
-                print(f"{row['code']} 为空")
-                
-        # 资产负债率
-        df2 = pywencai.get(query='资产负债率', sort_key='资产负债率', sort_order='asc' , loop=True)
-        if df2 is None:
-            print(f"资产负债率为空")
-            return
-            
-        for _, row in safe_iterate_data(df2, '资产负债率'):
-            if row['code'] != '':
-                debt_ratio = row[column4] if pd.notna(row[column4]) else 'nan'
-                
-                if column3 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'资产负债率': debt_ratio})
-                else: 
-                    print(f"{row['code']} 资产负债率 已存在")
-            else:
-                print(f"{row['code']} 为空")
-                
-        r.close()
-    except Exception as e:
-        print(f"处理基本面因子 营业收入,销售毛利率,资产负债率 失败: {e}")
+    _fundamental2code(['净利润', 'ROE'], prefix)
 
-def special2_fundamental2code() -> None:
+def normal_fundamental2code(prefix: str = '') -> None:
     """
-    获取市净率,市盈率并且写入redis
+    获取营业收入,销售毛利率,资产负债率并且写入redis
+    prefix:str 版本键前缀
     返回:None
     """
-    try:
-        r = connect_redis()
-        df = pywencai.get(query='市净率', sort_key='市净率', sort_order='asc', loop=True)
-        if df is None:
-            print(f"市净率 为空")
-            return
-        column1 = f'市净率(pb)[{now_date}]'
-        column2 = f'市盈率(pe)[{now_date}]'
-
-        for _, row in safe_iterate_data(df, '市净率'):
-            if row['code'] != '':
-                # 处理空值，用 'nan' 替代
-                pb = row[column1] if pd.notna(row[column1]) else 'nan'
-                pe = row[column2] if pd.notna(row[column2]) else 'nan'
-                if column1 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'市净率': pb})
-                else: 
-                    print(f"{row['code']} 市净率 已存在")
-                if column2 not in r.hkeys(f"code:{row['code']}"):
-                    r.hset(f"code:{row['code']}", mapping={'市盈率': pe})
-                else: 
-                    print(f"{row['code']} 市盈率 已存在")
-        r.close()
-    except Exception as e:
-        print(f"处理基本面因子 市净率,市盈率 失败: {e}")
+    _fundamental2code(['销售毛利率', '资产负债率'], prefix)
 
-def fundamental2factor(factor) -> None:
+def special2_fundamental2code(prefix: str = '') -> None:
     """
-    获取基本面因子并且写入redis
-    factor:str 因子名称
+    获取市净率,市盈率并且写入redis
+    prefix:str 版本键前缀
     返回:None
     """
-    try:
-        r = connect_redis()
-        df = pywencai.get(query=factor, sort_key=factor, sort_order='asc', loop=True)
-        if df is None:
-            print(f"{factor} 为空")
-            return
-        for _, row in safe_iterate_data(df, factor):
-            if row['code'] != '':
-                if row['code'] not in r.smembers(f"factor:{factor}"):
-                    r.sadd(f"factor:{factor}", row['code'])
-                else: 
-                    print(f"{row['code']} 已存在")
-            else:
-                print(f"{row['code']} 为空")
-        r.close()
-    except Exception as e:
-        print(f"处理基本面因子 {factor} 失败: {e}")
-
-def safe_iterate_data(data, factor_name):
-    """
-    安全地遍历数据，处理不同的数据格式
-    """
-    if data is None:
-        return []
-    
-    # 如果是字典格式
-    if isinstance(data, dict):
-        if 'code' in data and data['code'] is not None:
-            codes = data['code'] if isinstance(data['code'], list) else [data['code']]
-            return [(None, {'code': code}) for code in codes if code and code != '']
-        else:
-            print(f"{factor_name} 数据格式不正确")
-            return []
-    
-    # 如果是DataFrame格式
-    elif hasattr(data, 'iterrows'):
-        return data.iterrows()
-    
-    # 其他格式
-    else:
-        print(f"{factor_name} 返回数据类型不支持: {type(data)}")
-        return []
+    _fundamental2code(['市净率'], prefix)
 
 # 示例使用（取消注释以运行）
 
@@ -312,135 +225,224 @@ capital_factors = ['陆股通净流入_小于0', '陆股通净流入_0~1000万',
 '大单净额_小于0', '大单净额_0~1000万', '大单净额_1000~5000万', '大单净额_大于5000万',
 '大单净量_小于0', '大单净量_0~1', '大单净量_1~3', '大单净量_大于3',
 ]
-capital_codes = ['陆股通净流入', '大单净额', '大单净量']
-
-# 基本面因子
-fundamental_factors = ['营业收入_小于5亿', '营业收入_5~10亿', '营业收入_10~20亿', '营业收入_20~50亿', '营业收入_大于50亿',
-'市盈率_小于10', '市盈率_10~20', '市盈率_20~30', '市盈率_30~40', '市盈率_大于40',
-'销售毛利率_小于5', '销售毛利率_5~20', '销售毛利率_20~35', '销售毛利率_35~40', '销售毛利率_大于40',
-'ROE_小于5', 'ROE_5~10', 'ROE_10~20', 'ROE_大于20',
-'净利润_亏损', '净利润_0~1亿', '净利润_1~3亿', '净利润_3~5亿', '净利润_大于5亿',
-'市净率_小于1', '市净率_1~1.5', '市净率_1.5~2', '市净率_2~3', '市净率_大于3',
-'资产负债率_小于10', '资产负债率_10~15', '资产负债率_15~30', '资产负债率_大于30',
-]
-fundamental_codes = ['营业收入', '市盈率', '销售毛利率', 'ROE', '净利润', '市净率', '资产负债率']
 
 zhibiao_factors = ['涨幅大于7.5 市值大于150亿  多头排列', '涨幅大于4 量比大于2 上影线小于1', '跌幅大于4 量比小于0.8  下影线小于2', '最近十日涨停数量大于5']
 zhibiaos = ['打板', '追涨', '低吸', '龙头']
+zhibiao_queries = dict(zip(zhibiaos, zhibiao_factors))
+
+def write_zhibiao_factor(r, zhibiao, df, prefix: str = '', incremental: bool = False):
+    """
+    将指标因子结果写入redis
+    r:redis.Redis 连接对象
+    zhibiao:str 指标名称
+    df:DataFrame 拉取结果
+    prefix:str 版本键前缀
+    incremental:bool 是否以增量方式同步
+    返回:dict 写入统计
+    """
+    return write_code_set(r, f"zhibiao:{zhibiao}", zhibiao, df, '指标因子', incremental, prefix)
+
 def zhibiao2factor():
     """
     获取指标因子并且写入redis
     """
     try:
         r = connect_redis()
+        prefix = get_active_prefix(r)
         # 遍历指标因子和对应的指标名称
-        for factor, zhibiao in zip(zhibiao_factors, zhibiaos):
-            df = pywencai.get(query=factor, sort_key=factor, sort_order='asc',loop=True)
-            if df is not None:
-                for _, row in safe_iterate_data(df, factor):
-                    if row['code'] != '':
-                        if row['code'] not in r.smembers(f"zhibiao:{zhibiao}"):
-                            r.sadd(f"zhibiao:{zhibiao}", row['code'])
-                        else:
-                            print(f"{row['code']} 已存在")
-            else:
-                print(f"{factor} 为空")
+        for zhibiao, factor in zhibiao_queries.items():
+            write_zhibiao_factor(r, zhibiao, fetch_wencai(factor), prefix)
         r.close()
     except Exception as e:
         print(f"处理指标因子失败: {e}")
 
-def delete_fundamental_redis():
-    """
-    删除redis中的数据
-    """
-    r = connect_redis()
-    
-    # 删除factor下所有因子
-    cursor = '0'
-    pipe = r.pipeline()
-    count = 0
-    
-    # 删除所有code:开头的键
-    while cursor != 0:
-        cursor, keys = r.scan(cursor=cursor, match='code:*')
-        if keys:
-            pipe.delete(*keys)
-            count += len(keys)
-
-    # 执行所有删除命令
-    pipe.execute()
-    print(f"删除 {count} 个键")
-    r.close()
-
-def update_fundamental_code():
+def update_fundamental_code(prefix: str | None = None):
     """
     获取基本面数据并且写入redis
+    prefix:str 版本键前缀，默认写入当前生效版本（覆盖写入，不清空）
     """
-    delete_fundamental_redis()
-    special1_fundamental2code()
-    special2_fundamental2code()
-    normal_fundamental2code()
+    if prefix is None:
+        r = connect_redis()
+        prefix = get_active_prefix(r)
+        r.close()
+    _fundamental2code(list(fundamental_queries), prefix)
     print("基本面代码处理完成")
 
-def main():
-    delete_technical_and_capital_redis()
-    # 处理基本面代码
-    # special1_fundamental2code()
-    # special2_fundamental2code()
-    # normal_fundamental2code()
-    # print("基本面代码处理完成")
-    zhibiao2factor()
-
-    # 处理技术面因子
-    for factor in technical_factors:
-        technical2factor(factor)
-    print("技术面因子处理完成")
-    
-    # # 处理资金面代码
-    # for factor in capital_codes:
-    #     capital2code(factor)
-    # print("资金面代码处理完成")
-
-    # 处理资金面因子
-    for factor in capital_factors:
-        capital2factor(factor)
-    print("资金面因子处理完成")
-
-    # 处理基本面因子
-    for factor in fundamental_factors:
-        fundamental2factor(factor)
-    print("基本面因子处理完成")
-
-def delete_technical_and_capital_redis():
-    """
-    删除redis中的数据
+# 各类因子对应的写入函数
+factor_writers = {
+    'zhibiao': write_zhibiao_factor,
+    'technical': write_technical_factor,
+    'capital': write_capital_factor,
+    'code': write_fundamental_code,
+}
+
+def build_factor_jobs() -> list:
     """
+    生成每日刷新需要拉取的全部查询
+    返回:list [(类别, 写入名称, 查询语句)]
+    """
+    jobs = [('zhibiao', zhibiao, query) for zhibiao, query in zhibiao_queries.items()]
+    jobs += [('technical', factor, factor) for factor in technical_factors]
+    # 基本面、资金面区间因子由 code_queries 的数值在本地划分，不再逐个区间查询
+    jobs += [('code', query, query) for query in code_queries]
+    return jobs
+
+# 性能记录中各类任务的步骤名称，如 technical2factor('MACD_金叉')
+step_names = {
+    'zhibiao': 'zhibiao2factor',
+    'technical': 'technical2factor',
+    'capital': 'capital_fallback',
+    'code': 'fundamental2code',
+}
+
+def run_factor_jobs(r, jobs: list, prefix: str = '', max_workers: int | None = None,
+                    incremental: bool = False, profiler: IngestProfiler | None = None) -> dict:
+    """
+    并发拉取查询结果，并在每个结果返回时立即写入redis
+    r:redis.Redis 连接对象（仅在当前线程中使用）
+    jobs:list build_factor_jobs() 生成的任务
+    prefix:str 写入的版本键前缀
+    max_workers:int 最大并发数，默认取配置
+    incremental:bool 是否以增量方式同步集合
+    profiler:IngestProfiler 记录每个任务的耗时、行数、命令数等指标
+    返回:dict 成功/失败数量，以及每个任务的写入统计 results
+    """
+    profiler = profiler or IngestProfiler()
+    stats = {'ok': 0, 'failed': 0, 'results': {}}
+    with FetchPool(max_workers=max_workers) as pool:
+        for job in jobs:
+            pool.submit('pywencai', job, fetch_wencai, job[2])
+        for (kind, name, query), df, error, elapsed in pool.iter_completed():
+            with profiler.step(f"{step_names[kind]}('{name}')", upstream_s=elapsed) as metrics:
+                if error is not None:
+                    print(f"拉取 {query} 失败: {error}")
+                    stats['failed'] += 1
+                    continue
+                metrics['rows'] = count_rows(df)
+                with profiler.timed(metrics, 'redis_s'):
+                    result = factor_writers[kind](r, name, df, prefix, incremental)
+                if result is None:
+                    stats['failed'] += 1
+                    continue
+                metrics['members'] = count_members(result)
+                metrics['redis_commands'] = result.get('commands', 0)
+            stats['ok'] += 1
+            stats['results'][name] = result
+            detail = '，'.join(f"{k} {v}" for k, v in result.items())
+            print(f"{name}: {detail}（拉取耗时 {elapsed:.1f}s）")
+    return stats
+
+def capital_fallback_jobs(results: dict) -> list:
+    """
+    资金面数值查询没有写入任何数值（拉取失败或结果中没有预期的数值列）时，
+    改为拉取该指标的上游区间查询，直接写入区间集合
+    results:dict run_factor_jobs 返回的每个任务的写入统计
+    返回:list 需要补充拉取的区间查询任务
+    """
+    jobs = []
+    for metric in capital_queries:
+        result = results.get(metric)
+        if result is None or not result.get('written'):
+            print(f"资金面数值 {metric} 不可用，改用区间查询")
+            jobs += [('capital', factor, factor) for factor in capital_factors if factor.startswith(f"{metric}_")]
+    return jobs
+
+def run_daily_jobs(r, prefix: str, incremental: bool = False, profiler: IngestProfiler | None = None) -> dict:
+    """
+    运行每日刷新的全部查询；资金面数值不可用时补充拉取区间查询
+    返回:dict 合并后的成功/失败数量及写入统计（同 run_factor_jobs）
+    """
+    stats = run_factor_jobs(r, build_factor_jobs(), prefix, incremental=incremental, profiler=profiler)
+    fallback = capital_fallback_jobs(stats['results'])
+    if fallback:
+        extra = run_factor_jobs(r, fallback, prefix, incremental=incremental, profiler=profiler)
+        stats['ok'] += extra['ok']
+        stats['failed'] += extra['failed']
+        stats['results'].update(extra['results'])
+    return stats
+
+def print_churn_report(results: dict) -> None:
+    """
+    打印增量模式下每个因子的成员变化（新增/删除/未变化）
+    results:dict 任务名称 -> 写入统计
+    """
+    added = sum(r.get('added', 0) for r in results.values())
+    removed = sum(r.get('removed', 0) for r in results.values())
+    kept = sum(r.get('kept', 0) for r in results.values())
+    total = added + removed + kept
+    print(f"增量更新：新增 {added}，删除 {removed}，未变化 {kept}，变化率 {(added + removed) / total if total else 0:.1%}")
+    for name, result in sorted(results.items(), key=lambda x: -(x[1].get('added', 0) + x[1].get('removed', 0))):
+        if 'removed' in result:
+            print(f"  {name}: +{result['added']} -{result['removed']} ={result['kept']}")
+
+def build_version(r, profiler: IngestProfiler) -> None:
+    """
+    全量构建：写入新的暂存版本，完成后切换版本指针；失败或没有任何数据时丢弃暂存版本
+    r:redis.Redis 连接对象
+    profiler:IngestProfiler 性能记录
+    """
+    started = time.time()
+    version = allocate_version(r)
+    prefix = version_prefix(version)
+    print(f"开始构建数据版本 {version}")
+    try:
+        # 指标、技术面、资金面、基本面因子及基本面数据并发拉取，结果到达后立即写入
+        stats = run_daily_jobs(r, prefix, profiler=profiler)
+        print(f"因子处理完成：成功 {stats['ok']} 个，失败 {stats['failed']} 个，耗时 {time.time() - started:.1f}s")
+
+        if stats['ok'] == 0:
+            # 全部拉取失败时不切换，继续使用旧版本
+            print(f"版本 {version} 没有任何数据，放弃发布")
+            discard_version(r, version)
+            return
+        publish_version(r, version)
+        update_factor_catalog(r, prefix, profiler.run_id, version)
+    except Exception:
+        discard_version(r, version)
+        raise
+
+def update_version_incremental(r, version: int, profiler: IngestProfiler) -> None:
+    """
+    增量更新：直接在生效版本上按差集同步每个集合，只发送 SADD/SREM 增量，并打印变化情况
+    拉取失败的因子保持原样
+    r:redis.Redis 连接对象
+    version:int 当前生效版本
+    profiler:IngestProfiler 性能记录
+    """
+    started = time.time()
+    prefix = version_prefix(version)
+    print(f"开始增量更新数据版本 {version}")
+    stats = run_daily_jobs(r, prefix, incremental=True, profiler=profiler)
+    print(f"因子处理完成：成功 {stats['ok']} 个，失败 {stats['failed']} 个，耗时 {time.time() - started:.1f}s")
+    print_churn_report(stats['results'])
+    update_factor_catalog(r, prefix, profiler.run_id, version, replace=False)
+    # 集合已就地修改，让基于修改前内容的交集、区间、排序缓存失效
+    bump_content_epoch(r)
+
+def main(incremental: bool = False, profiler: IngestProfiler | None = None):
+    """
+    每日刷新：所有因子、指标和基本面数据写入新的暂存版本（如 v{N}:factor:*），
+    全部写完后一次性切换版本指针，旧版本在后台回收。
+    刷新期间读取方始终看到上一个完整版本。
+    incremental:bool True 时改为在当前生效版本上增量更新，尚无生效版本时退回全量构建
+    profiler:IngestProfiler 由调用方统一保存的性能记录；不传时本函数自行创建并保存
+    """
+    own_profiler = profiler is None
+    profiler = profiler or IngestProfiler()
+    prune_cache()
     r = connect_redis()
-    
-    # 删除factor下所有因子
-    cursor = '0'
-    pipe = r.pipeline()
-    count = 0
-    
-    # 删除所有factor:开头的键
-    while cursor != 0:
-        cursor, keys = r.scan(cursor=cursor, match='factor:*')
-        if keys:
-            pipe.delete(*keys)
-            count += len(keys)
-    
-    # 删除所有zhibiao:开头的键
-    cursor = '0'
-    while cursor != 0:
-        cursor, keys = r.scan(cursor=cursor, match='zhibiao:*')
-        if keys:
-            pipe.delete(*keys)
-            count += len(keys)
-    
-    # 执行所有删除命令
-    pipe.execute()
-    print(f"删除 {count} 个键")
-    r.close()
+    try:
+        if incremental:
+            version = get_active_version(r)
+            if version is not None:
+                update_version_incremental(r, version, profiler)
+                return
+            print("尚无生效版本，改为全量构建")
+        build_version(r, profiler)
+    finally:
+        if own_profiler:
+            profiler.save(r)
+        r.close()
 
 # if __name__ == "__main__":
     # main()
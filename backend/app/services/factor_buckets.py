@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# 原始数值 / 除数 = 展示单位（亿元、万元），未列出的字段不做换算
+FACTOR_UNIT_DIVISORS = {
+    '营业收入': 100000000,
+    '净利润': 100000000,
+    '大单净额': 10000,
+    '陆股通净流入': 10000,
+}
+
+# 基本面区间定义：指标 -> (区间边界, 区间名称)
+# 边界使用展示单位，区间左闭右开，名称数量 = 边界数量 + 1
+# 生成的因子集合为 factor:{指标}_{区间名称}，如 factor:ROE_5~10
+FUNDAMENTAL_BUCKETS = {
+    '营业收入': ([5, 10, 20, 50], ['小于5亿', '5~10亿', '10~20亿', '20~50亿', '大于50亿']),
+    '市盈率': ([10, 20, 30, 40], ['小于10', '10~20', '20~30', '30~40', '大于40']),
+    '销售毛利率': ([5, 20, 35, 40], ['小于5', '5~20', '20~35', '35~40', '大于40']),
+    'ROE': ([5, 10, 20], ['小于5', '5~10', '10~20', '大于20']),
+    '净利润': ([0, 1, 3, 5], ['亏损', '0~1亿', '1~3亿', '3~5亿', '大于5亿']),
+    '市净率': ([1, 1.5, 2, 3], ['小于1', '1~1.5', '1.5~2', '2~3', '大于3']),
+    '资产负债率': ([10, 15, 30], ['小于10', '10~15', '15~30', '大于30']),
+}
+
+
+# 资金面区间定义（展示单位：万元；大单净量无单位），生成 factor:大单净额_0~1000万 等集合
+CAPITAL_BUCKETS = {
+    '陆股通净流入': ([0, 1000, 5000, 10000], ['小于0', '0~1000万', '1000~5000万', '5000~10000万', '大于10000万']),
+    '大单净额': ([0, 1000, 5000], ['小于0', '0~1000万', '1000~5000万', '大于5000万']),
+    '大单净量': ([0, 1, 3], ['小于0', '0~1', '1~3', '大于3']),
+}
+
+# 全部可在本地划分区间的指标
+METRIC_BUCKETS = {**FUNDAMENTAL_BUCKETS, **CAPITAL_BUCKETS}
+
+
+def bucket_factor_names(buckets: dict = FUNDAMENTAL_BUCKETS) -> list:
+    """返回区间表能生成的全部因子名称，如 ['营业收入_小于5亿', ...]"""
+    return [f"{metric}_{label}" for metric, (_, labels) in buckets.items() for label in labels]
+
+
+def to_units(field: str, values) -> pd.Series:
+    """
+    向量化的单位换算（不取整），无法解析的值（None、'nan' 等）转换为 NaN
+    """
+    numbers = pd.to_numeric(pd.Series(values), errors='coerce')
+    return numbers / FACTOR_UNIT_DIVISORS.get(field, 1)
+
+
+def convert_series(field: str, values) -> pd.Series:
+    """
+    向量化的单位换算，与 info_service.convert_factor_value 的展示值一致（保留两位小数）
+    无法解析的值（None、'nan' 等）转换为 NaN
+    """
+    return to_units(field, values).round(2)
+
+
+def assign_buckets(field: str, values: pd.Series, buckets: dict = METRIC_BUCKETS) -> dict:
+    """
+    将一列数值按区间表划分
+    field:str 指标名称
+    values:Series 以股票代码为索引的原始数值
+    返回:dict 因子名称 -> 股票代码列表（空值不进入任何区间）
+    按换算后未取整的数值划分，与逐个区间查询时的比较一致（如亏损 1 万元仍属于“亏损”）
+    """
+    if field not in buckets:
+        return {}
+    edges, labels = buckets[field]
+    converted = to_units(field, values)
+    converted = converted[converted.notna()]
+    positions = np.digitize(converted.to_numpy(dtype=float), edges)
+    codes = converted.index.to_numpy()
+    return {f"{field}_{label}": codes[positions == i].tolist() for i, label in enumerate(labels)}
@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ..config import Config
+
+# 拉取线程当前任务所属数据源的限速器（由 FetchPool 设置），throttle() 在真正访问网络前获取
+_current = threading.local()
+
+
+class RateLimiter:
+    """
+    简单的令牌间隔限速器（线程安全）
+    rate:float 每秒允许的请求数，<=0 表示不限速
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self) -> None:
+        """阻塞直到允许发出下一次请求"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def throttle() -> None:
+    """
+    在真正发出远程请求前调用：按当前拉取任务的数据源限速
+    命中本地缓存的任务不调用，因此不受限速影响；不在 FetchPool 线程中执行时不限速
+    """
+    limiter = getattr(_current, 'limiter', None)
+    if limiter is not None:
+        limiter.acquire()
+
+
+class FetchPool:
+    """
+    有界并发的数据拉取调度器
+    - 所有任务在固定大小的线程池中执行
+    - 每个数据源（pywencai / tushare）独立限速：只限制真正的远程请求，
+      任务函数在访问网络前调用 throttle()（cached_fetch 在未命中缓存时自动调用）
+    - 通过 iter_completed() 按完成顺序逐个取回结果，便于边拉取边写入 Redis
+    max_workers:int 最大并发数，默认取 Config.FETCH_MAX_WORKERS
+    rate_limits:dict 数据源 -> 每秒请求数，默认取 Config 中的配置
+    """
+
+    def __init__(self, max_workers: int | None = None, rate_limits: dict | None = None):
+        self.max_workers = max_workers or Config.FETCH_MAX_WORKERS
+        if rate_limits is None:
+            rate_limits = {
+                'pywencai': Config.PYWENCAI_RATE_LIMIT,
+                'tushare': Config.TUSHARE_RATE_LIMIT,
+            }
+        self._limiters = {source: RateLimiter(rate) for source, rate in rate_limits.items()}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetch')
+        self._futures = {}
+
+    def _limiter(self, source: str) -> RateLimiter:
+        if source not in self._limiters:
+            self._limiters[source] = RateLimiter(0)
+        return self._limiters[source]
+
+    def _run(self, source, func, args, kwargs):
+        _current.limiter = self._limiter(source)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _current.limiter = None
+        return result, time.perf_counter() - started
+
+    def submit(self, source: str, name, func, *args, **kwargs) -> None:
+        """
+        提交一个拉取任务
+        source:str 数据源名称，用于限速
+        name: 任务标识，会随结果一起返回
+        func: 实际执行拉取的函数
+        """
+        future = self._executor.submit(self._run, source, func, args, kwargs)
+        self._futures[future] = name
+
+    def iter_completed(self):
+        """
+        按完成顺序返回 (name, result, error, elapsed)
+        拉取失败时 result 为 None，error 为异常对象
+        """
+        try:
+            for future in as_completed(list(self._futures)):
+                name = self._futures.pop(future)
+                try:
+                    result, elapsed = future.result()
+                    yield name, result, None, elapsed
+                except Exception as e:
+                    yield name, None, e, 0.0
+        finally:
+            self._futures.clear()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+
+from ..config import Config
+from .keyspace import VERSION_EVENTS_CHANNEL, get_active_version
+from .redis_pool import create_subscriber
+from .universe_snapshot import SNAPSHOT_LATEST_KEY
+
+# 数据集 -> 处理函数列表，收到版本事件时在监听线程中调用 handler(version)
+_handlers = {}
+
+# 数据集 -> 当前进程已加载的版本
+_versions = {}
+_lock = threading.Lock()
+
+# 已启动监听线程的进程号（fork 出的子进程需要重新启动）
+_listener_pid = None
+
+
+def register_handler(dataset: str, handler) -> None:
+    """
+    注册版本切换处理函数
+    dataset:str 数据集，如 data / theme / snapshot
+    handler: 以新版本为参数的函数；应在函数内完成预加载后再原子替换进程内数据
+    """
+    with _lock:
+        _handlers.setdefault(dataset, []).append(handler)
+
+
+def current_versions() -> dict:
+    """当前进程已加载的各数据集版本，随响应返回，便于观察热加载"""
+    with _lock:
+        return dict(_versions)
+
+
+def apply_version(dataset: str, version) -> None:
+    """
+    调用数据集的处理函数，全部成功后记录为已加载版本
+    处理函数在监听线程中执行，不阻塞请求；失败时保留旧数据
+    """
+    with _lock:
+        handlers = list(_handlers.get(dataset, []))
+        if _versions.get(dataset) == version:
+            return
+    for handler in handlers:
+        try:
+            handler(version)
+        except Exception as e:
+            print(f"热加载 {dataset} 版本 {version} 失败: {e}")
+            return
+    with _lock:
+        _versions[dataset] = version
+    print(f"进程 {os.getpid()} 已加载 {dataset} 版本 {version}")
+
+
+def _sync_versions(r) -> None:
+    """（重新）连接后对齐一次版本，补上断线期间错过的事件"""
+    apply_version('data', get_active_version(r))
+    apply_version('theme', get_active_version(r, 'theme'))
+    snapshot = r.get(SNAPSHOT_LATEST_KEY)
+    if snapshot:
+        apply_version('snapshot', snapshot)
+
+
+def _listen() -> None:
+    """
+    监听版本事件；连接断开时等待后重连
+    使用独立的无读超时连接（create_subscriber），空闲时不会因超时反复断线；
+    每次（重新）订阅后先对齐一次版本，断线期间发布的事件不会丢失
+    """
+    while True:
+        r = None
+        try:
+            r = create_subscriber()
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(VERSION_EVENTS_CHANNEL)
+            _sync_versions(r)
+            while True:
+                message = pubsub.get_message(timeout=Config.REDIS_HEALTH_CHECK_INTERVAL)
+                if message is None:
+                    continue
+                try:
+                    event = json.loads(message['data'])
+                    apply_version(event['dataset'], event['version'])
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"忽略无法解析的版本事件 {message.get('data')}: {e}")
+        except Exception as e:
+            print(f"版本事件监听中断，{Config.HOT_RELOAD_RETRY_SECONDS}s 后重连: {e}")
+        finally:
+            if r is not None:
+                r.close()
+        time.sleep(Config.HOT_RELOAD_RETRY_SECONDS)
+
+
+def start_listener() -> bool:
+    """
+    在当前进程启动后台监听线程（每个进程只启动一次）
+    返回:bool 本次调用是否启动了新线程
+    """
+    global _listener_pid
+    if not Config.HOT_RELOAD_ENABLED:
+        return False
+    with _lock:
+        if _listener_pid == os.getpid():
+            return False
+        _listener_pid = os.getpid()
+    thread = threading.Thread(target=_listen, name='version-listener', daemon=True)
+    thread.start()
+    return True
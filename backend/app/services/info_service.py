@@ -1,22 +1,60 @@
-import time
+import json
+from datetime import datetime
 import requests
 from .data_service import connect_redis
+from .redis_pool import pool_stats
+from .keyspace import get_active_prefix
+from .factor_buckets import FACTOR_UNIT_DIVISORS
+from .ingest_profiler import FACTOR_CATALOG_KEY
+from .bitmap_index import bitmap_key, bitmap_intersect
+from .screen_engine import get_engine
+from .lua_scripts import screen
+from .query_planner import intersect, plan_intersection, content_epoch
+from .metric_index import metric_key, read_sorted_page, parse_range_clauses, range_key
+from .theme_index import (read_theme_stats, read_code_theme_details, read_theme_page, read_theme_meta,
+                          fill_theme_fields, read_theme_detail_fields, hot_value, THEME_META_PREFIX, THEME_HEAT_PREFIX)
+from ..config import Config
 
-# 题材缓存
-_themes_cache = None
-_themes_cache_time = 0
-CACHE_DURATION = 300  # 缓存5分钟
+def intersect_codes(r, keys: list) -> set:
+    """
+    计算多个集合的交集：优先使用位图（BITOP AND，一次往返），位图缺失时由查询计划按集合大小求交并缓存
+    r:redis.Redis 连接对象
+    keys:list (版本键前缀, 集合键名) 列表，如 [('v3:', 'factor:MACD_金叉'), ('tv5:', 'theme:机器人')]
+    返回:set 股票代码集合
+    """
+    if not keys:
+        return set()
+    if Config.BITMAP_INDEX_ENABLED:
+        raw = connect_redis(decode_responses=False)
+        try:
+            codes = bitmap_intersect(raw, [bitmap_key(prefix, key) for prefix, key in keys])
+        finally:
+            raw.close()
+        if codes is not None:
+            return codes
+    return intersect(r, [f"{prefix}{key}" for prefix, key in keys])
+
+
+def count_codes(r, keys: list) -> int:
+    """
+    只计算多个集合交集的大小（由查询计划在 Redis 中求交并缓存，不传输成员）
+    keys:list (版本键前缀, 集合键名) 列表
+    返回:int 交集大小
+    """
+    return intersect(r, [f"{prefix}{key}" for prefix, key in keys], count_only=True)
 
-def get_zhibiao_set(zhibiao: str) -> set:
+def get_zhibiao_set(zhibiao: str, prefix: str | None = None, r=None) -> set:
     """
     获取指标因子对应的股票代码集合
     zhibiao:str 指标因子名称
+    prefix:str 数据版本键前缀，默认读取当前生效版本
+    r:redis.Redis 调用方已持有的客户端，默认从连接池借用
     返回:set 指标因子对应的股票代码集合
     """
-    r = connect_redis()
-    codes = r.smembers(f"zhibiao:{zhibiao}")
-    r.close()
-    return codes
+    r = r or connect_redis()
+    if prefix is None:
+        prefix = get_active_prefix(r)
+    return intersect_codes(r, [(prefix, f"zhibiao:{zhibiao}")])
 
 def get_zhibiao_info(zhibiao: str) -> list:
     """
@@ -24,14 +62,18 @@ def get_zhibiao_info(zhibiao: str) -> list:
     zhibiao:str 指标因子名称
     返回:list 指标因子对应的股票代码集合
     """
+    info = _screen_with_lua(_lua_zhibiao_list_info, zhibiao)
+    if info is not None:
+        return info
     r = connect_redis()
-    codes = r.smembers(f"zhibiao:{zhibiao}")
+    prefix = get_active_prefix(r)
+    codes = r.smembers(f"{prefix}zhibiao:{zhibiao}")
     if not codes:
         return []
     info = {}
     for code in codes:
         info[code] = {}
-        info[code]['股票简称'] = r.hmget(f"code:{code}", "股票简称")[0]
+        info[code]['股票简称'] = r.hmget(f"{prefix}code:{code}", "股票简称")[0]
         info[code]['股票代码'] = code
         info[code]['特色指标'] = zhibiao
     r.close()
@@ -180,23 +222,21 @@ def technical_factor2key(factors: list) -> list:
             continue
     return keys
 
-def get_factors_set(factors) -> set:
+def get_factors_set(factors, prefix: str | None = None, r=None) -> set:
     """
     获取多个因子对应的股票代码集合
     factors:list 因子名称
+    prefix:str 数据版本键前缀，默认读取当前生效版本
+    r:redis.Redis 调用方已持有的客户端，默认从连接池借用
     功能:获取多个因子对应的股票代码集合的交集
     返回:set 多个因子对应的股票代码集合的交集
     """
     try:
-        r = connect_redis()
-        if len(factors) == 1:
-            codes = r.smembers(f"factor:{factors[0]}")
-        else:
-            # 计算所有因子的交集
-            factor_keys = [f"factor:{factor}" for factor in factors]
-            codes = r.sinter(*factor_keys)
-        r.close()
-        return codes
+        r = r or connect_redis()
+        if prefix is None:
+            prefix = get_active_prefix(r)
+        # 计算所有因子的交集
+        return intersect_codes(r, [(prefix, f"factor:{factor}") for factor in factors])
     except Exception as e:
         print(f"获取因子 {factors} 对应的股票代码集合失败: {e}")
         return set()
@@ -232,26 +272,254 @@ def convert_factor_value(factor_name: str, value) -> float:
             except Exception:
                 pass
         
-        # 根据因子名称进行单位转换
-        if factor_name in ['营业收入', '净利润']:
-            # 转换为亿元，保留两位小数
-            return round(num_value / 100000000, 2)
-        elif factor_name in ['大单净额', '陆股通净流入']:
-            # 转换为万元，保留两位小数
-            return round(num_value / 10000, 2)
-        elif factor_name in ['销售毛利率', '资产负债率', 'ROE', '市盈率']:
-            # 百分比数据，保留两位小数
-            return round(num_value, 2)
-        elif factor_name in ['市净率', '大单净量']:
-            # 普通数值，保留两位小数
-            return round(num_value, 2)
-        else:
-            # 其他数据，保留两位小数
-            return round(num_value, 2)
+        # 根据因子名称进行单位转换：营业收入/净利润转换为亿元，大单净额/陆股通净流入转换为万元，
+        # 其余（百分比、市净率、大单净量等）保持原值，统一保留两位小数
+        return round(num_value / FACTOR_UNIT_DIVISORS.get(factor_name, 1), 2)
     except (ValueError, TypeError):
         return 0.0
 
 
+def _screen_with_engine(build, *args):
+    """
+    使用进程内筛选引擎回答查询；引擎未启用、没有快照或出错时返回 None，由调用方回退到 Redis
+    build: 以 (engine, *args) 调用的组装函数
+    """
+    engine = get_engine()
+    if engine is None:
+        return None
+    try:
+        return build(engine, *args)
+    except Exception as e:
+        print(f"筛选引擎查询失败，回退到 Redis: {e}")
+        return None
+
+
+def _engine_rows_info(engine, rows, fields: list, always_name: bool = False) -> dict:
+    """
+    按行号组装 {代码: {股票简称, 字段值...}}
+    fields:list code:{代码} 哈希中的字段名（不存在的字段跳过）
+    always_name:bool 股票简称缺失时也保留该键（值为 None）
+    """
+    codes = engine.codes_of(rows)
+    names = engine.names_of(rows)
+    columns = {field: engine.values_of(field, rows) for field in fields}
+    columns = {field: values for field, values in columns.items() if values is not None}
+    info = {}
+    for i, code in enumerate(codes):
+        item = {}
+        if names[i] or always_name:
+            item['股票简称'] = names[i]
+        for field, values in columns.items():
+            # 与 Redis 查询一致：没有该字段的代码不返回该键
+            if values[i] is not None:
+                item[field] = values[i]
+        info[code] = item
+    return info
+
+
+def _engine_factors_info(engine, factors: list) -> dict:
+    """get_factors_info 的引擎实现"""
+    rows = engine.select([f"factor:{factor}" for factor in factors])
+    info = _engine_rows_info(engine, rows, fundamental_factor2key(factors) + capital_factor2key(factors))
+    technical = append_technical_info(factors)
+    for item in info.values():
+        item.update(technical)
+    return info
+
+
+def _engine_themes_info(engine, themes: list) -> dict:
+    """get_themes_info 的引擎实现"""
+    rows = engine.select([f"theme:{theme}" for theme in themes])
+    info = {}
+    for code in engine.codes_of(rows):
+        info[code] = {}
+        all_themes_info = []
+        for theme in themes:
+            detail = engine.theme_detail(theme, code)
+            if detail and detail['desc']:
+                all_themes_info.append(detail)
+        if all_themes_info:
+            if len(all_themes_info) > 1:
+                info[code]['题材'] = '、'.join([t['theme'] for t in all_themes_info])
+                info[code]['题材描述'] = '；'.join([f"{t['theme']}:{t['desc']}" for t in all_themes_info])
+            else:
+                info[code]['题材'] = all_themes_info[0]['theme']
+                info[code]['题材描述'] = all_themes_info[0]['desc']
+            info[code]['股票简称'] = all_themes_info[0]['name']
+            info[code]['热度值'] = all_themes_info[0]['hot_num']
+            info[code]['交易日期'] = all_themes_info[0]['trade_date']
+    return info
+
+
+def _engine_multi_info(engine, themes: list, factors: list) -> dict:
+    """get_multi_theme_and_factor_all_info 的引擎实现"""
+    rows = engine.select([f"theme:{theme}" for theme in themes] + [f"factor:{factor}" for factor in factors])
+    all_factor_keys = preprocess_factor_keys(factors)
+    if not len(rows) or not all_factor_keys:
+        return {}
+    info = _engine_rows_info(engine, rows, all_factor_keys)
+    technical = append_technical_info(factors)
+    for code, item in info.items():
+        if themes:
+            detail = engine.theme_detail(themes[0], code) or {}
+            if detail.get('desc'):
+                item['题材描述'] = detail['desc']
+            if detail.get('theme'):
+                item['主题'] = detail['theme']
+        item.update(technical)
+    return info
+
+
+def _engine_zhibiao_info(engine, zhibiao: str, themes: list, factors: list) -> dict:
+    """get_zhibiao_factor_theme_info 的引擎实现"""
+    keys = [f"zhibiao:{zhibiao}"] + [f"theme:{theme}" for theme in themes or []]
+    keys += [f"factor:{factor}" for factor in factors or []]
+    rows = engine.select(keys)
+    all_factor_keys = preprocess_factor_keys(factors) if factors else []
+    info = _engine_rows_info(engine, rows, all_factor_keys, always_name=True)
+    technical = append_technical_info(factors) if factors else {}
+    for code, item in info.items():
+        if themes:
+            detail = engine.theme_detail(themes[0], code) or {}
+            item['题材描述'] = detail.get('desc')
+            item['题材'] = detail.get('theme')
+        item['特色指标'] = zhibiao
+        item.update(technical)
+    return info
+
+
+def _screen_with_lua(build, *args):
+    """
+    使用服务端 Lua 脚本回答查询（一次 EVALSHA）；未启用或出错时返回 None，由调用方回退到 pipeline 查询
+    build: 以 (r, *args) 调用的组装函数
+    """
+    if not Config.LUA_SCREEN_ENABLED:
+        return None
+    r = connect_redis()
+    try:
+        return build(r, *args)
+    except Exception as e:
+        print(f"Lua 筛选失败，回退到 pipeline 查询: {e}")
+        return None
+    finally:
+        r.close()
+
+
+def _converted_values(fields: list, values: list) -> dict:
+    """code:{代码} 哈希字段值换算为展示单位，跳过缺失值"""
+    return {field: convert_factor_value(field, value) for field, value in zip(fields, values) if value is not None}
+
+
+def _lua_zhibiao_list_info(r, zhibiao: str, codes: list | None = None) -> dict | list:
+    """get_zhibiao_info 的 Lua 实现"""
+    codes, values, _ = screen(r, [('data', f"zhibiao:{zhibiao}")], [('data', 'code:', ['股票简称'])], codes=codes)
+    if not codes:
+        return []
+    return {code: {'股票简称': row[0][0], '股票代码': code, '特色指标': zhibiao} for code, row in zip(codes, values)}
+
+
+def _lua_factors_info(r, factors: list, codes: list | None = None) -> dict:
+    """get_factors_info 的 Lua 实现"""
+    fields = fundamental_factor2key(factors) + capital_factor2key(factors)
+    codes, values, _ = screen(r, [('data', f"factor:{factor}") for factor in factors],
+                              [('data', 'code:', ['股票简称'] + fields)], codes=codes)
+    technical = append_technical_info(factors)
+    info = {}
+    for code, row in zip(codes, values):
+        name, *field_values = row[0]
+        item = {'股票简称': name} if name else {}
+        item.update(_converted_values(fields, field_values))
+        item.update(technical)
+        info[code] = item
+    return info
+
+
+def _lua_themes_info(r, themes: list, codes: list | None = None) -> dict:
+    """get_themes_info 的 Lua 实现（题材级字段从 theme:meta 补齐）"""
+    fields = ('desc', 'theme', 'name', 'hot_num', 'trade_date')
+    codes, values, metas = screen(
+        r, [('theme', f"theme:{theme}") for theme in themes],
+        [('theme', f"theme:detail:{theme}:", ['code', *fields]) for theme in themes],
+        [('theme', f"{THEME_META_PREFIX}{theme}") for theme in themes], codes,
+    )
+    info = {}
+    for code, row in zip(codes, values):
+        info[code] = {}
+        all_themes_info = []
+        for theme, detail, meta in zip(themes, row, metas):
+            if detail[0] is None:
+                continue
+            detail = dict(zip(fields, fill_theme_fields(detail[1:], meta, fields)))
+            if detail['desc']:
+                all_themes_info.append(detail)
+        if all_themes_info:
+            if len(all_themes_info) > 1:
+                info[code]['题材'] = '、'.join([t['theme'] for t in all_themes_info])
+                info[code]['题材描述'] = '；'.join([f"{t['theme']}:{t['desc']}" for t in all_themes_info])
+            else:
+                info[code]['题材'] = all_themes_info[0]['theme']
+                info[code]['题材描述'] = all_themes_info[0]['desc']
+            info[code]['股票简称'] = all_themes_info[0]['name']
+            info[code]['热度值'] = all_themes_info[0]['hot_num']
+            info[code]['交易日期'] = all_themes_info[0]['trade_date']
+    return info
+
+
+def _lua_multi_info(r, themes: list, factors: list, codes: list | None = None) -> dict:
+    """get_multi_theme_and_factor_all_info 的 Lua 实现"""
+    all_factor_keys = preprocess_factor_keys(factors)
+    if not all_factor_keys:
+        return {}
+    rows = [('data', 'code:', ['股票简称'] + all_factor_keys)]
+    if themes:
+        rows.append(('theme', f"theme:detail:{themes[0]}:", ['desc', 'theme']))
+    codes, values, metas = screen(
+        r, [('theme', f"theme:{theme}") for theme in themes] + [('data', f"factor:{factor}") for factor in factors],
+        rows, [('theme', f"{THEME_META_PREFIX}{themes[0]}")] if themes else [], codes,
+    )
+    technical = append_technical_info(factors)
+    info = {}
+    for code, row in zip(codes, values):
+        name, *field_values = row[0]
+        item = {'股票简称': name} if name else {}
+        if themes:
+            desc, theme = fill_theme_fields(row[1], metas[0], ('desc', 'theme'))
+            if desc:
+                item['题材描述'] = desc
+            if theme:
+                item['主题'] = theme
+        item.update(_converted_values(all_factor_keys, field_values))
+        item.update(technical)
+        info[code] = item
+    return info
+
+
+def _lua_zhibiao_info(r, zhibiao: str, themes: list, factors: list, codes: list | None = None) -> dict:
+    """get_zhibiao_factor_theme_info 的 Lua 实现"""
+    themes, factors = themes or [], factors or []
+    all_factor_keys = preprocess_factor_keys(factors) if factors else []
+    rows = [('data', 'code:', ['股票简称'] + all_factor_keys), ('data', f"zhibiao:{zhibiao}:", ['热度值'])]
+    if themes:
+        rows.append(('theme', f"theme:detail:{themes[0]}:", ['desc', 'theme']))
+    sets = [('data', f"zhibiao:{zhibiao}")] + [('theme', f"theme:{theme}") for theme in themes]
+    sets += [('data', f"factor:{factor}") for factor in factors]
+    codes, values, metas = screen(r, sets, rows, [('theme', f"{THEME_META_PREFIX}{themes[0]}")] if themes else [], codes)
+    technical = append_technical_info(factors) if factors else {}
+    info = {}
+    for code, row in zip(codes, values):
+        name, *field_values = row[0]
+        item = {'股票简称': name}
+        if themes:
+            item['题材描述'], item['题材'] = fill_theme_fields(row[2], metas[0], ('desc', 'theme'))
+        item['特色指标'] = zhibiao
+        if row[1][0] is not None:
+            item['热度值'] = row[1][0]
+        item.update(_converted_values(all_factor_keys, field_values))
+        item.update(technical)
+        info[code] = item
+    return info
+
+
 def get_factors_info(factors: list) -> dict:
     """
     获取股票代码对应的所有因子信息（优化版本，使用Pipeline批量查询）
@@ -259,8 +527,15 @@ def get_factors_info(factors: list) -> dict:
     功能:获取股票代码对应的所有因子信息
     返回:dict 股票代码对应的所有因子信息
     """
+    info = _screen_with_engine(_engine_factors_info, factors)
+    if info is not None:
+        return info
+    info = _screen_with_lua(_lua_factors_info, factors)
+    if info is not None:
+        return info
     try:
         r = connect_redis()
+        prefix = get_active_prefix(r)
         info = {}
         list_factors = []
         # 基本面因子对应的键
@@ -268,7 +543,7 @@ def get_factors_info(factors: list) -> dict:
         # 资金面因子对应的键
         list_factors = list_factors + capital_factor2key(factors)
         # 获取多个因子对应的股票代码集合
-        code_set = get_factors_set(factors)
+        code_set = get_factors_set(factors, prefix, r)
         
         if not code_set:
             r.close()
@@ -280,12 +555,12 @@ def get_factors_info(factors: list) -> dict:
         # 为每个股票代码批量添加查询命令
         for code in code_set:
             # 获取股票简称
-            pipe.hmget(f"code:{code}", "股票简称")
+            pipe.hmget(f"{prefix}code:{code}", "股票简称")
             # 批量获取所有因子数据
             if list_factors:
-                pipe.hmget(f"code:{code}", *list_factors)
+                pipe.hmget(f"{prefix}code:{code}", *list_factors)
             else:
-                pipe.hmget(f"code:{code}", "dummy")  # 占位符，避免空列表
+                pipe.hmget(f"{prefix}code:{code}", "dummy")  # 占位符，避免空列表
         
         # 执行批量查询
         results = pipe.execute()
@@ -325,96 +600,101 @@ def get_factors_info(factors: list) -> dict:
         return {}
 
 
-def get_themes_set(themes: list) -> set:
+def get_themes_set(themes: list, prefix: str | None = None, r=None) -> set:
     """
     获取题材对应的股票代码集合
     themes:list 题材名称
+    prefix:str 题材版本键前缀，默认读取当前生效版本
+    r:redis.Redis 调用方已持有的客户端，默认从连接池借用
     功能:获取题材对应的股票代码集合
     返回:set 题材对应的股票代码集合
     """
-    r = connect_redis()
+    r = r or connect_redis()
     try:
-        if len(themes) == 1:
-            codes = r.smembers(f"theme:{themes[0]}")
-        else:
-            # 获取多个题材对应的股票代码的交集
-            theme_keys = [f"theme:{theme}" for theme in themes]
-            codes = r.sinter(*theme_keys)
-        r.close()
-        return codes
+        if prefix is None:
+            prefix = get_active_prefix(r, 'theme')
+        # 获取多个题材对应的股票代码的交集
+        return intersect_codes(r, [(prefix, f"theme:{theme}") for theme in themes])
     except Exception as e:
         print(f"获取题材 {themes} 对应的股票代码集合失败: {e}")
         return set()
 
 def get_themes_key() -> list:
     """
-    获取题材名称和人气值（优化版本，带缓存）
-    返回:list 包含题材名称和人气值的字典列表
+    获取题材名称和人气值（读取导入时预先计算的 theme:stats，无需扫描明细）
+    返回:list 包含题材名称和人气值的字典列表，按最大热度值从高到低排序
     """
-    global _themes_cache, _themes_cache_time
-    
-    # 检查缓存
-    current_time = time.time()
-    if _themes_cache and (current_time - _themes_cache_time) < CACHE_DURATION:
-        return _themes_cache
-    
     r = connect_redis()
     try:
-        # 使用SCAN代替KEYS，避免阻塞Redis
-        theme_stats = {}
-        cursor = 0
-        
-        while True:
-            # 使用SCAN命令分批获取键，避免一次性获取所有键
-            cursor, keys = r.scan(cursor, match="theme:detail:*", count=1000)
-            
-            if not keys:
-                break
-                
-            # 批量获取所有键的数据，减少网络往返
-            if keys:
-                # 使用pipeline批量获取数据
-                pipe = r.pipeline()
-                for key in keys:
-                    pipe.hget(key, 'hot_num')
-                hot_nums = pipe.execute()
-                
-                # 处理数据
-                for key, hot_num in zip(keys, hot_nums):
-                    # theme:detail:题材名:股票代码
-                    parts = key.split(':')
-                    if len(parts) >= 3:
-                        theme_name = parts[2]
-                        hot_num = int(hot_num) if hot_num else 0
-                        
-                        if theme_name not in theme_stats:
-                            theme_stats[theme_name] = {
-                                'name': theme_name,
-                                'stock_count': 0,
-                                'max_hot_num': 0,
-                                'total_hot_num': 0
-                            }
-                        
-                        theme_stats[theme_name]['stock_count'] += 1
-                        theme_stats[theme_name]['max_hot_num'] = max(theme_stats[theme_name]['max_hot_num'], hot_num)
-                        theme_stats[theme_name]['total_hot_num'] += hot_num
-            
-            if cursor == 0:
-                break
-        
-        # 转换为列表并按热度值排序（优先按最大热度值，然后按总热度值，最后按股票数量）
-        themes = list(theme_stats.values())
-        themes.sort(key=lambda x: (x['max_hot_num'], x['total_hot_num'], x['stock_count']), reverse=True)
-        
-        # 更新缓存
-        _themes_cache = themes
-        _themes_cache_time = current_time
-        
-        r.close()
+        theme_prefix = get_active_prefix(r, 'theme')
+        themes = read_theme_stats(r, theme_prefix)
+        if not themes:
+            # 统计尚未生成的旧版本题材数据，退回扫描明细
+            themes = _scan_theme_stats(r, theme_prefix)
         return themes
     except Exception as e:
         print(f"获取题材信息失败: {e}")
         return []
+    finally:
+        r.close()
+
+def _scan_theme_stats(r, theme_prefix: str) -> list:
+    """
+    扫描 theme:detail:* 明细计算题材统计（theme:stats 不存在时使用）
+    返回:list 与 get_themes_key 相同
+    """
+    # 使用SCAN代替KEYS，避免阻塞Redis
+    theme_stats = {}
+    theme_meta = {}
+    cursor = 0
+    
+    while True:
+        # 使用SCAN命令分批获取键，避免一次性获取所有键
+        cursor, keys = r.scan(cursor, match=f"{theme_prefix}theme:detail:*", count=1000)
+        
+        if keys:
+            # 使用pipeline批量获取数据
+            pipe = r.pipeline()
+            for key in keys:
+                pipe.hget(key, 'hot_num')
+            hot_nums = pipe.execute()
+
+            # 热度值在题材内相同时只保存在 theme:meta:{题材} 中
+            missing = [key[len(theme_prefix):].split(':')[2] for key, hot_num in zip(keys, hot_nums)
+                       if hot_num is None and len(key[len(theme_prefix):].split(':')) >= 3]
+            missing = [name for name in missing if name not in theme_meta]
+            if missing:
+                theme_meta.update(read_theme_meta(r, missing, theme_prefix))
+            
+            # 处理数据
+            for key, hot_num in zip(keys, hot_nums):
+                # theme:detail:题材名:股票代码
+                parts = key[len(theme_prefix):].split(':')
+                if len(parts) >= 3:
+                    theme_name = parts[2]
+                    if hot_num is None:
+                        hot_num = theme_meta.get(theme_name, {}).get('hot_num')
+                    hot_num = hot_value(hot_num)
+                    
+                    if theme_name not in theme_stats:
+                        theme_stats[theme_name] = {
+                            'name': theme_name,
+                            'stock_count': 0,
+                            'max_hot_num': 0,
+                            'total_hot_num': 0
+                        }
+                    
+                    theme_stats[theme_name]['stock_count'] += 1
+                    theme_stats[theme_name]['max_hot_num'] = max(theme_stats[theme_name]['max_hot_num'], hot_num)
+                    theme_stats[theme_name]['total_hot_num'] += hot_num
+        
+        if cursor == 0:
+            break
+    
+    # 转换为列表并按热度值排序（优先按最大热度值，然后按总热度值，最后按股票数量）
+    themes = list(theme_stats.values())
+    themes.sort(key=lambda x: (x['max_hot_num'], x['total_hot_num'], x['stock_count']), reverse=True)
+    return themes
 
 def get_themes_info(themes: list) -> dict:
     """
@@ -423,9 +703,16 @@ def get_themes_info(themes: list) -> dict:
     功能:获取题材对应的股票代码及其对应的信息
     返回:dict 题材对应的股票代码及其对应的信息
     """
+    info = _screen_with_engine(_engine_themes_info, themes)
+    if info is not None:
+        return info
+    info = _screen_with_lua(_lua_themes_info, themes)
+    if info is not None:
+        return info
     try:
         r = connect_redis()
-        codes = get_themes_set(themes)
+        theme_prefix = get_active_prefix(r, 'theme')
+        codes = get_themes_set(themes, theme_prefix, r)
         
         if not codes:
             r.close()
@@ -433,16 +720,11 @@ def get_themes_info(themes: list) -> dict:
         
         info = {}
         
-        # 使用Pipeline批量获取数据
-        pipe = r.pipeline()
-        
-        for code in codes:
-            # 为每个股票代码批量获取所有题材的详情信息
-            for theme in themes:
-                pipe.hmget(f"theme:detail:{theme}:{code}", "desc", "theme", "name", "hot_num", "trade_date")
-        
-        # 执行批量查询
-        results = pipe.execute()
+        # 使用Pipeline批量获取每个股票代码所有题材的详情信息（题材级字段从 theme:meta 补齐）
+        results = read_theme_detail_fields(
+            r, [(theme, code) for code in codes for theme in themes], theme_prefix,
+            ("desc", "theme", "name", "hot_num", "trade_date")
+        )
         
         # 处理批量查询结果
         result_index = 0
@@ -492,12 +774,20 @@ def get_multi_theme_and_factor_all_info(themes, factors) -> dict:
     功能:获取多个题材和多个因子交集的股票代码及其对应的信息
     返回:dict 题材和因子交集的股票代码及其对应的信息
     """
+    info = _screen_with_engine(_engine_multi_info, themes, factors)
+    if info is not None:
+        return info
+    info = _screen_with_lua(_lua_multi_info, themes, factors)
+    if info is not None:
+        return info
     try:
         info = {}
         r = connect_redis()
-        themes_set = get_themes_set(themes)
-        factors_set = get_factors_set(factors)  
-        codes = themes_set & factors_set
+        prefix = get_active_prefix(r)
+        theme_prefix = get_active_prefix(r, 'theme')
+        # 题材与因子集合一次求交
+        keys = [(theme_prefix, f"theme:{theme}") for theme in themes] + [(prefix, f"factor:{factor}") for factor in factors]
+        codes = intersect_codes(r, keys)
         if not codes:
             r.close()
             return {}
@@ -508,20 +798,23 @@ def get_multi_theme_and_factor_all_info(themes, factors) -> dict:
             r.close()
             return {}
         
+        # 题材级字段（desc/theme 可能只保存在 theme:meta 中）
+        theme_meta = read_theme_meta(r, themes[:1], theme_prefix).get(themes[0], {}) if themes else {}
+
         # 使用Pipeline批量获取数据
         pipe = r.pipeline()
         
         for code in codes:
             # 获取股票简称
-            pipe.hmget(f"code:{code}", "股票简称")
+            pipe.hmget(f"{prefix}code:{code}", "股票简称")
             
             # 获取题材信息
             if themes:
-                pipe.hmget(f"theme:detail:{themes[0]}:{code}", "desc", "theme")
+                pipe.hmget(f"{theme_prefix}theme:detail:{themes[0]}:{code}", "desc", "theme")
             
             # 批量获取因子数据
             if all_factor_keys:
-                pipe.hmget(f"code:{code}", *all_factor_keys)
+                pipe.hmget(f"{prefix}code:{code}", *all_factor_keys)
         
         # 执行批量查询
         results = pipe.execute()
@@ -539,7 +832,7 @@ def get_multi_theme_and_factor_all_info(themes, factors) -> dict:
             
             # 处理题材信息
             if themes:
-                theme_data = results[result_index]
+                theme_data = fill_theme_fields(results[result_index], theme_meta, ("desc", "theme"))
                 if isinstance(theme_data, list) and len(theme_data) >= 2:
                     if theme_data[0]:
                         info[code]['题材描述'] = theme_data[0]
@@ -580,18 +873,22 @@ def get_zhibiao_factor_theme_info(zhibiao: str, themes: list, factors: list) ->
     功能:获取特色指标和多个题材和多个因子交集的股票代码及其对应的信息
     返回:dict 题材和因子交集的股票代码及其对应的信息
     """
+    info = _screen_with_engine(_engine_zhibiao_info, zhibiao, themes, factors)
+    if info is not None:
+        return info
+    info = _screen_with_lua(_lua_zhibiao_info, zhibiao, themes, factors)
+    if info is not None:
+        return info
     try:
         info = {}
         r = connect_redis()
+        prefix = get_active_prefix(r)
+        theme_prefix = get_active_prefix(r, 'theme')
         # 以指标集合为基础，按需与题材/因子集合相交
-        zhibiao_set = get_zhibiao_set(zhibiao)
-        codes = set(zhibiao_set) if zhibiao_set else set()
-        if themes and len(themes) > 0:
-            themes_set = get_themes_set(themes)
-            codes = codes & themes_set
-        if factors and len(factors) > 0:
-            factors_set = get_factors_set(factors)
-            codes = codes & factors_set
+        keys = [(prefix, f"zhibiao:{zhibiao}")]
+        keys += [(theme_prefix, f"theme:{theme}") for theme in themes or []]
+        keys += [(prefix, f"factor:{factor}") for factor in factors or []]
+        codes = intersect_codes(r, keys)
 
         if not codes:
             r.close()
@@ -600,19 +897,22 @@ def get_zhibiao_factor_theme_info(zhibiao: str, themes: list, factors: list) ->
         # 预处理需要读取的特色指标字段（由因子键派生），可为空
         all_factor_keys = preprocess_factor_keys(factors) if (factors and len(factors) > 0) else []
 
+        # 题材级字段（desc/theme 可能只保存在 theme:meta 中）
+        theme_meta = read_theme_meta(r, themes[:1], theme_prefix).get(themes[0], {}) if themes else {}
+
         # Pipeline 批量读取：每个 code 读取2~4次（视题材/因子是否存在而定）
         pipe = r.pipeline()
         for code in codes:
             # 基础信息
-            pipe.hmget(f"code:{code}", "股票简称")
+            pipe.hmget(f"{prefix}code:{code}", "股票简称")
             # 题材细节（可选）
             if themes and len(themes) > 0:
-                pipe.hmget(f"theme:detail:{themes[0]}:{code}", "desc", "theme")
+                pipe.hmget(f"{theme_prefix}theme:detail:{themes[0]}:{code}", "desc", "theme")
             # 指标热度值
-            pipe.hmget(f"zhibiao:{zhibiao}:{code}", "热度值")
+            pipe.hmget(f"{prefix}zhibiao:{zhibiao}:{code}", "热度值")
             # 基本面/资金面/技术面键值（存放于 code:{code}，可选）
             if all_factor_keys:
-                pipe.hmget(f"code:{code}", *all_factor_keys)
+                pipe.hmget(f"{prefix}code:{code}", *all_factor_keys)
         results = pipe.execute()
 
         # 结果解析：每个代码对应 2~4 条结果
@@ -621,7 +921,7 @@ def get_zhibiao_factor_theme_info(zhibiao: str, themes: list, factors: list) ->
             base = results[idx]; idx += 1  # [股票简称]
             theme_detail = None
             if themes and len(themes) > 0:
-                theme_detail = results[idx]; idx += 1  # [desc, theme]
+                theme_detail = fill_theme_fields(results[idx], theme_meta, ("desc", "theme")); idx += 1  # [desc, theme]
             zhibiao_vals = results[idx]; idx += 1  # [热度值]
             factor_values = None
             if all_factor_keys:
@@ -660,6 +960,253 @@ def get_zhibiao_factor_theme_info(zhibiao: str, themes: list, factors: list) ->
         return {}
 
 
+def get_screen_count(themes: list | None = None, factors: list | None = None, zhibiao: str | None = None,
+                     ranges: list | None = None) -> int | None:
+    """
+    只返回筛选结果的数量（题材、因子、特色指标、指标区间求交），适合范围很大、只需要计数的筛选
+    themes:list 题材名称
+    factors:list 因子名称
+    zhibiao:str 特色指标名称
+    ranges:list 指标区间 [{'metric', 'min', 'max'}]（见 metric_index.parse_range_clauses）
+    返回:int 股票数量，失败时返回 None
+    异常:ValueError 区间条件不正确
+    """
+    keys = [f"zhibiao:{zhibiao}"] if zhibiao else []
+    keys += [f"theme:{theme}" for theme in themes or []] + [f"factor:{factor}" for factor in factors or []]
+    clauses = parse_range_clauses(ranges) if ranges else []
+    if not keys and not clauses:
+        return 0
+    engine = get_engine()
+    if engine is not None and not clauses:
+        return len(engine.select(keys))
+    r = connect_redis()
+    try:
+        prefix = get_active_prefix(r)
+        theme_prefix = get_active_prefix(r, 'theme')
+        keys = [(theme_prefix if key.startswith('theme:') else prefix, key) for key in keys]
+        epoch = content_epoch(r)
+        keys += [('', range_key(r, field, low, high, prefix, epoch)) for field, low, high in clauses]
+        return count_codes(r, keys)
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"统计筛选结果数量失败: {e}")
+        return None
+    finally:
+        r.close()
+
+
+# 分页筛选支持的接口（与 /stock/filter/{kind} 对应）
+FILTER_PAGE_KINDS = ('factors', 'themes', 'themes-and-factors', 'zhibiao', 'themes-factors-zhibiao')
+
+
+def _filter_page_sort_key(r, sort_by: str | None, themes: list, prefix: str, theme_prefix: str) -> str | None:
+    """
+    排序字段对应的有序集合：热度值取第一个题材的 theme:heat:{题材}，其余取 metric:{字段}
+    返回:str 完整键名，不排序时返回 None；有序集合不存在时抛出 ValueError
+    """
+    if not sort_by:
+        return None
+    if sort_by == '热度值' and themes:
+        key = f"{theme_prefix}{THEME_HEAT_PREFIX}{themes[0]}"
+    else:
+        key = metric_key(sort_by, prefix)
+    if not r.exists(key):
+        raise ValueError(f"不支持的排序字段: {sort_by}")
+    return key
+
+
+def _filter_page_info(r, kind: str, themes: list, factors: list, zhibiao: str | None, codes: list) -> dict:
+    """
+    只组装当页代码的字段：启用 Lua 时一次 EVALSHA 读取当页行，否则回退到完整查询后取当页
+    返回:dict 代码 -> 字段
+    """
+    if Config.LUA_SCREEN_ENABLED:
+        try:
+            if kind == 'factors':
+                return _lua_factors_info(r, factors, codes)
+            if kind == 'themes':
+                return _lua_themes_info(r, themes, codes)
+            if kind == 'themes-and-factors':
+                return _lua_multi_info(r, themes, factors, codes)
+            if kind == 'zhibiao':
+                return _lua_zhibiao_list_info(r, zhibiao, codes) or {}
+            return _lua_zhibiao_info(r, zhibiao, themes, factors, codes)
+        except Exception as e:
+            print(f"Lua 读取当页失败，回退到完整查询: {e}")
+    if kind == 'factors':
+        info = get_factors_info(factors)
+    elif kind == 'themes':
+        info = get_themes_info(themes)
+    elif kind == 'themes-and-factors':
+        info = get_multi_theme_and_factor_all_info(themes, factors)
+    elif kind == 'zhibiao':
+        info = get_zhibiao_info(zhibiao) or {}
+    else:
+        info = get_zhibiao_factor_theme_info(zhibiao, themes, factors)
+    return {code: info[code] for code in codes if code in info}
+
+
+def get_filter_page(kind: str, themes: list | None = None, factors: list | None = None, zhibiao: str | None = None,
+                    sort_by: str | None = None, order: str = 'desc', offset: int = 0, limit: int = 50,
+                    ranges: list | None = None) -> dict:
+    """
+    分页筛选：在 Redis 中求交（查询计划缓存结果集合），按指标有序集合排序后只取当页代码，
+    再只读取当页代码的字段，开销与页大小相关而不是与结果总数相关
+    kind:str FILTER_PAGE_KINDS 之一
+    ranges:list 指标区间 [{'metric': 'ROE', 'min': 10, 'max': 20}]，由 metric:{指标} 有序集合
+        ZRANGEBYSCORE 得到临时集合，与其他条件一起求交；当页各行附带区间指标的取值
+    sort_by:str 排序字段，如 ROE、大单净额、热度值（缺少该指标的代码排在最后）；不传时按代码排序
+    order:str desc / asc
+    offset:int 起始位置
+    limit:int 每页数量
+    返回:dict {'total', 'offset', 'limit', 'next_cursor', 'sort_by', 'order', 'items': [{'股票代码', ...}]}
+        next_cursor 为下一页的游标（没有下一页时为 None）
+    异常:ValueError 排序字段或区间条件不正确
+    """
+    themes, factors = themes or [], factors or []
+    clauses = parse_range_clauses(ranges) if ranges else []
+    page = {'total': 0, 'offset': offset, 'limit': limit, 'next_cursor': None,
+            'sort_by': sort_by, 'order': order, 'items': []}
+    r = connect_redis()
+    try:
+        prefix = get_active_prefix(r)
+        theme_prefix = get_active_prefix(r, 'theme')
+        keys = [f"{prefix}zhibiao:{zhibiao}"] if zhibiao else []
+        keys += [f"{theme_prefix}theme:{theme}" for theme in themes] + [f"{prefix}factor:{factor}" for factor in factors]
+        epoch = content_epoch(r)
+        keys += [range_key(r, field, low, high, prefix, epoch) for field, low, high in clauses]
+        score_key = _filter_page_sort_key(r, sort_by, themes, prefix, theme_prefix)
+        result_key = plan_intersection(r, keys, epoch)
+        if result_key is None:
+            return page
+        result = read_sorted_page(r, result_key, score_key, order, offset, limit, epoch)
+        info = _filter_page_info(r, kind, themes, factors, zhibiao, result['codes'])
+        range_fields = list(dict.fromkeys(field for field, _, _ in clauses))
+        pipe = r.pipeline(transaction=False)
+        for code in result['codes']:
+            for field in range_fields:
+                pipe.zscore(metric_key(field, prefix), code)
+        range_values = pipe.execute() if range_fields else []
+        for i, (code, score) in enumerate(zip(result['codes'], result['scores'])):
+            item = {'股票代码': code, **info.get(code, {})}
+            if sort_by and score is not None:
+                item.setdefault(sort_by, score)
+            for j, field in enumerate(range_fields):
+                item.setdefault(field, range_values[i * len(range_fields) + j])
+            page['items'].append(item)
+        page['total'] = result['total']
+        if offset + limit < result['total']:
+            page['next_cursor'] = str(offset + limit)
+        return page
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"分页筛选失败: {e}")
+        return page
+    finally:
+        r.close()
+
+
+def get_stock_themes(codes: list) -> dict:
+    """
+    获取股票所属的全部题材及明细（个股画像），通过 code:themes:{代码} 反向索引批量读取
+    codes:list 股票代码
+    返回:dict 代码 -> [{theme, desc, name, hot_num, trade_date, ...}]，按热度值从高到低排序
+    """
+    r = connect_redis()
+    try:
+        theme_prefix = get_active_prefix(r, 'theme')
+        return read_code_theme_details(r, list(dict.fromkeys(codes)), theme_prefix)
+    except Exception as e:
+        print(f"获取股票 {codes} 所属题材失败: {e}")
+        return {}
+    finally:
+        r.close()
+
+
+def get_theme_stocks(theme: str, sort_by: str = 'hot_num', order: str = 'desc', page: int = 1,
+                     page_size: int = 50) -> dict:
+    """
+    分页获取题材成分股明细，服务端按热度值或代码排序，每页只读取当页明细
+    theme:str 题材名
+    sort_by:str hot_num / code
+    order:str desc / asc
+    page:int 页码，从 1 开始
+    page_size:int 每页数量
+    返回:dict {'total', 'page', 'page_size', 'items': [{code, name, theme, desc, hot_num, trade_date, ...}]}
+    """
+    r = connect_redis()
+    try:
+        theme_prefix = get_active_prefix(r, 'theme')
+        result = read_theme_page(r, theme, theme_prefix, sort_by, order, (page - 1) * page_size, page_size)
+        return {'total': result['total'], 'page': page, 'page_size': page_size, 'items': result['items']}
+    except Exception as e:
+        print(f"获取题材 {theme} 成分股失败: {e}")
+        return {}
+    finally:
+        r.close()
+
+
+def get_factor_catalog() -> list:
+    """
+    获取因子目录：每个因子/指标集合的大小和新鲜度
+    返回:list [{key, size, updated_at, age_seconds, run_id, version}]，按键名排序
+    """
+    r = connect_redis()
+    try:
+        catalog = r.hgetall(FACTOR_CATALOG_KEY) or {}
+        now = datetime.now()
+        items = []
+        for key, raw in catalog.items():
+            entry = json.loads(raw)
+            entry['key'] = key
+            try:
+                entry['age_seconds'] = int((now - datetime.fromisoformat(entry['updated_at'])).total_seconds())
+            except (KeyError, ValueError):
+                entry['age_seconds'] = None
+            items.append(entry)
+        items.sort(key=lambda x: x['key'])
+        return items
+    except Exception as e:
+        print(f"获取因子目录失败: {e}")
+        return []
+    finally:
+        r.close()
+
+
+def get_redis_pool_stats() -> dict:
+    """
+    获取当前进程 Redis 连接池的使用情况
+    返回:dict {pid, max_connections, pools: {decoded/raw: {created, in_use, available}}}
+    """
+    return pool_stats()
+
+
+def get_ingest_report(run_id: str | None = None) -> dict:
+    """
+    获取某次导入运行的性能报告
+    run_id:str 运行ID，默认最近一次
+    返回:dict {run_id, summary, steps}，不存在时返回 {}
+    """
+    r = connect_redis()
+    try:
+        run_id = run_id or r.get('meta:ingest:latest')
+        if not run_id:
+            return {}
+        data = r.hgetall(f"meta:ingest:{run_id}") or {}
+        if not data:
+            return {}
+        summary = json.loads(data.pop('_summary', '{}'))
+        steps = {name: json.loads(raw) for name, raw in data.items()}
+        return {'run_id': run_id, 'summary': summary, 'steps': steps}
+    except Exception as e:
+        print(f"获取导入报告 {run_id} 失败: {e}")
+        return {}
+    finally:
+        r.close()
+
+
 def get_detail_info_by_code(code: str) -> dict:
     """
     获取股票代码对应的所有信息
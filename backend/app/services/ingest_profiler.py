@@ -0,0 +1,170 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from ..config import Config
+
+# 每个步骤记录的指标
+STEP_METRICS = ('wall_s', 'upstream_s', 'redis_s', 'rows', 'members', 'redis_commands', 'peak_mem_kb')
+
+# 因子目录：集合键（不含版本前缀）-> {size, updated_at, run_id, version}
+FACTOR_CATALOG_KEY = 'meta:factor:catalog'
+
+
+def count_rows(data) -> int:
+    """拉取结果的行数（DataFrame 或 dict）"""
+    if data is None:
+        return 0
+    if isinstance(data, dict):
+        codes = data.get('code')
+        return len(codes) if isinstance(codes, list) else int(codes is not None)
+    return len(data)
+
+
+def count_members(result: dict | None) -> int:
+    """从写入统计中取出写入的成员数（集合成员 + 哈希行）"""
+    if not result:
+        return 0
+    return sum(result.get(key, 0) for key in ('added', 'existing', 'kept', 'written'))
+
+
+class IngestProfiler:
+    """
+    数据导入运行的性能记录
+    - 每个步骤（如 technical2factor('MACD_金叉')、theme_to_redis）记录：
+      总耗时、上游拉取耗时、Redis 写入耗时、收到行数、写入成员数、Redis 命令数、Python 内存峰值
+    - save() 写入 meta:ingest:{run_id} 哈希（步骤 -> JSON）以及 JSON 报告文件
+    注意：内存峰值来自 tracemalloc，统计的是整个进程（包括并发拉取线程）在该步骤期间的峰值；
+    tracemalloc 会拖慢每一次内存分配，默认关闭（INGEST_TRACE_MEMORY），关闭时内存峰值记为 0
+    """
+
+    def __init__(self, run_id: str | None = None, trace_memory: bool | None = None):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d%H%M%S')
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.steps = {}
+        self._started = time.perf_counter()
+        if trace_memory is None:
+            trace_memory = Config.INGEST_TRACE_MEMORY
+        self._own_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start()
+
+    @contextmanager
+    def step(self, name: str, upstream_s: float = 0.0):
+        """
+        记录一个步骤；块内可向 yield 出的 dict 填写 rows/members/redis_commands，
+        并用 timed() 统计 upstream_s / redis_s
+        name:str 步骤名称
+        upstream_s:float 已在其他线程中完成的上游拉取耗时
+        """
+        metrics = {'upstream_s': upstream_s, 'redis_s': 0.0, 'rows': 0, 'members': 0, 'redis_commands': 0}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics['wall_s'] = upstream_s + time.perf_counter() - started
+            metrics['peak_mem_kb'] = tracemalloc.get_traced_memory()[1] // 1024 if tracing else 0
+            self.record(name, **metrics)
+
+    @contextmanager
+    def timed(self, metrics: dict, key: str):
+        """累加块内耗时到 metrics[key]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics[key] = metrics.get(key, 0.0) + time.perf_counter() - started
+
+    def record(self, name: str, **metrics) -> None:
+        """合并一个步骤的指标（同名步骤累加，内存峰值取最大）"""
+        step = self.steps.setdefault(name, {key: 0 for key in STEP_METRICS})
+        for key, value in metrics.items():
+            if key == 'peak_mem_kb':
+                step[key] = max(step.get(key, 0), value)
+            else:
+                step[key] = step.get(key, 0) + value
+
+    def report(self) -> dict:
+        """生成本次运行的汇总报告"""
+        steps = {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in m.items()}
+                 for name, m in self.steps.items()}
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self._started, 3),
+            'peak_mem_kb': tracemalloc.get_traced_memory()[1] // 1024 if tracemalloc.is_tracing() else 0,
+            'steps': steps,
+        }
+
+    def save(self, r) -> dict:
+        """
+        保存报告：meta:ingest:{run_id} 哈希、meta:ingest:latest 指针、JSON 报告文件
+        r:redis.Redis 连接对象
+        返回:dict 报告内容
+        """
+        report = self.report()
+        key = f"meta:ingest:{self.run_id}"
+        mapping = {name: json.dumps(m, ensure_ascii=False) for name, m in report['steps'].items()}
+        mapping['_summary'] = json.dumps({k: v for k, v in report.items() if k != 'steps'}, ensure_ascii=False)
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, Config.INGEST_REPORT_TTL_DAYS * 86400)
+        pipe.set('meta:ingest:latest', self.run_id)
+        pipe.execute()
+
+        try:
+            os.makedirs(Config.INGEST_REPORT_DIR, exist_ok=True)
+            path = os.path.join(Config.INGEST_REPORT_DIR, f"ingest_{self.run_id}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"导入报告已写入 {path}")
+        except IOError as e:
+            print(f"写入导入报告失败: {e}")
+
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+        return report
+
+
+def update_factor_catalog(r, prefix: str, run_id: str, version=None, replace: bool = True,
+                          patterns=('factor:*', 'zhibiao:*')) -> int:
+    """
+    刷新因子目录：记录每个因子/指标集合的大小和更新时间，供查询端报告数据新鲜度
+    r:redis.Redis 连接对象
+    prefix:str 刚发布（或增量更新）的版本键前缀
+    run_id:str 本次导入运行ID
+    version:int 数据版本
+    replace:bool True 时整体替换目录（全量构建），否则只更新已有条目
+    返回:int 记录的集合数量
+    """
+    keys = []
+    for pattern in patterns:
+        keys.extend(r.scan_iter(match=f"{prefix}{pattern}", count=1000, _type='set'))
+    if not keys:
+        return 0
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.scard(key)
+    sizes = pipe.execute()
+
+    updated_at = datetime.now().isoformat(timespec='seconds')
+    mapping = {
+        key[len(prefix):]: json.dumps(
+            {'size': size, 'updated_at': updated_at, 'run_id': run_id, 'version': version},
+            ensure_ascii=False,
+        )
+        for key, size in zip(keys, sizes)
+    }
+    pipe = r.pipeline(transaction=True)
+    if replace:
+        pipe.delete(FACTOR_CATALOG_KEY)
+    pipe.hset(FACTOR_CATALOG_KEY, mapping=mapping)
+    pipe.execute()
+    return len(mapping)
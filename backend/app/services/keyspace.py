@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from ..config import Config
+
+# 数据集 -> 版本化键前缀标记，如 data 版本 3 的键为 v3:factor:MACD_金叉，theme 版本 5 的键为 tv5:theme:机器人
+DATASETS = {
+    'data': 'v',
+    'theme': 'tv',
+}
+
+# 版本化之前（无前缀）遗留的键模式，首次发布新版本后回收
+LEGACY_PATTERNS = {
+    'data': ['factor:*', 'zhibiao:*', 'code:*'],
+    'theme': ['theme:*', 'bm:theme:*'],
+}
+
+# 按交易日保存的历史数据键前缀标记，如 20250915 的题材键为 td20250915:theme:机器人
+DATED_PREFIXES = {
+    'theme': 'td',
+}
+
+# 版本切换事件频道：消息为 {"dataset": ..., "version": ...}，Web 进程据此热加载进程内数据
+VERSION_EVENTS_CHANNEL = 'meta:version:events'
+
+
+def version_pointer(dataset: str = 'data') -> str:
+    """当前生效版本的指针键"""
+    return f"meta:version:{dataset}"
+
+
+def version_prefix(version, dataset: str = 'data') -> str:
+    """
+    获取版本对应的键前缀
+    version:int 版本号，None 表示未版本化的旧数据
+    返回:str 键前缀，如 'v3:'
+    """
+    if version is None:
+        return ''
+    return f"{DATASETS[dataset]}{version}:"
+
+
+def allocate_version(r, dataset: str = 'data') -> int:
+    """分配一个新的暂存版本号"""
+    return int(r.incr(f"{version_pointer(dataset)}:seq"))
+
+
+def get_active_version(r, dataset: str = 'data'):
+    """
+    获取当前生效的版本号
+    返回:int 版本号，尚未发布过版本时返回 None
+    """
+    version = r.get(version_pointer(dataset))
+    return int(version) if version else None
+
+
+def get_active_prefix(r, dataset: str = 'data') -> str:
+    """获取当前生效版本的键前缀，读取方用它拼接所有数据键"""
+    return version_prefix(get_active_version(r, dataset), dataset)
+
+
+def publish_version(r, version: int, dataset: str = 'data'):
+    """
+    原子切换生效版本，并在后台回收上一个版本
+    version:int 已构建完成的版本号
+    返回:int 被替换的旧版本号（可能为 None）
+    """
+    old = r.getset(version_pointer(dataset), version)
+    old = int(old) if old else None
+    print(f"{dataset} 数据已切换到版本 {version}（旧版本 {old}）")
+    publish_event(r, dataset, version)
+    if old != version:
+        reclaim_version_async(old, dataset)
+    return old
+
+
+def publish_event(r, dataset: str, version) -> int:
+    """
+    广播版本切换事件（Redis pub/sub），失败不影响导入
+    dataset:str 数据集，如 data / theme / snapshot
+    version: 新版本号或交易日
+    返回:int 收到消息的订阅者数量
+    """
+    try:
+        return r.publish(VERSION_EVENTS_CHANNEL, json.dumps({'dataset': dataset, 'version': version}))
+    except Exception as e:
+        print(f"广播 {dataset} 版本事件失败: {e}")
+        return 0
+
+
+def _version_patterns(version, dataset: str) -> list:
+    if version is None:
+        return LEGACY_PATTERNS.get(dataset, [])
+    return [f"{version_prefix(version, dataset)}*"]
+
+
+def _unlink_matching(r, pattern: str) -> int:
+    """SCAN + UNLINK 删除匹配的键，返回删除数量"""
+    count = 0
+    pipe = r.pipeline(transaction=False)
+    for key in r.scan_iter(match=pattern, count=1000):
+        pipe.unlink(key)
+        count += 1
+        if len(pipe) >= Config.REDIS_WRITE_CHUNK_SIZE:
+            pipe.execute()
+    pipe.execute()
+    return count
+
+
+def reclaim_version(r, version, dataset: str = 'data') -> int:
+    """
+    使用 SCAN + UNLINK 删除某个版本的全部键（UNLINK 在 Redis 后台释放内存）
+    返回:int 删除的键数量
+    """
+    count = sum(_unlink_matching(r, pattern) for pattern in _version_patterns(version, dataset))
+    print(f"回收 {dataset} 版本 {version}：删除 {count} 个键")
+    return count
+
+
+def discard_version(r, version: int, dataset: str = 'data') -> int:
+    """丢弃构建失败的暂存版本"""
+    if version is None:
+        return 0
+    return reclaim_version(r, version, dataset)
+
+
+def reclaim_version_async(version, dataset: str = 'data', delay: int | None = None) -> threading.Thread:
+    """
+    延迟后在后台线程中回收旧版本，给仍在读取旧版本的请求留出时间
+    delay:int 延迟秒数，默认取 Config.VERSION_RECLAIM_DELAY
+    """
+    from .data_service import connect_redis
+
+    delay = Config.VERSION_RECLAIM_DELAY if delay is None else delay
+
+    def _reclaim():
+        time.sleep(delay)
+        r = connect_redis()
+        try:
+            reclaim_version(r, version, dataset)
+        except Exception as e:
+            print(f"回收 {dataset} 版本 {version} 失败: {e}")
+        finally:
+            r.close()
+
+    thread = threading.Thread(target=_reclaim, name=f"reclaim-{dataset}-{version}")
+    thread.start()
+    return thread
+
+
+def dated_prefix(trade_date: str, dataset: str = 'theme') -> str:
+    """某个交易日历史数据的键前缀，如 'td20250915:'"""
+    return f"{DATED_PREFIXES[dataset]}{trade_date}:"
+
+
+def dated_index_key(dataset: str = 'theme') -> str:
+    """已写入历史数据的交易日有序集合（分值为交易日数字）"""
+    return f"meta:history:{dataset}"
+
+
+def reclaim_dated(r, trade_date: str, dataset: str = 'theme') -> int:
+    """删除某个交易日的历史数据（重新回补同一天前调用）"""
+    count = _unlink_matching(r, f"{dated_prefix(trade_date, dataset)}*")
+    r.zrem(dated_index_key(dataset), trade_date)
+    return count
@@ -0,0 +1,154 @@
+import hashlib
+import json
+
+from redis.exceptions import NoScriptError
+from .redis_pool import get_client
+from .keyspace import DATASETS, version_pointer
+
+# 服务端筛选：一次 EVALSHA 完成“解析版本前缀 -> 集合求交 -> 按代码投影字段”
+# KEYS 为用到的数据集的版本指针键（meta:version:data / meta:version:theme）
+# ARGV[1] 为 JSON：
+#   prefixes: 数据集 -> [版本指针在 KEYS 中的序号, 前缀标记]，脚本内 GET 指针拼出 'v3:' / 'tv5:'（未版本化时为 ''）
+#   sets:     [[数据集, 集合键名]]，求交（一个集合时为 SMEMBERS）
+#   rows:     [[数据集, 哈希键前缀, [字段]]]，对每个代码 HMGET {前缀}{哈希键前缀}{代码}
+#   hashes:   [[数据集, 哈希键名]]，与代码无关的哈希（如 theme:meta:{题材}），HGETALL 一次
+#   codes:    可选，直接给出代码列表（如分页后的当页代码），不再求交，只投影这些代码的字段
+# 返回 {代码列表, 每个代码的 [各 rows 的 HMGET 结果], [各 hashes 的 HGETALL 结果]}
+# 版本指针和数据在同一个脚本中读取，不会读到切换中途的两个版本
+# 注意：数据键依赖指针的值，只能在脚本内拼出，无法预先通过 KEYS 声明，因此只支持单实例 Redis
+# （Redis Cluster 下这些键不保证与指针在同一个槽位）
+SCREEN_SCRIPT = """
+local spec = cjson.decode(ARGV[1])
+local prefixes = {}
+for dataset, pointer in pairs(spec.prefixes) do
+    local version = redis.call('GET', KEYS[pointer[1]])
+    prefixes[dataset] = version and (pointer[2] .. version .. ':') or ''
+end
+local keys = {}
+for i, item in ipairs(spec.sets) do
+    keys[i] = prefixes[item[1]] .. item[2]
+end
+local codes = {}
+if spec.codes then
+    codes = spec.codes
+elseif #keys == 1 then
+    codes = redis.call('SMEMBERS', keys[1])
+elseif #keys > 1 then
+    codes = redis.call('SINTER', unpack(keys))
+end
+local hashes = {}
+for i, item in ipairs(spec.hashes) do
+    hashes[i] = redis.call('HGETALL', prefixes[item[1]] .. item[2])
+end
+local rows = {}
+for c, code in ipairs(codes) do
+    local row = {}
+    for p, item in ipairs(spec.rows) do
+        row[p] = redis.call('HMGET', prefixes[item[1]] .. item[2] .. code, unpack(item[3]))
+    end
+    rows[c] = row
+end
+return {codes, rows, hashes}
+"""
+
+# 区间集合：ZRANGEBYSCORE 取指标在 [min, max] 内的代码，在服务端写入临时集合（代码不经过客户端）
+# KEYS[1] 目标集合，KEYS[2] 指标有序集合；ARGV 为 min、max（支持 -inf / +inf）、过期秒数
+# 返回写入的代码数量；没有代码时不创建目标集合
+RANGE_SET_SCRIPT = """
+local codes = redis.call('ZRANGEBYSCORE', KEYS[2], ARGV[1], ARGV[2])
+redis.call('DEL', KEYS[1])
+for i = 1, #codes, 1000 do
+    redis.call('SADD', KEYS[1], unpack(codes, i, math.min(i + 999, #codes)))
+end
+if #codes > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return #codes
+"""
+
+# 脚本名 -> 源码
+SCRIPTS = {
+    'screen': SCREEN_SCRIPT,
+    'range_set': RANGE_SET_SCRIPT,
+}
+
+# 脚本名 -> SHA1（与 SCRIPT LOAD 返回值一致，可在本地直接算出）
+SCRIPT_SHAS = {name: hashlib.sha1(source.encode('utf-8')).hexdigest() for name, source in SCRIPTS.items()}
+
+
+def load_scripts(r) -> dict:
+    """
+    把全部脚本注册到 Redis 脚本缓存（SCRIPT LOAD）
+    返回:dict 脚本名 -> SHA1
+    """
+    return {name: r.script_load(source) for name, source in SCRIPTS.items()}
+
+
+def preload_scripts() -> bool:
+    """启动时预加载脚本；Redis 不可用时只打印日志，首次调用时会再注册"""
+    try:
+        r = get_client()
+        try:
+            load_scripts(r)
+        finally:
+            r.close()
+        print(f"已预加载 {len(SCRIPTS)} 个 Lua 脚本")
+        return True
+    except Exception as e:
+        print(f"预加载 Lua 脚本失败: {e}")
+        return False
+
+
+def evalsha(r, name: str, keys=(), args=()):
+    """
+    按 SHA1 执行脚本；Redis 重启或 SCRIPT FLUSH 后出现 NOSCRIPT 时重新注册并重试一次
+    r:redis.Redis 连接对象
+    name:str 脚本名
+    """
+    keys, args = list(keys), list(args)
+    try:
+        return r.evalsha(SCRIPT_SHAS[name], len(keys), *keys, *args)
+    except NoScriptError:
+        print(f"Lua 脚本 {name} 不在 Redis 缓存中，重新注册")
+        load_scripts(r)
+        return r.evalsha(SCRIPT_SHAS[name], len(keys), *keys, *args)
+
+
+def screen(r, sets: list, rows: list = (), hashes: list = (), codes: list | None = None) -> tuple:
+    """
+    服务端筛选（一次往返）
+    r:redis.Redis 连接对象（decode_responses=True）
+    sets:list [(数据集, 集合键名)]，如 [('data', 'factor:MACD_金叉'), ('theme', 'theme:机器人')]
+    rows:list [(数据集, 哈希键前缀, [字段])]，如 [('data', 'code:', ['股票简称'])]
+    hashes:list [(数据集, 哈希键名)]，如 [('theme', 'theme:meta:机器人')]
+    codes:list 只读取这些代码的字段（跳过求交，如分页后的当页代码）
+    返回:tuple (codes, values, hashes)
+        codes:list 交集中的代码
+        values:list 与 codes 对应，每项为 [各 rows 的字段值列表]（缺失为 None）
+        hashes:list 与 hashes 对应的字典
+    """
+    datasets = sorted({dataset for dataset, *_ in list(sets) + list(rows) + list(hashes)})
+    spec = {
+        'prefixes': {dataset: [i + 1, DATASETS[dataset]] for i, dataset in enumerate(datasets)},
+        'sets': [list(item) for item in sets],
+        'rows': [[dataset, key_prefix, list(fields)] for dataset, key_prefix, fields in rows],
+        'hashes': [list(item) for item in hashes],
+    }
+    if codes is not None:
+        spec['codes'] = list(codes)
+    pointers = [version_pointer(dataset) for dataset in datasets]
+    codes, values, flat_hashes = evalsha(r, 'screen', pointers, [json.dumps(spec, ensure_ascii=False)])
+    return codes, values, [dict(zip(flat[::2], flat[1::2])) for flat in flat_hashes]
+
+
+def range_set(r, dest: str, source: str, low: str, high: str, ttl: int) -> int:
+    """
+    把有序集合中分值在 [low, high] 内的成员写入集合 dest（一次 EVALSHA，成员不经过客户端）
+    r:redis.Redis 连接对象
+    dest:str 目标集合键名
+    source:str 指标有序集合键名
+    low/high:str 区间边界，如 '10'、'-inf'
+    ttl:int 目标集合的过期秒数
+    返回:int 写入的成员数量
+    """
+    return evalsha(r, 'range_set', [dest, source], [low, high, ttl])
@@ -0,0 +1,197 @@
+import hashlib
+import math
+
+from .factor_buckets import convert_series
+from .redis_writer import bulk_sadd, bulk_zadd_groups
+from .query_planner import result_ttl, content_epoch
+from .lua_scripts import range_set
+from ..config import Config
+
+# 指标有序集合：metric:{字段}，成员为股票代码，分值为展示单位的数值（与 convert_factor_value 一致）
+# 与 code:{代码} 哈希在同一次写入中维护，用于按指标排序分页和区间筛选
+METRIC_PREFIX = 'metric:'
+# 排序视图：cache:sort:{内容纪元|结果键|排序键|方向 的 SHA1}，带 TTL
+SORT_CACHE_PREFIX = 'cache:sort:'
+# 区间集合：cache:range:{内容纪元|指标键|下限|上限 的 SHA1}，带 TTL，可与其他集合一起交给查询计划求交
+RANGE_CACHE_PREFIX = 'cache:range:'
+# 不参与排序的文本字段
+NON_METRIC_FIELDS = ('股票简称',)
+
+
+def metric_key(field: str, prefix: str = '') -> str:
+    """指标有序集合的完整键名，如 v3:metric:ROE"""
+    return f"{prefix}{METRIC_PREFIX}{field}"
+
+
+def metric_groups(frame, prefix: str = '') -> dict:
+    """
+    把 select_columns() 的结果换算为指标有序集合
+    frame:DataFrame 列为字段名、索引为代码
+    返回:dict {metric:{字段}: {代码: 展示值}}，空值跳过
+    """
+    groups = {}
+    if frame is None or frame.empty:
+        return groups
+    for field in frame.columns:
+        if field in NON_METRIC_FIELDS:
+            continue
+        values = convert_series(field, frame[field].to_numpy())
+        values.index = frame.index
+        values = values[values.notna()]
+        if len(values):
+            groups[metric_key(field, prefix)] = dict(zip(values.index.tolist(), values.tolist()))
+    return groups
+
+
+def metric_members(r, fields, prefix: str = '') -> dict:
+    """
+    读取指标有序集合的当前成员（一次 pipeline）
+    fields: 字段名列表，文本字段自动跳过
+    返回:dict {metric:{字段}: 成员代码集合}
+    """
+    keys = [metric_key(field, prefix) for field in fields if field not in NON_METRIC_FIELDS]
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.zrange(key, 0, -1)
+    return {key: set(members) for key, members in zip(keys, pipe.execute() if keys else [])}
+
+
+def write_metrics(r, frame, prefix: str = '', chunk_size: int | None = None, previous: dict | None = None) -> dict:
+    """
+    写入指标有序集合（ZADD 覆盖分值）
+    previous:dict 增量更新时传入写入前的成员（metric_members），本次结果中已没有该指标的代码
+        （退出股票池或指标缺失）随后 ZREM，避免旧分值继续参与区间筛选和排序
+    返回:dict {'commands', 'round_trips', 'removed'}
+    """
+    groups = metric_groups(frame, prefix)
+    stats = bulk_zadd_groups(r, groups, chunk_size)
+    stats['removed'] = 0
+    if not previous:
+        return stats
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for key, members in previous.items():
+        stale = list(members - set(groups.get(key, ())))
+        stats['removed'] += len(stale)
+        for i in range(0, len(stale), chunk_size):
+            pipe.zrem(key, *stale[i:i + chunk_size])
+    if len(pipe):
+        stats['commands'] += len(pipe)
+        stats['round_trips'] += 1
+        pipe.execute()
+    return stats
+
+
+def parse_range_clauses(clauses) -> list:
+    """
+    校验区间筛选条件
+    clauses:list [{'metric': 'ROE', 'min': 10, 'max': 20}]，min / max 可省略其一（闭区间，展示单位）
+        边界必须是有限数值，NaN / inf 视为格式错误（不限的一侧直接省略）
+    返回:list [(指标, 下限, 上限)]，省略的边界为 None
+    异常:ValueError 条件格式不正确
+    """
+    if not isinstance(clauses, list):
+        raise ValueError('区间条件必须是列表')
+    parsed = []
+    for clause in clauses:
+        if not isinstance(clause, dict) or not clause.get('metric'):
+            raise ValueError('区间条件缺少指标名称')
+        low, high = clause.get('min'), clause.get('max')
+        if low is None and high is None:
+            raise ValueError(f"区间条件 {clause['metric']} 至少需要 min 或 max")
+        try:
+            low = None if low is None else float(low)
+            high = None if high is None else float(high)
+        except (TypeError, ValueError):
+            raise ValueError(f"区间条件 {clause['metric']} 的边界不是数值")
+        if any(bound is not None and not math.isfinite(bound) for bound in (low, high)):
+            raise ValueError(f"区间条件 {clause['metric']} 的边界必须是有限数值")
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"区间条件 {clause['metric']} 的 min 大于 max")
+        parsed.append((str(clause['metric']), low, high))
+    return parsed
+
+
+def range_key(r, field: str, low: float | None, high: float | None, prefix: str = '',
+              epoch: str | None = None) -> str:
+    """
+    指标区间对应的临时集合（cache:range:*），相同的指标和边界复用同一个集合
+    - 启用 Lua 时在服务端 ZRANGEBYSCORE 后 SADD，否则取回代码后批量 SADD
+    - 区间内没有代码时不创建集合，交给查询计划时按空集处理
+    r:redis.Redis 连接对象
+    field:str 指标名称，如 ROE
+    low/high:float 闭区间边界，None 表示不限
+    prefix:str 数据版本键前缀
+    epoch:str 内容纪元（query_planner.content_epoch），None 时从 Redis 读取
+    返回:str 集合键名
+    异常:ValueError 指标有序集合不存在
+    """
+    source = metric_key(field, prefix)
+    low = '-inf' if low is None else repr(low)
+    high = '+inf' if high is None else repr(high)
+    epoch = content_epoch(r) if epoch is None else epoch
+    canonical = f"{epoch}\n{source}\n{low}\n{high}"
+    key = f"{RANGE_CACHE_PREFIX}{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+    ttl = result_ttl()
+    if r.expire(key, ttl):
+        return key
+    if not r.exists(source):
+        raise ValueError(f"不支持的筛选指标: {field}")
+    if Config.LUA_SCREEN_ENABLED:
+        range_set(r, key, source, low, high, ttl)
+    else:
+        codes = r.zrangebyscore(source, low, high)
+        if codes:
+            bulk_sadd(r, key, codes)
+            r.expire(key, ttl)
+    return key
+
+
+def sorted_view(r, result_key: str, score_key: str | None = None, order: str = 'desc',
+                epoch: str | None = None) -> str:
+    """
+    把筛选结果集合按指标排好序，保存为带 TTL 的有序集合（相同的结果集合和排序复用同一个视图）
+    - 有排序键：ZINTERSTORE 取结果集合中各代码的指标值，再 ZUNIONSTORE 补回缺少指标的代码，
+      分值记为 -inf（降序）/ +inf（升序），始终排在最后
+    - 无排序键：分值全为 0，按代码字典序排列
+    r:redis.Redis 连接对象
+    result_key:str 筛选结果集合的完整键名
+    score_key:str 提供分值的有序集合完整键名（metric:{字段} 或 theme:heat:{题材}）
+    order:str desc / asc
+    epoch:str 内容纪元（query_planner.content_epoch），None 时从 Redis 读取
+    返回:str 排序视图的键名
+    """
+    epoch = content_epoch(r) if epoch is None else epoch
+    canonical = f"{epoch}\n{result_key}\n{score_key or ''}\n{order}"
+    key = f"{SORT_CACHE_PREFIX}{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+    ttl = result_ttl()
+    if r.expire(key, ttl):
+        return key
+    pipe = r.pipeline(transaction=False)
+    if score_key is None:
+        pipe.zunionstore(key, {result_key: 0})
+    else:
+        missing = float('-inf') if order == 'desc' else float('inf')
+        pipe.zinterstore(key, {result_key: 0, score_key: 1})
+        pipe.zunionstore(key, {key: 1, result_key: missing}, aggregate='MAX' if order == 'desc' else 'MIN')
+    pipe.expire(key, ttl)
+    pipe.execute()
+    return key
+
+
+def read_sorted_page(r, result_key: str, score_key: str | None = None, order: str = 'desc',
+                     offset: int = 0, limit: int = 50, epoch: str | None = None) -> dict:
+    """
+    读取排序后的一页代码：只按排名 ZRANGE 当页成员，开销与页大小相关
+    返回:dict {'total': 总数, 'codes': 当页代码, 'scores': 当页指标值（缺少指标或无排序键时为 None）}
+    """
+    view = sorted_view(r, result_key, score_key, order, epoch)
+    pipe = r.pipeline(transaction=False)
+    pipe.zcard(view)
+    if order == 'desc':
+        pipe.zrevrange(view, offset, offset + limit - 1, withscores=True)
+    else:
+        pipe.zrange(view, offset, offset + limit - 1, withscores=True)
+    total, rows = pipe.execute()
+    scores = [None if score_key is None or math.isinf(score) else score for _, score in rows]
+    return {'total': total, 'codes': [code for code, _ in rows], 'scores': scores}
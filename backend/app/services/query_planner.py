@@ -0,0 +1,110 @@
+import hashlib
+
+from ..config import Config
+
+# 交集缓存：cache:inter:{内容纪元 + 排序后的完整键名列表的 SHA1}，带 TTL
+# 键名包含版本前缀，数据版本切换后自然不再命中，TTL 只用于回收内存
+INTERSECT_CACHE_PREFIX = 'cache:inter:'
+# 内容纪元：增量更新直接在生效版本上同步集合和指标（键名不变），完成后递增；
+# 纪元混入交集、区间集合、排序视图的缓存键，就地修改前算出的缓存不再命中
+CONTENT_EPOCH_KEY = 'meta:epoch:data'
+# 关闭缓存（INTERSECT_CACHE_TTL <= 0）时，分页等需要结果键的查询中结果键保留的秒数
+RESULT_KEY_TTL = 60
+
+
+def _epoch_str(value) -> str:
+    if value is None:
+        return ''
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def content_epoch(r) -> str:
+    """当前内容纪元（尚未增量更新过时为空字符串）"""
+    return _epoch_str(r.get(CONTENT_EPOCH_KEY))
+
+
+def bump_content_epoch(r) -> int:
+    """增量更新完成后递增内容纪元，返回新的纪元"""
+    return int(r.incr(CONTENT_EPOCH_KEY))
+
+
+def cache_key(keys, epoch: str = '') -> str:
+    """一组集合键在某个内容纪元下的交集缓存键名（与键的顺序无关）"""
+    canonical = '\n'.join([epoch, *sorted(set(keys))])
+    return f"{INTERSECT_CACHE_PREFIX}{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+
+
+def result_ttl() -> int:
+    """交集结果键、排序视图的过期时间（秒）"""
+    return Config.INTERSECT_CACHE_TTL if Config.INTERSECT_CACHE_TTL > 0 else RESULT_KEY_TTL
+
+
+def order_by_cardinality(r, keys: list) -> tuple:
+    """
+    按集合大小从小到大排序，同一次 pipeline 读取内容纪元
+    返回:tuple ([(键名, 成员数)], 内容纪元)
+    """
+    pipe = r.pipeline(transaction=False)
+    pipe.get(CONTENT_EPOCH_KEY)
+    for key in keys:
+        pipe.scard(key)
+    epoch, *sizes = pipe.execute()
+    return sorted(zip(keys, sizes), key=lambda item: item[1]), _epoch_str(epoch)
+
+
+def plan_intersection(r, keys: list, epoch: str | None = None) -> str | None:
+    """
+    在 Redis 中完成多个集合求交，返回保存结果的键名
+    - 按 SCARD 从小到大排列，依次 SINTERSTORE 到前缀交集的缓存键（cache:inter:*，带 TTL）
+    - 已缓存的最长前缀直接复用，相同或共享最小集合的筛选只需补算剩余部分
+    - 复用时用 EXPIRE 同时检查存在并续期，避免缓存在使用前过期
+    r:redis.Redis 连接对象
+    keys:list 完整集合键名（含版本前缀）
+    epoch:str 调用方已读取的内容纪元，None 时随 SCARD 一起读取
+    返回:str 结果键名（只有一个集合时为该集合本身），任一集合为空时返回 None
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return None
+    ordered, stored = order_by_cardinality(r, keys)
+    epoch = stored if epoch is None else epoch
+    if ordered[0][1] == 0:
+        return None
+    keys = [key for key, _ in ordered]
+    if len(keys) == 1:
+        return keys[0]
+
+    ttl = result_ttl()
+    # steps[i] 保存 keys[:i + 2] 的交集
+    steps = [cache_key(keys[:i + 2], epoch) for i in range(len(keys) - 1)]
+    pipe = r.pipeline(transaction=False)
+    for step in steps:
+        pipe.expire(step, ttl)
+    cached = [i for i, hit in enumerate(pipe.execute()) if hit]
+
+    start = cached[-1] + 1 if cached else 0
+    source = steps[start - 1] if start else keys[0]
+    if start == len(steps):
+        return source
+    pipe = r.pipeline(transaction=False)
+    for i in range(start, len(steps)):
+        pipe.sinterstore(steps[i], source, keys[i + 1])
+        pipe.expire(steps[i], ttl)
+        source = steps[i]
+    sizes = pipe.execute()[::2]
+    return steps[-1] if sizes[-1] else None
+
+
+def intersect(r, keys: list, count_only: bool = False):
+    """
+    多个集合求交（见 plan_intersection）
+    count_only:bool 只返回交集大小（SCARD），不传输成员，适合范围很大的筛选
+    返回:set 股票代码集合，或 int 交集大小
+    """
+    if Config.INTERSECT_CACHE_TTL <= 0:
+        codes = r.sinter(*keys) if keys else set()
+        return len(codes) if count_only else codes
+    result = plan_intersection(r, keys)
+    if result is None:
+        return 0 if count_only else set()
+    return r.scard(result) if count_only else r.smembers(result)
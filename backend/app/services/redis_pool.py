@@ -0,0 +1,100 @@
+import os
+import threading
+
+import redis
+from ..config import Config
+
+# 进程号 -> {decode_responses: BlockingConnectionPool}
+# fork 出的子进程（多 worker 部署）不能复用父进程的套接字，按进程号重新建池
+_pools = {}
+_lock = threading.Lock()
+
+
+def _create_pool(decode_responses: bool) -> redis.BlockingConnectionPool:
+    """
+    按配置创建连接池：空闲连接定期 PING 检查，断线的连接在借出前自动重连；
+    连接全部借出时最多等待 REDIS_POOL_TIMEOUT 秒，而不是立即抛出 Too many connections
+    """
+    return redis.BlockingConnectionPool(
+        host=Config.REDIS_LOCALHOST,
+        port=Config.REDIS_PORT,
+        db=Config.REDIS_DB,
+        password=Config.REDIS_PASSWORD,
+        socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=Config.REDIS_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+        max_connections=Config.REDIS_POOL_MAX_CONNECTIONS,
+        timeout=Config.REDIS_POOL_TIMEOUT,
+        decode_responses=decode_responses,
+    )
+
+
+def get_pool(decode_responses: bool = True) -> redis.BlockingConnectionPool:
+    """
+    获取当前进程的共享连接池（字符串与二进制响应各一个）
+    decode_responses:bool 是否将响应解码为字符串
+    返回:redis.BlockingConnectionPool
+    """
+    pid = os.getpid()
+    pools = _pools.get(pid)
+    if pools is None or decode_responses not in pools:
+        with _lock:
+            if pid not in _pools:
+                # 丢弃从父进程继承来的连接池（不关闭其套接字，父进程仍在使用）
+                _pools.clear()
+                _pools[pid] = {}
+            pools = _pools[pid]
+            if decode_responses not in pools:
+                pools[decode_responses] = _create_pool(decode_responses)
+    return pools[decode_responses]
+
+
+def get_client(decode_responses: bool = True) -> redis.Redis:
+    """
+    从共享连接池借用客户端；close() 只归还连接，不会断开连接池
+    返回:redis.Redis
+    """
+    return redis.Redis(connection_pool=get_pool(decode_responses))
+
+
+def create_subscriber(decode_responses: bool = True) -> redis.Redis:
+    """
+    创建 pub/sub 监听专用的独立连接（不占用共享连接池）
+    - 不设读超时：空闲时阻塞等待消息不会因 socket_timeout 抛出 TimeoutError 而断线重连
+    - 按 REDIS_HEALTH_CHECK_INTERVAL 在空闲连接上 PING，仍能发现已断开的连接
+    返回:redis.Redis
+    """
+    return redis.Redis(
+        host=Config.REDIS_LOCALHOST,
+        port=Config.REDIS_PORT,
+        db=Config.REDIS_DB,
+        password=Config.REDIS_PASSWORD,
+        socket_timeout=None,
+        socket_connect_timeout=Config.REDIS_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=decode_responses,
+    )
+
+
+def pool_stats() -> dict:
+    """
+    当前进程连接池的使用情况
+    返回:dict {'pid', 'max_connections', 'timeout', 'pools': {'decoded' / 'raw': {created, in_use, available}}}
+    """
+    pid = os.getpid()
+    with _lock:
+        pools = dict(_pools.get(pid, {}))
+    stats = {}
+    for decode_responses, pool in pools.items():
+        # 队列中的 None 是尚未创建的空位，其余为空闲连接
+        created = len(pool._connections)
+        available = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        stats['decoded' if decode_responses else 'raw'] = {
+            'created': created,
+            'in_use': created - available,
+            'available': available,
+        }
+    return {'pid': pid, 'max_connections': Config.REDIS_POOL_MAX_CONNECTIONS, 'timeout': Config.REDIS_POOL_TIMEOUT,
+            'pools': stats}
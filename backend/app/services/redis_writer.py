@@ -0,0 +1,253 @@
+import pandas as pd
+from ..config import Config
+
+
+def extract_codes(data, name: str = '') -> list:
+    """
+    从拉取结果中取出去重后的股票代码列表
+    data: DataFrame 或 pywencai 返回的 dict
+    name:str 数据名称，仅用于日志
+    返回:list 股票代码列表（已去除空值）；结果为 None、缺少 code 列或类型不支持时返回 None，
+        与“查询有效但没有股票”（空列表）区分，增量同步时据此避免清空线上集合
+    """
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        codes = data.get('code')
+        if codes is None:
+            print(f"{name} 数据格式不正确")
+            return None
+        codes = pd.Series(codes if isinstance(codes, list) else [codes], dtype=object)
+    elif isinstance(data, pd.DataFrame):
+        if 'code' not in data.columns:
+            print(f"{name} 缺少 code 列")
+            return None
+        codes = data['code']
+    else:
+        print(f"{name} 返回数据类型不支持: {type(data)}")
+        return None
+    codes = codes.dropna().astype(str).str.strip()
+    return codes[codes != ''].drop_duplicates().tolist()
+
+
+def bulk_sadd(r, key: str, members, chunk_size: int | None = None) -> dict:
+    """
+    分块批量写入集合（非事务 pipeline，一次往返完成）
+    r:redis.Redis 连接对象
+    key:str 集合键名
+    members: 成员列表
+    chunk_size:int 每条 SADD 携带的成员数，默认取配置
+    返回:dict {'added': 新增数量, 'existing': 已存在数量, 'commands': 命令数}
+    """
+    members = list(dict.fromkeys(members))
+    if not members:
+        return {'added': 0, 'existing': 0, 'commands': 0}
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for i in range(0, len(members), chunk_size):
+        pipe.sadd(key, *members[i:i + chunk_size])
+    results = pipe.execute()
+    added = sum(int(n) for n in results)
+    return {'added': added, 'existing': len(members) - added, 'commands': len(results)}
+
+
+def bulk_sadd_groups(r, groups: dict, chunk_size: int | None = None) -> dict:
+    """
+    批量写入多个集合：所有 SADD 共用一个非事务 pipeline，每满 chunk_size 条命令发送一次
+    r:redis.Redis 连接对象
+    groups:dict 集合键名 -> 成员列表
+    chunk_size:int 每条 SADD 携带的成员数、每次发送的命令数，默认取配置
+    返回:dict {'added': 新增数量, 'existing': 已存在数量, 'commands': 命令数, 'round_trips': 往返次数}
+    """
+    stats = {'added': 0, 'existing': 0, 'commands': 0, 'round_trips': 0}
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    sizes = []
+
+    def flush():
+        results = pipe.execute()
+        added = sum(int(n) for n in results)
+        stats['added'] += added
+        stats['existing'] += sum(sizes) - added
+        stats['commands'] += len(results)
+        stats['round_trips'] += 1
+        sizes.clear()
+
+    for key, members in groups.items():
+        members = list(dict.fromkeys(members))
+        for i in range(0, len(members), chunk_size):
+            chunk = members[i:i + chunk_size]
+            pipe.sadd(key, *chunk)
+            sizes.append(len(chunk))
+            if len(pipe) >= chunk_size:
+                flush()
+    if len(pipe):
+        flush()
+    return stats
+
+def bulk_zadd_groups(r, groups: dict, chunk_size: int | None = None) -> dict:
+    """
+    批量写入多个有序集合：所有 ZADD 共用一个非事务 pipeline，每满 chunk_size 条命令发送一次
+    r:redis.Redis 连接对象
+    groups:dict 有序集合键名 -> {成员: 分值}
+    chunk_size:int 每条 ZADD 携带的成员数、每次发送的命令数，默认取配置
+    返回:dict {'commands': 命令数, 'round_trips': 往返次数}
+    """
+    stats = {'commands': 0, 'round_trips': 0}
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for key, scores in groups.items():
+        items = list(scores.items())
+        for i in range(0, len(items), chunk_size):
+            pipe.zadd(key, dict(items[i:i + chunk_size]))
+            if len(pipe) >= chunk_size:
+                stats['commands'] += len(pipe)
+                stats['round_trips'] += 1
+                pipe.execute()
+    if len(pipe):
+        stats['commands'] += len(pipe)
+        stats['round_trips'] += 1
+        pipe.execute()
+    return stats
+
+def to_frame(data, name: str = ''):
+    """
+    将 pywencai 的返回结果统一转换为 DataFrame
+    - DataFrame：原样返回
+    - dict of DataFrame（多表结果）：取第一个包含 code 列的表
+    - dict of list（如 {'code': [...]}）：按列构造 DataFrame
+    返回:DataFrame，无法识别时返回 None
+    """
+    if data is None:
+        return None
+    if isinstance(data, pd.DataFrame):
+        return data
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, pd.DataFrame) and 'code' in value.columns:
+                return value
+        if data.get('code') is not None:
+            codes = data['code'] if isinstance(data['code'], list) else [data['code']]
+            columns = {k: v for k, v in data.items() if isinstance(v, list) and len(v) == len(codes)}
+            columns['code'] = codes
+            return pd.DataFrame(columns)
+        print(f"{name} 数据格式不正确")
+        return None
+    print(f"{name} 返回数据类型不支持: {type(data)}")
+    return None
+
+
+def pick_column(df, column: str):
+    """
+    在结果中查找列名：优先精确匹配；带日期的列（如 市净率(pb)[20250915]）
+    在日期不一致时按 "[" 之前的部分匹配
+    返回:str 实际列名，找不到时返回 None
+    """
+    if column in df.columns:
+        return column
+    if '[' in column:
+        head = column.split('[', 1)[0] + '['
+        for col in df.columns:
+            if isinstance(col, str) and col.startswith(head):
+                return col
+    return None
+
+
+def select_columns(data, columns: dict, name: str = ''):
+    """
+    一次性选出需要的列，并以股票代码为索引
+    data: 拉取结果（DataFrame 或 dict）
+    columns:dict 源列名 -> 字段名
+    name:str 数据名称，仅用于日志
+    返回:DataFrame 列为字段名、索引为代码（空代码去除、重复代码保留最后一条），无数据时返回 None
+    """
+    df = to_frame(data, name)
+    if df is None or df.empty or 'code' not in df.columns:
+        print(f"{name} 为空")
+        return None
+
+    selected = {}
+    for column, field in columns.items():
+        actual = pick_column(df, column)
+        if actual is None:
+            print(f"{name} 缺少列 {column}")
+            continue
+        selected[field] = df[actual].to_numpy()
+    if not selected:
+        return None
+
+    codes = df['code'].astype(object).where(df['code'].notna(), '').astype(str).str.strip().to_numpy()
+    frame = pd.DataFrame(selected, index=codes)
+    frame = frame[frame.index != '']
+    return frame[~frame.index.duplicated(keep='last')]
+
+
+def bulk_hset(r, key_prefix: str, frame, chunk_size: int | None = None, dropped=()) -> dict:
+    """
+    按列批量写入哈希：每个代码一条 HSET（包含全部字段），分块通过非事务 pipeline 发送
+    r:redis.Redis 连接对象
+    key_prefix:str 哈希键前缀，如 'v3:code:'，完整键为 key_prefix + code
+    frame:DataFrame select_columns() 的结果；空值写为 'nan'
+    chunk_size:int 每个 pipeline 携带的命令数，默认取配置
+    dropped:iterable 增量更新时已不在结果中的代码，在同一 pipeline 中 HDEL 本次的字段；
+        字段全部删除后 Redis 自动删除该哈希
+    返回:dict {'written': 写入代码数, 'dropped': 删除字段的代码数, 'commands': 命令数, 'round_trips': 往返次数}
+    """
+    stats = {'written': 0, 'dropped': 0, 'commands': 0, 'round_trips': 0}
+    dropped = list(dropped)
+    if frame is None or (frame.empty and not dropped):
+        return stats
+    frame = frame.astype(object).where(frame.notna(), 'nan')
+
+    fields = list(frame.columns)
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for code, values in zip(frame.index.tolist(), frame.to_numpy().tolist()):
+        pipe.hset(f"{key_prefix}{code}", mapping=dict(zip(fields, values)))
+        if len(pipe) >= chunk_size:
+            stats['commands'] += len(pipe)
+            stats['round_trips'] += 1
+            pipe.execute()
+    for code in dropped:
+        pipe.hdel(f"{key_prefix}{code}", *fields)
+        if len(pipe) >= chunk_size:
+            stats['commands'] += len(pipe)
+            stats['round_trips'] += 1
+            pipe.execute()
+    if len(pipe):
+        stats['commands'] += len(pipe)
+        stats['round_trips'] += 1
+        pipe.execute()
+    stats['written'] = len(frame)
+    stats['dropped'] = len(dropped)
+    return stats
+
+
+def sync_set(r, key: str, members, chunk_size: int | None = None) -> dict:
+    """
+    增量同步集合：与线上集合做差集，只发送需要新增/删除的成员
+    r:redis.Redis 连接对象
+    key:str 集合键名
+    members: 新的完整成员列表
+    chunk_size:int 每条 SADD/SREM 携带的成员数，默认取配置
+    返回:dict {'added': 新增数量, 'removed': 删除数量, 'kept': 未变化数量, 'commands': 命令数}
+    """
+    current = r.smembers(key)
+    target = set(members)
+    to_add = list(target - current)
+    to_remove = list(current - target)
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for i in range(0, len(to_add), chunk_size):
+        pipe.sadd(key, *to_add[i:i + chunk_size])
+    for i in range(0, len(to_remove), chunk_size):
+        pipe.srem(key, *to_remove[i:i + chunk_size])
+    commands = len(pipe) + 1
+    if len(pipe):
+        pipe.execute()
+    return {
+        'added': len(to_add),
+        'removed': len(to_remove),
+        'kept': len(target & current),
+        'commands': commands,
+    }
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+from ..config import Config
+from .fetch_pool import throttle
+
+
+def cache_dir(trade_date: str) -> Path:
+    """某个交易日的缓存目录，如 backend/data/cache/20250915/"""
+    return Path(Config.RESPONSE_CACHE_DIR) / str(trade_date)
+
+
+def cache_path(source: str, query: str, trade_date: str) -> Path:
+    """
+    缓存文件路径（不含扩展名），以数据源、查询语句和交易日为键
+    source:str 数据源，如 pywencai / tushare
+    query:str 查询语句或接口名+参数
+    trade_date:str 交易日 YYYYMMDD
+    """
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    return cache_dir(trade_date) / f"{source}_{digest}"
+
+
+def read_cache(source: str, query: str, trade_date: str):
+    """读取缓存，未命中或读取失败返回 None"""
+    path = cache_path(source, query, trade_date)
+    try:
+        if path.with_suffix('.parquet').exists():
+            return pd.read_parquet(path.with_suffix('.parquet'))
+        if path.with_suffix('.pkl').exists():
+            return pd.read_pickle(path.with_suffix('.pkl'))
+    except Exception as e:
+        print(f"读取缓存 {query} 失败: {e}")
+    return None
+
+
+def write_cache(source: str, query: str, trade_date: str, df) -> None:
+    """
+    写入缓存：优先 Parquet；列类型混杂无法写 Parquet 时退回 pickle
+    先写临时文件再原子替换，避免并发读取到半个文件
+    """
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return
+    path = cache_path(source, query, trade_date)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        try:
+            df.to_parquet(tmp)
+            os.replace(tmp, path.with_suffix('.parquet'))
+        except Exception:
+            df.to_pickle(tmp)
+            os.replace(tmp, path.with_suffix('.pkl'))
+    except Exception as e:
+        print(f"写入缓存 {query} 失败: {e}")
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def cached_fetch(source: str, query: str, trade_date: str | None, fetch):
+    """
+    带本地缓存的拉取：命中缓存直接读盘，否则按数据源限速后调用 fetch 并把 DataFrame 结果写入缓存
+    （命中缓存不占用限速，全部命中的重跑不会被 PYWENCAI_RATE_LIMIT 拖慢）
+    source:str 数据源
+    query:str 缓存键（查询语句）
+    trade_date:str 交易日，默认今天
+    fetch: 无参数的远程拉取函数
+    """
+    if not Config.RESPONSE_CACHE_ENABLED:
+        throttle()
+        return fetch()
+    trade_date = trade_date or time.strftime('%Y%m%d')
+    cached = read_cache(source, query, trade_date)
+    if cached is not None:
+        return cached
+    throttle()
+    data = fetch()
+    write_cache(source, query, trade_date, data)
+    return data
+
+
+def prune_cache(retention_days: int | None = None) -> int:
+    """
+    删除超过保留天数的交易日缓存目录
+    retention_days:int 保留天数，默认取 Config.RESPONSE_CACHE_RETENTION_DAYS
+    返回:int 删除的目录数量
+    """
+    retention_days = Config.RESPONSE_CACHE_RETENTION_DAYS if retention_days is None else retention_days
+    root = Path(Config.RESPONSE_CACHE_DIR)
+    if not root.exists():
+        return 0
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y%m%d')
+    removed = 0
+    for child in root.iterdir():
+        if child.is_dir() and child.name.isdigit() and child.name < cutoff:
+            shutil.rmtree(child, ignore_errors=True)
+            removed += 1
+    if removed:
+        print(f"清理 {removed} 个过期缓存目录")
+    return removed
@@ -0,0 +1,263 @@
+import threading
+import time
+
+import numpy as np
+from ..config import Config
+from .data_service import connect_redis
+from .universe_snapshot import (NAME_COLUMN, THEMES_COLUMN, SNAPSHOT_LATEST_KEY, load_snapshot, load_theme_details,
+                                latest_snapshot_date, read_snapshot_sources)
+from .keyspace import version_pointer
+from .hot_reload import register_handler, current_versions
+
+# 没有快照时多久后再尝试加载（秒）
+RELOAD_RETRY_SECONDS = 60
+
+
+class ScreenEngine:
+    """
+    进程内筛选引擎：把当日全市场快照加载为 NumPy 数组
+    - masks：每个因子/指标/题材一列布尔数组，键为 factor:{因子} / zhibiao:{指标} / theme:{题材}
+    - metrics：code:{代码} 哈希中的数值字段（已换算为展示单位），缺失为 NaN
+    - theme_details：题材 -> {代码: 题材明细}
+    - sources：快照构建时读取的 data / theme 版本，与当前生效版本不一致时不再使用（见 get_engine）
+    筛选时只做布尔数组按位与和花式索引，不访问 Redis
+    """
+
+    def __init__(self, frame, theme_details=None, trade_date: str | None = None, version: str | None = None,
+                 sources: dict | None = None):
+        self.trade_date = trade_date
+        self.version = version or trade_date
+        self.sources = sources or {}
+        self.codes = frame.index.to_numpy(dtype=object)
+        self.size = len(self.codes)
+        if NAME_COLUMN in frame.columns:
+            self.names = frame[NAME_COLUMN].fillna('').to_numpy(dtype=object)
+        else:
+            self.names = np.full(self.size, '', dtype=object)
+
+        self.masks = {}
+        self.metrics = {}
+        for column in frame.columns:
+            if column in (NAME_COLUMN, THEMES_COLUMN):
+                continue
+            series = frame[column]
+            if series.dtype == bool:
+                self.masks[column] = series.to_numpy()
+            else:
+                self.metrics[column] = series.to_numpy(dtype=float)
+
+        self.theme_details = {}
+        if theme_details is not None:
+            for row in theme_details.itertuples(index=False):
+                self.theme_details.setdefault(row.theme, {})[row.code] = {
+                    'desc': row.desc,
+                    'theme': row.theme,
+                    'name': row.name,
+                    'hot_num': row.hot_num,
+                    'trade_date': row.trade_date,
+                }
+
+    @classmethod
+    def from_snapshot(cls, snapshot_id: str | None = None, r=None, sources: dict | None = None):
+        """
+        从快照文件构建引擎
+        snapshot_id:str 快照标识 {交易日}:{生成时间} 或交易日，默认最新
+        sources:dict 快照构建时读取的版本（read_snapshot_sources）
+        返回:ScreenEngine，没有快照时返回 None
+        """
+        trade_date = snapshot_id.split(':', 1)[0] if snapshot_id else latest_snapshot_date(r)
+        if not trade_date:
+            return None
+        frame = load_snapshot(trade_date)
+        if frame is None:
+            return None
+        return cls(frame, load_theme_details(trade_date), trade_date, snapshot_id, sources)
+
+    def is_current(self, versions: dict) -> bool:
+        """
+        快照是否基于当前生效的 data / theme 版本
+        versions:dict 数据集 -> 当前版本（None 表示未版本化）
+        返回:bool 没有记录构建版本的快照视为已过期
+        """
+        if not self.sources:
+            return False
+        return all(self.sources.get(dataset) == _version_str(versions.get(dataset)) for dataset in ('data', 'theme'))
+
+    def select(self, keys: list) -> np.ndarray:
+        """
+        多个集合求交
+        keys:list 集合键名（不含版本前缀），如 ['factor:MACD_金叉', 'theme:机器人']
+        返回:ndarray 命中的行号；任一集合不存在时为空（与 SINTER 一致）
+        """
+        if not keys:
+            return np.empty(0, dtype=np.int64)
+        mask = None
+        for key in keys:
+            current = self.masks.get(key)
+            if current is None:
+                return np.empty(0, dtype=np.int64)
+            mask = current.copy() if mask is None else np.logical_and(mask, current, out=mask)
+        return np.flatnonzero(mask)
+
+    def codes_of(self, rows: np.ndarray) -> list:
+        """行号 -> 股票代码列表"""
+        return self.codes[rows].tolist()
+
+    def names_of(self, rows: np.ndarray) -> list:
+        """行号 -> 股票简称列表（缺失为 None）"""
+        return [name or None for name in self.names[rows].tolist()]
+
+    def values_of(self, field: str, rows: np.ndarray) -> list | None:
+        """
+        行号 -> 数值字段列表
+        返回:list 缺失的数值为 None（不当作 0）；字段不存在时返回 None
+        """
+        values = self.metrics.get(field)
+        if values is None:
+            return None
+        values = values[rows]
+        return np.where(np.isnan(values), None, values).tolist()
+
+    def theme_detail(self, theme: str, code: str) -> dict | None:
+        """题材-个股明细，不存在时返回 None"""
+        return self.theme_details.get(theme, {}).get(code)
+
+
+def _version_str(version) -> str:
+    """版本号统一为字符串比较，未版本化为 ''"""
+    return '' if version is None else str(version)
+
+
+# 当前进程的引擎实例
+_engine = None
+_engine_lock = threading.Lock()
+_last_attempt = 0.0
+_schedule_lock = threading.Lock()
+
+
+def _active_versions() -> dict | None:
+    """
+    当前生效的 data / theme 版本：监听线程已对齐版本时直接使用（不访问 Redis），否则读取版本指针
+    返回:dict，Redis 不可用时返回 None
+    """
+    versions = current_versions()
+    if 'data' in versions and 'theme' in versions:
+        return versions
+    try:
+        r = connect_redis()
+        try:
+            data, theme = r.mget(version_pointer('data'), version_pointer('theme'))
+        finally:
+            r.close()
+        return {'data': data, 'theme': theme}
+    except Exception:
+        return None
+
+
+def _schedule_reload() -> None:
+    """在后台线程中加载最新快照（间隔 RELOAD_RETRY_SECONDS），请求线程不等待加载"""
+    global _last_attempt
+    with _schedule_lock:
+        if time.time() - _last_attempt < RELOAD_RETRY_SECONDS:
+            return
+        _last_attempt = time.time()
+    threading.Thread(target=reload_engine, name='screen-engine-reload', daemon=True).start()
+
+
+def get_engine():
+    """
+    获取当前进程的筛选引擎，从不阻塞请求线程：
+    - 尚未加载时在后台加载最新快照，本次返回 None
+    - 快照基于的 data / theme 版本不是当前生效版本时（如单独刷新了题材），返回 None 并在后台尝试加载新快照
+    返回:ScreenEngine，未启用、没有快照或快照已过期时返回 None（调用方回退到 Redis）
+    """
+    if not Config.SCREEN_ENGINE_ENABLED:
+        return None
+    engine = _engine
+    if engine is None:
+        _schedule_reload()
+        return None
+    versions = _active_versions()
+    if versions is not None and not engine.is_current(versions):
+        _schedule_reload()
+        return None
+    return engine
+
+
+def _latest_snapshot_id():
+    """读取 meta:snapshot:latest，Redis 不可用时返回 None（改为按快照目录查找）"""
+    try:
+        r = connect_redis()
+        try:
+            return r.get(SNAPSHOT_LATEST_KEY)
+        finally:
+            r.close()
+    except Exception:
+        return None
+
+
+def _snapshot_sources(snapshot_id) -> dict:
+    """读取快照构建时的版本，Redis 不可用时返回 {}（引擎视为已过期）"""
+    try:
+        r = connect_redis()
+        try:
+            return read_snapshot_sources(r, snapshot_id)
+        finally:
+            r.close()
+    except Exception:
+        return {}
+
+
+def reload_engine(snapshot_id: str | None = None):
+    """
+    从快照构建新引擎，构建完成后原子替换当前引擎；进行中的请求继续使用旧引擎
+    snapshot_id:str 快照标识，默认最新
+    返回:ScreenEngine 当前引擎（加载失败时保留旧引擎）
+    """
+    global _engine, _last_attempt
+    snapshot_id = snapshot_id or _latest_snapshot_id()
+    with _engine_lock:
+        if _engine is not None and snapshot_id and _engine.version == snapshot_id:
+            return _engine
+        _last_attempt = time.time()
+        try:
+            engine = ScreenEngine.from_snapshot(snapshot_id, sources=_snapshot_sources(snapshot_id))
+        except Exception as e:
+            print(f"加载筛选引擎失败: {e}")
+            return _engine
+        if engine is not None:
+            _engine = engine
+            print(f"筛选引擎已加载快照 {engine.version}：{engine.size} 只股票，{len(engine.masks)} 个集合")
+        return _engine
+
+
+def preload_engine() -> None:
+    """在后台线程中预加载引擎，避免首个请求承担加载耗时"""
+    if Config.SCREEN_ENGINE_ENABLED:
+        threading.Thread(target=reload_engine, name='screen-engine-preload', daemon=True).start()
+
+
+def _on_snapshot(snapshot_id) -> None:
+    """新快照发布后在监听线程中加载并替换引擎"""
+    if not Config.SCREEN_ENGINE_ENABLED:
+        return
+    engine = reload_engine(str(snapshot_id))
+    if engine is None or engine.version != str(snapshot_id):
+        raise RuntimeError(f"快照 {snapshot_id} 加载失败")
+
+
+def _source_handler(dataset: str):
+    """
+    data / theme 版本切换：新版本记录到 current_versions 后，基于旧版本的快照不再使用（get_engine 回退到 Redis），
+    直到基于新版本的快照发布并加载
+    """
+    def _on_version(version) -> None:
+        engine = _engine
+        if Config.SCREEN_ENGINE_ENABLED and engine is not None and engine.sources.get(dataset) != _version_str(version):
+            print(f"{dataset} 已切换到版本 {version}，快照 {engine.version} 已过期，筛选回退到 Redis")
+    return _on_version
+
+
+register_handler('snapshot', _on_snapshot)
+register_handler('data', _source_handler('data'))
+register_handler('theme', _source_handler('theme'))
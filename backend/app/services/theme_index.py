@@ -0,0 +1,372 @@
+import json
+
+import pandas as pd
+
+# 题材统计（均位于题材版本前缀下，如 tv5:theme:stats）
+# 哈希：题材名 -> {"stock_count", "max_hot_num", "total_hot_num"}
+THEME_STATS_KEY = 'theme:stats'
+# 有序集合：题材名，分值为最大热度值 / 总热度值
+THEME_RANK_MAX_KEY = 'theme:rank:max'
+THEME_RANK_TOTAL_KEY = 'theme:rank:total'
+# 反向索引：集合 code:themes:{代码} -> 该股票所属题材名
+CODE_THEMES_PREFIX = 'code:themes:'
+# 题材名索引：有序集合（分值均为 0，按字典序排列，用于前缀查询）
+THEME_NAMES_KEY = 'theme:names'
+# 题材名倒排索引：集合 theme:gram:{单字或相邻两字} -> 包含该片段的题材名（用于子串查询）
+THEME_GRAM_PREFIX = 'theme:gram:'
+# 题材成分股排序：有序集合 theme:heat:{题材}（分值为热度值）、theme:codes:{题材}（分值均为 0，按代码字典序）
+THEME_HEAT_PREFIX = 'theme:heat:'
+THEME_CODES_PREFIX = 'theme:codes:'
+# 题材级字段：哈希 theme:meta:{题材}，保存同一题材内所有成分股取值相同的字段，
+# theme:detail:{题材}:{代码} 只保留个股自己的字段，读取时合并（明细优先）
+THEME_META_PREFIX = 'theme:meta:'
+THEME_META_FIELDS = ('theme', 'trade_date', 'hot_num', 'desc')
+
+# 成分股分页支持的排序字段
+THEME_PAGE_SORTS = ('hot_num', 'code')
+
+
+def build_theme_stats(frame) -> pd.DataFrame:
+    """
+    向量化计算每个题材的成分股数量、最大热度值、总热度值
+    frame:DataFrame theme_to_redis.build_theme_frame() 的结果
+    返回:DataFrame 以题材名为索引，列为 stock_count, max_hot_num, total_hot_num（整数）
+    """
+    hot_num = pd.to_numeric(frame['hot_num'], errors='coerce').fillna(0).astype('int64')
+    stats = hot_num.groupby(frame['theme']).agg(['size', 'max', 'sum'])
+    stats.columns = ['stock_count', 'max_hot_num', 'total_hot_num']
+    return stats.astype('int64')
+
+
+def write_theme_stats(r, stats: pd.DataFrame, prefix: str = '') -> int:
+    """
+    写入题材统计哈希和按热度排序的有序集合（一次非事务 pipeline）
+    r:redis.Redis 连接对象
+    stats:DataFrame build_theme_stats() 的结果
+    prefix:str 题材版本键前缀
+    返回:int 命令数
+    """
+    if stats.empty:
+        return 0
+    records = stats.to_dict(orient='index')
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(f"{prefix}{THEME_STATS_KEY}", mapping={
+        theme: json.dumps(values, ensure_ascii=False) for theme, values in records.items()
+    })
+    pipe.zadd(f"{prefix}{THEME_RANK_MAX_KEY}", {theme: v['max_hot_num'] for theme, v in records.items()})
+    pipe.zadd(f"{prefix}{THEME_RANK_TOTAL_KEY}", {theme: v['total_hot_num'] for theme, v in records.items()})
+    pipe.execute()
+    return 3
+
+
+def read_theme_stats(r, prefix: str = '', start: int = 0, end: int = -1) -> list:
+    """
+    按最大热度值从高到低读取题材统计：ZREVRANGE theme:rank:max 取出有序的题材名，再 HMGET theme:stats
+    （两次往返，不读取全部统计、不在 Python 中排序；最大热度值相同时按题材名倒序）
+    r:redis.Redis 连接对象
+    prefix:str 题材版本键前缀
+    start/end:int 排名区间（含两端），默认全部
+    返回:list [{name, stock_count, max_hot_num, total_hot_num}]，没有统计时返回空列表
+    """
+    names = r.zrevrange(f"{prefix}{THEME_RANK_MAX_KEY}", start, end)
+    if not names:
+        return []
+    values = r.hmget(f"{prefix}{THEME_STATS_KEY}", names)
+    return [{'name': name, **json.loads(raw)} for name, raw in zip(names, values) if raw]
+
+
+def read_theme_rank(r, prefix: str = '', by: str = 'max', start: int = 0, end: int = -1) -> list:
+    """
+    按热度从高到低读取题材名（ZREVRANGE，O(log N + M)）
+    by:str max 按最大热度值 / total 按总热度值
+    返回:list [(题材名, 热度值)]
+    """
+    key = THEME_RANK_MAX_KEY if by == 'max' else THEME_RANK_TOTAL_KEY
+    return [(name, int(score)) for name, score in r.zrevrange(f"{prefix}{key}", start, end, withscores=True)]
+
+
+def code_themes_groups(frame, prefix: str = '') -> dict:
+    """
+    反向索引的集合内容：{prefix}code:themes:{代码} -> 题材名列表
+    frame:DataFrame theme_to_redis.build_theme_frame() 的结果
+    """
+    groups = frame.groupby('code', sort=False)['theme'].agg(list)
+    return {f"{prefix}{CODE_THEMES_PREFIX}{code}": themes for code, themes in groups.items()}
+
+
+def read_code_themes(r, codes: list, prefix: str = '') -> dict:
+    """
+    批量读取股票所属题材（一次 pipeline）
+    r:redis.Redis 连接对象
+    codes:list 股票代码
+    prefix:str 题材版本键前缀
+    返回:dict 代码 -> 题材名列表（按名称排序）
+    """
+    pipe = r.pipeline(transaction=False)
+    for code in codes:
+        pipe.smembers(f"{prefix}{CODE_THEMES_PREFIX}{code}")
+    return {code: sorted(themes) for code, themes in zip(codes, pipe.execute())}
+
+
+def read_code_theme_details(r, codes: list, prefix: str = '') -> dict:
+    """
+    批量读取股票所属题材的明细：先用反向索引取题材，再一次 pipeline 读取全部 theme:meta / theme:detail 哈希
+    读取量只与这些股票所属的题材数量有关，与题材总数无关
+    r:redis.Redis 连接对象
+    codes:list 股票代码
+    prefix:str 题材版本键前缀
+    返回:dict 代码 -> [{theme, desc, name, hot_num, trade_date, ...}]，按热度值从高到低排序
+    """
+    code_themes = read_code_themes(r, codes, prefix)
+    pairs = [(theme, code) for code, themes in code_themes.items() for theme in themes]
+    details = {code: [] for code in codes}
+    for (theme, code), detail in zip(pairs, read_theme_details(r, pairs, prefix)):
+        details[code].append(detail)
+    for items in details.values():
+        items.sort(key=lambda x: hot_value(x['hot_num']), reverse=True)
+    return details
+
+
+def name_grams(name: str) -> set:
+    """题材名的单字和相邻两字片段，如 '机器人' -> {'机', '器', '人', '机器', '器人'}"""
+    return set(name) | {name[i:i + 2] for i in range(len(name) - 1)}
+
+
+def keyword_grams(keyword: str) -> set:
+    """查询关键字用于求交的片段：单字关键字用单字，否则用全部相邻两字"""
+    if len(keyword) == 1:
+        return {keyword}
+    return {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+
+
+def theme_name_groups(names, prefix: str = '') -> dict:
+    """
+    倒排索引的集合内容：{prefix}theme:gram:{片段} -> 题材名列表
+    names: 题材名列表
+    """
+    groups = {}
+    for name in names:
+        for gram in name_grams(name):
+            groups.setdefault(f"{prefix}{THEME_GRAM_PREFIX}{gram}", []).append(name)
+    return groups
+
+
+def write_theme_names(r, names, prefix: str = '') -> int:
+    """
+    写入题材名有序集合（字典序）
+    返回:int 命令数
+    """
+    names = list(names)
+    if not names:
+        return 0
+    r.zadd(f"{prefix}{THEME_NAMES_KEY}", {name: 0 for name in names})
+    return 1
+
+
+def has_theme_name_index(r, prefix: str = '') -> bool:
+    """当前题材版本是否已建立题材名索引（旧版本数据没有）"""
+    return bool(r.exists(f"{prefix}{THEME_NAMES_KEY}"))
+
+
+def search_theme_names(r, keyword: str = '', prefix: str = '', match: str = 'contains') -> list:
+    """
+    按关键字查询题材名
+    - 空关键字：返回全部题材名
+    - match='prefix'：ZRANGEBYLEX 前缀查询
+    - match='contains'：对关键字的片段求 SINTER，再校验子串（两字片段同时命中不代表连续出现）
+    r:redis.Redis 连接对象
+    keyword:str 关键字
+    prefix:str 题材版本键前缀
+    返回:list 按字典序排序的题材名
+    """
+    keyword = (keyword or '').strip()
+    names_key = f"{prefix}{THEME_NAMES_KEY}"
+    if not keyword:
+        return r.zrange(names_key, 0, -1)
+    if match == 'prefix':
+        encoded = keyword.encode('utf-8')
+        return r.zrangebylex(names_key, b'[' + encoded, b'[' + encoded + b'\xff')
+    grams = [f"{prefix}{THEME_GRAM_PREFIX}{gram}" for gram in keyword_grams(keyword)]
+    candidates = r.sinter(*grams)
+    return sorted(name for name in candidates if keyword in name)
+
+
+def hot_value(value) -> int:
+    """
+    热度值转为整数排序键；空值和无法解析的值（如旧数据中的 'None'）记为 0，与 theme:heat 有序集合一致
+    """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def theme_order_groups(frame, prefix: str = '') -> dict:
+    """
+    成分股排序有序集合的内容：
+    {prefix}theme:heat:{题材} -> {代码: 热度值}，{prefix}theme:codes:{题材} -> {代码: 0}
+    frame:DataFrame theme_to_redis.build_theme_frame() 的结果
+    """
+    hot_num = pd.to_numeric(frame['hot_num'], errors='coerce').fillna(0).astype('int64')
+    groups = {}
+    for theme, group in frame.assign(hot=hot_num).groupby('theme', sort=False):
+        groups[f"{prefix}{THEME_HEAT_PREFIX}{theme}"] = dict(zip(group['code'], group['hot'].tolist()))
+        groups[f"{prefix}{THEME_CODES_PREFIX}{theme}"] = dict.fromkeys(group['code'], 0)
+    return groups
+
+
+def split_theme_details(frame) -> tuple:
+    """
+    拆分题材明细：同一题材内取值唯一的 THEME_META_FIELDS 字段提到题材级，其余字段留在个股明细
+    frame:DataFrame theme_to_redis.build_theme_frame() 的结果
+    返回:tuple (meta, details)
+        meta:dict 题材名 -> 题材级字段
+        details:list [DataFrame]，按留下的列分组，索引为 {题材}:{代码}，可直接交给 bulk_hset
+    """
+    fields = [field for field in THEME_META_FIELDS if field in frame.columns]
+    constant = frame.groupby('theme', sort=False)[fields].nunique() <= 1
+    first = frame.groupby('theme', sort=False)[fields].first()
+    meta = {}
+    themes_by_dropped = {}
+    for theme, row in constant.iterrows():
+        dropped = tuple(field for field in fields if row[field])
+        meta[theme] = {field: first.at[theme, field] for field in dropped}
+        themes_by_dropped.setdefault(dropped, []).append(theme)
+
+    indexed = frame.set_index(frame['theme'] + ':' + frame['code'])
+    details = []
+    for dropped, themes in themes_by_dropped.items():
+        part = indexed[indexed['theme'].isin(themes)]
+        details.append(part.drop(columns=list(dropped)))
+    return meta, details
+
+
+def write_theme_meta(r, meta: dict, prefix: str = '', chunk_size: int = 1000) -> int:
+    """
+    写入 {prefix}theme:meta:{题材} 哈希（分块非事务 pipeline）
+    返回:int 命令数
+    """
+    items = [(theme, values) for theme, values in meta.items() if values]
+    for i in range(0, len(items), chunk_size):
+        pipe = r.pipeline(transaction=False)
+        for theme, values in items[i:i + chunk_size]:
+            pipe.hset(f"{prefix}{THEME_META_PREFIX}{theme}", mapping=values)
+        pipe.execute()
+    return len(items)
+
+
+def merge_theme_detail(meta: dict, detail: dict, theme: str, code: str) -> dict:
+    """
+    合并题材级字段与个股明细（个股明细优先）
+    明细不存在时至少返回 code/theme，并保证 hot_num 字段存在
+    """
+    detail = {**(meta or {}), **detail} if detail else {'code': code, 'theme': theme}
+    detail.setdefault('theme', theme)
+    detail.setdefault('hot_num', '0')
+    return detail
+
+
+def read_theme_meta(r, themes: list, prefix: str = '') -> dict:
+    """
+    批量读取题材级字段（一次 pipeline）
+    返回:dict 题材名 -> 字段，旧版本数据没有 theme:meta 时为空字典
+    """
+    themes = list(dict.fromkeys(themes))
+    pipe = r.pipeline(transaction=False)
+    for theme in themes:
+        pipe.hgetall(f"{prefix}{THEME_META_PREFIX}{theme}")
+    return {theme: values or {} for theme, values in zip(themes, pipe.execute())}
+
+
+def read_theme_details(r, pairs: list, prefix: str = '') -> list:
+    """
+    批量读取题材-个股明细并合并题材级字段：theme:meta 与 theme:detail 在同一个 pipeline 中读取
+    r:redis.Redis 连接对象
+    pairs:list [(题材名, 代码)]
+    prefix:str 题材版本键前缀
+    返回:list 与 pairs 一一对应的明细字典
+    """
+    themes = list(dict.fromkeys(theme for theme, _ in pairs))
+    pipe = r.pipeline(transaction=False)
+    for theme in themes:
+        pipe.hgetall(f"{prefix}{THEME_META_PREFIX}{theme}")
+    for theme, code in pairs:
+        pipe.hgetall(f"{prefix}theme:detail:{theme}:{code}")
+    results = pipe.execute()
+    meta = dict(zip(themes, results[:len(themes)]))
+    return [merge_theme_detail(meta[theme], detail, theme, code)
+            for (theme, code), detail in zip(pairs, results[len(themes):])]
+
+
+def fill_theme_fields(values: list, meta: dict, fields) -> list:
+    """HMGET 结果中缺失的字段用题材级字段补齐（顺序与 fields 一致）"""
+    return [value if value is not None else (meta or {}).get(field) for value, field in zip(values, fields)]
+
+
+def read_theme_detail_fields(r, pairs: list, prefix: str = '', fields=THEME_META_FIELDS) -> list:
+    """
+    批量 HMGET 题材-个股明细的指定字段，缺失字段用题材级字段补齐（一次 pipeline）
+    pairs:list [(题材名, 代码)]
+    返回:list 与 pairs 一一对应的取值列表，顺序与 fields 一致；明细不存在时全部为 None
+    """
+    fields = list(fields)
+    themes = list(dict.fromkeys(theme for theme, _ in pairs))
+    pipe = r.pipeline(transaction=False)
+    for theme in themes:
+        pipe.hgetall(f"{prefix}{THEME_META_PREFIX}{theme}")
+    for theme, code in pairs:
+        # 多读一个 code 字段判断明细是否存在，避免为不属于该题材的股票补出题材级字段
+        pipe.hmget(f"{prefix}theme:detail:{theme}:{code}", 'code', *fields)
+    results = pipe.execute()
+    meta = dict(zip(themes, results[:len(themes)]))
+    out = []
+    for (theme, _), values in zip(pairs, results[len(themes):]):
+        exists, values = values[0] is not None, values[1:]
+        out.append(fill_theme_fields(values, meta[theme], fields) if exists else [None] * len(fields))
+    return out
+
+
+def read_theme_page(r, theme: str, prefix: str = '', sort_by: str = 'hot_num', order: str = 'desc',
+                    offset: int = 0, limit: int = 50) -> dict:
+    """
+    分页读取题材成分股明细：服务端按热度值或代码排序，只读取当前页的明细
+    第一次 pipeline：ZCARD + ZRANGE/ZREVRANGE；第二次 pipeline：题材级字段和当前页的 theme:detail 哈希
+    旧版本题材数据没有排序集合时，退回读取全部明细后在本地排序分页
+    r:redis.Redis 连接对象
+    theme:str 题材名
+    prefix:str 题材版本键前缀
+    sort_by:str hot_num / code
+    order:str desc / asc
+    offset:int 起始位置
+    limit:int 每页数量，None 表示读取到末尾
+    返回:dict {'total': 成分股总数, 'items': [明细]}
+    """
+    if sort_by not in THEME_PAGE_SORTS:
+        raise ValueError(f"不支持的排序字段: {sort_by}")
+    key = f"{prefix}{THEME_HEAT_PREFIX if sort_by == 'hot_num' else THEME_CODES_PREFIX}{theme}"
+    end = -1 if limit is None else offset + limit - 1
+    pipe = r.pipeline(transaction=False)
+    pipe.zcard(key)
+    if order == 'desc':
+        pipe.zrevrange(key, offset, end)
+    else:
+        pipe.zrange(key, offset, end)
+    total, codes = pipe.execute()
+
+    if not total:
+        return _read_theme_page_unindexed(r, theme, prefix, sort_by, order, offset, limit)
+
+    items = read_theme_details(r, [(theme, code) for code in codes], prefix)
+    return {'total': total, 'items': items}
+
+
+def _read_theme_page_unindexed(r, theme: str, prefix: str, sort_by: str, order: str,
+                               offset: int, limit: int | None) -> dict:
+    """没有排序集合时的分页：一次 pipeline 读取全部明细，本地排序后切片"""
+    codes = [code for code in (r.smembers(f"{prefix}theme:{theme}") or set()) if code]
+    items = read_theme_details(r, [(theme, code) for code in codes], prefix)
+    if sort_by == 'hot_num':
+        items.sort(key=lambda x: (hot_value(x['hot_num']), str(x.get('code', ''))), reverse=order == 'desc')
+    else:
+        items.sort(key=lambda x: str(x.get('code', '')), reverse=order == 'desc')
+    return {'total': len(items), 'items': items[offset:None if limit is None else offset + limit]}
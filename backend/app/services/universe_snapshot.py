@@ -0,0 +1,248 @@
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from ..config import Config
+from .factor_buckets import convert_series
+from .keyspace import get_active_prefix, get_active_version, version_prefix, publish_event
+from .theme_index import THEME_GRAM_PREFIX, has_theme_name_index, search_theme_names, read_theme_detail_fields
+
+# 最新快照的标识 {交易日}:{生成时间}，同一交易日重跑时标识也会变化
+SNAPSHOT_LATEST_KEY = 'meta:snapshot:latest'
+# 最新快照构建时读取的数据版本：{'snapshot': 快照标识, 'data': data 版本, 'theme': theme 版本}
+# 读取方据此判断快照是否落后于当前生效版本（如单独刷新题材后）
+SNAPSHOT_SOURCES_KEY = 'meta:snapshot:sources'
+
+# 快照中的非数值列
+NAME_COLUMN = '股票简称'
+THEMES_COLUMN = 'themes'
+
+# 题材明细表的列（theme:detail:{题材}:{代码} 与 theme:meta:{题材} 哈希合并后的字段）
+THEME_DETAIL_FIELDS = ['theme', 'code', 'name', 'desc', 'hot_num', 'trade_date']
+
+
+def snapshot_path(trade_date: str) -> Path:
+    """某个交易日的快照文件，如 backend/data/snapshots/20250915.parquet"""
+    return Path(Config.SNAPSHOT_DIR) / f"{trade_date}.parquet"
+
+
+def theme_details_path(trade_date: str) -> Path:
+    """某个交易日的题材明细文件，如 backend/data/snapshots/20250915_themes.parquet"""
+    return Path(Config.SNAPSHOT_DIR) / f"{trade_date}_themes.parquet"
+
+
+def _scan_sets(r, pattern: str) -> list:
+    """扫描集合类型的键（跳过同前缀下的哈希，如 zhibiao:{指标}:{代码}）"""
+    return sorted(r.scan_iter(match=pattern, count=1000, _type='set'))
+
+
+def _theme_keys(r, theme_prefix: str) -> list:
+    """题材集合键：优先读取题材名索引，旧版本数据退回扫描（排除题材名倒排索引集合）"""
+    if has_theme_name_index(r, theme_prefix):
+        return [f"{theme_prefix}theme:{name}" for name in search_theme_names(r, '', theme_prefix)]
+    keys = _scan_sets(r, f"{theme_prefix}theme:*")
+    return [key for key in keys if not key.startswith(f"{theme_prefix}{THEME_GRAM_PREFIX}")]
+
+
+def _read_sets(r, keys: list) -> list:
+    """分块 pipeline 读取集合成员"""
+    members = []
+    chunk_size = Config.REDIS_WRITE_CHUNK_SIZE
+    for i in range(0, len(keys), chunk_size):
+        pipe = r.pipeline(transaction=False)
+        for key in keys[i:i + chunk_size]:
+            pipe.smembers(key)
+        members.extend(pipe.execute())
+    return members
+
+
+def _read_code_hashes(r, prefix: str) -> pd.DataFrame:
+    """读取全部 code:{代码} 哈希，返回以代码为索引的原始字符串表"""
+    keys = [key for key in r.scan_iter(match=f"{prefix}code:*", count=1000, _type='hash')]
+    rows = {}
+    chunk_size = Config.REDIS_WRITE_CHUNK_SIZE
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        pipe = r.pipeline(transaction=False)
+        for key in chunk:
+            pipe.hgetall(key)
+        for key, values in zip(chunk, pipe.execute()):
+            rows[key[len(f"{prefix}code:"):]] = values
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def build_snapshot(r, prefix: str | None = None, theme_prefix: str | None = None) -> pd.DataFrame:
+    """
+    从 Redis 汇总出一张宽表：每个股票代码一行
+    - 股票简称
+    - code:{代码} 哈希中的数值字段（已换算为展示单位，与 convert_factor_value 一致）
+    - 每个因子/指标一列布尔值，列名为 factor:{因子} / zhibiao:{指标}
+    - 每个题材一列布尔值 theme:{题材}，以及所属题材列表 themes
+    r:redis.Redis 连接对象
+    prefix:str 数据版本键前缀，默认读取当前生效版本
+    theme_prefix:str 题材版本键前缀，默认读取当前生效版本
+    返回:DataFrame 以代码为索引
+    """
+    if prefix is None:
+        prefix = get_active_prefix(r)
+    if theme_prefix is None:
+        theme_prefix = get_active_prefix(r, 'theme')
+
+    hashes = _read_code_hashes(r, prefix)
+    set_keys = _scan_sets(r, f"{prefix}factor:*") + _scan_sets(r, f"{prefix}zhibiao:*")
+    theme_keys = _theme_keys(r, theme_prefix)
+    set_members = _read_sets(r, set_keys)
+    theme_members = _read_sets(r, theme_keys)
+
+    codes = set(hashes.index)
+    for members in set_members + theme_members:
+        codes.update(members)
+    index = pd.Index(sorted(codes), name='code')
+
+    columns = {}
+    if NAME_COLUMN in hashes.columns:
+        columns[NAME_COLUMN] = hashes[NAME_COLUMN].reindex(index).fillna('').astype(str)
+    for field in hashes.columns:
+        if field != NAME_COLUMN:
+            columns[field] = convert_series(field, hashes[field].reindex(index)).to_numpy()
+
+    for key, members in zip(set_keys, set_members):
+        columns[key[len(prefix):]] = index.isin(list(members))
+    theme_columns = [key[len(theme_prefix):] for key in theme_keys]
+    for column, members in zip(theme_columns, theme_members):
+        columns[column] = index.isin(list(members))
+
+    # 所属题材列表，便于直接按行读取
+    theme_names = np.array([column[len('theme:'):] for column in theme_columns], dtype=object)
+    if len(theme_keys):
+        matrix = np.column_stack([columns[column] for column in theme_columns])
+        columns[THEMES_COLUMN] = [theme_names[row].tolist() for row in matrix]
+    else:
+        columns[THEMES_COLUMN] = [[] for _ in range(len(index))]
+
+    return pd.DataFrame(columns, index=index)
+
+
+def build_theme_details(r, theme_prefix: str | None = None) -> pd.DataFrame:
+    """
+    读取全部 theme:detail:{题材}:{代码} 哈希并合并 theme:meta:{题材} 题材级字段，
+    返回长表（每个题材-个股一行，值均为字符串）
+    r:redis.Redis 连接对象
+    theme_prefix:str 题材版本键前缀，默认读取当前生效版本
+    """
+    if theme_prefix is None:
+        theme_prefix = get_active_prefix(r, 'theme')
+    detail_prefix = f"{theme_prefix}theme:detail:"
+    keys = list(r.scan_iter(match=f"{detail_prefix}*", count=1000, _type='hash'))
+    pairs = [tuple(key[len(detail_prefix):].rsplit(':', 1)) for key in keys]
+    rows = []
+    chunk_size = Config.REDIS_WRITE_CHUNK_SIZE
+    for i in range(0, len(pairs), chunk_size):
+        rows.extend(read_theme_detail_fields(r, pairs[i:i + chunk_size], theme_prefix, THEME_DETAIL_FIELDS))
+    frame = pd.DataFrame(rows, columns=THEME_DETAIL_FIELDS, dtype=object)
+    return frame.fillna('')
+
+
+def _write_parquet(frame: pd.DataFrame, path: Path) -> None:
+    """先写临时文件再原子替换，避免读取方读到半个文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        frame.to_parquet(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def write_snapshot(r, trade_date: str | None = None, prefix: str | None = None) -> Path | None:
+    """
+    生成并写入当日快照及题材明细（先写临时文件再原子替换），更新 meta:snapshot:latest、
+    记录构建时读取的 data / theme 版本（meta:snapshot:sources），并广播快照事件
+    r:redis.Redis 连接对象
+    trade_date:str 交易日 YYYYMMDD，默认今天
+    prefix:str 数据版本键前缀，默认读取当前生效版本（指定时不记录 data 版本，读取方视为已过期）
+    返回:Path 快照文件路径，没有数据时返回 None
+    """
+    trade_date = trade_date or datetime.now().strftime('%Y%m%d')
+    # 先固定两个数据集的版本，快照与记录的版本一致
+    data_version = get_active_version(r) if prefix is None else None
+    theme_version = get_active_version(r, 'theme')
+    theme_prefix = version_prefix(theme_version, 'theme')
+    frame = build_snapshot(r, version_prefix(data_version) if prefix is None else prefix, theme_prefix)
+    if frame.empty:
+        print("快照没有数据，跳过写入")
+        return None
+
+    # 题材明细先写，保证 meta:snapshot:latest 指向的快照两份文件都已就绪
+    _write_parquet(build_theme_details(r, theme_prefix), theme_details_path(trade_date))
+    path = snapshot_path(trade_date)
+    _write_parquet(frame, path)
+    snapshot_id = f"{trade_date}:{datetime.now().strftime('%H%M%S')}"
+    pipe = r.pipeline(transaction=True)
+    pipe.set(SNAPSHOT_LATEST_KEY, snapshot_id)
+    pipe.delete(SNAPSHOT_SOURCES_KEY)
+    pipe.hset(SNAPSHOT_SOURCES_KEY, mapping={
+        'snapshot': snapshot_id,
+        'data': '' if data_version is None else data_version,
+        'theme': '' if theme_version is None else theme_version,
+    })
+    pipe.execute()
+    publish_event(r, 'snapshot', snapshot_id)
+    print(f"快照已写入 {path}：{len(frame)} 只股票，{len(frame.columns)} 列")
+    return path
+
+
+def latest_snapshot_date(r=None) -> str | None:
+    """
+    最新快照的交易日：优先读取 meta:snapshot:latest，否则取快照目录中最新的文件
+    """
+    if r is not None:
+        snapshot_id = r.get(SNAPSHOT_LATEST_KEY)
+        trade_date = snapshot_id.split(':', 1)[0] if snapshot_id else None
+        if trade_date and snapshot_path(trade_date).exists():
+            return trade_date
+    root = Path(Config.SNAPSHOT_DIR)
+    if not root.exists():
+        return None
+    dates = sorted(p.stem for p in root.glob('*.parquet') if p.stem.isdigit())
+    return dates[-1] if dates else None
+
+
+def load_snapshot(trade_date: str | None = None, r=None) -> pd.DataFrame | None:
+    """
+    读取快照（内存映射方式打开文件）
+    trade_date:str 交易日，默认最新
+    返回:DataFrame 以代码为索引，没有快照时返回 None
+    """
+    trade_date = trade_date or latest_snapshot_date(r)
+    if not trade_date:
+        return None
+    path = snapshot_path(trade_date)
+    if not path.exists():
+        return None
+    return pd.read_parquet(path, memory_map=True)
+
+
+def read_snapshot_sources(r, snapshot_id: str | None) -> dict:
+    """
+    快照构建时读取的版本
+    返回:dict {'data': 版本, 'theme': 版本}（未记录的版本为 ''）；快照不是最近一次记录的快照时返回 {}
+    """
+    sources = r.hgetall(SNAPSHOT_SOURCES_KEY) if snapshot_id else {}
+    if sources.get('snapshot') != snapshot_id:
+        return {}
+    return {'data': sources.get('data', ''), 'theme': sources.get('theme', '')}
+
+
+def load_theme_details(trade_date: str) -> pd.DataFrame | None:
+    """
+    读取某个交易日的题材明细长表
+    返回:DataFrame 列为 THEME_DETAIL_FIELDS，没有文件时返回 None
+    """
+    path = theme_details_path(trade_date)
+    if not path.exists():
+        return None
+    return pd.read_parquet(path, memory_map=True)
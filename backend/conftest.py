@@ -0,0 +1,21 @@
+# 测试共用的 fixture：每个测试一个独立的 fakeredis 内存服务（测试依赖见 requirements-dev.txt）
+
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def r(redis_server):
+    """解码响应的连接，与 connect_redis() 一致"""
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+@pytest.fixture
+def raw(redis_server):
+    """同一服务上不解码响应的连接，与读取位图时的 connect_redis(decode_responses=False) 一致"""
+    return fakeredis.FakeRedis(server=redis_server)
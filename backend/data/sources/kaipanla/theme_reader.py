@@ -1,22 +1,29 @@
 from ....app.services.data_service import connect_redis
+from ....app.services.keyspace import get_active_prefix
+from ....app.services.theme_index import (THEME_RANK_MAX_KEY, read_theme_rank, has_theme_name_index,
+                                          search_theme_names, read_theme_page, read_theme_detail_fields, hot_value)
 
 
-def get_theme_names(keyword: str = '') -> list:
+def get_theme_names(keyword: str = '', match: str = 'contains') -> list:
     """
-    从 Redis 扫描并返回所有题材主题名称。
-    - 来源键：theme:{theme_name}（Set）
-    - 排除：theme:detail:*（Hash）
-    - 过滤：包含 keyword 的名称
+    返回所有题材主题名称。
+    - 优先使用导入时建立的题材名索引：theme:names（前缀查询）、theme:gram:*（子串查询）
+    - 旧版本题材数据没有索引时，扫描 {题材版本前缀}theme:{theme_name}（Set）
+    - 过滤：包含 keyword 的名称；match='prefix' 时为以 keyword 开头的名称
     返回：按字典序排序的名称列表
     """
     r = connect_redis()
     try:
+        prefix = get_active_prefix(r, 'theme')
+        if has_theme_name_index(r, prefix):
+            return search_theme_names(r, keyword, prefix, match)
         cursor = 0
         names = set()
         kw = (keyword or '').strip()
         while True:
-            cursor, keys = r.scan(cursor=cursor, match='theme:*', count=500)
+            cursor, keys = r.scan(cursor=cursor, match=f'{prefix}theme:*', count=500, _type='set')
             for k in keys:
+                k = k[len(prefix):]
                 if k.startswith('theme:detail:'):
                     continue
                 # 键名：theme:{name}
@@ -24,7 +31,7 @@ def get_theme_names(keyword: str = '') -> list:
                 if len(parts) != 2:
                     continue
                 name = parts[1]
-                if (not kw) or (kw in name):
+                if (not kw) or (name.startswith(kw) if match == 'prefix' else kw in name):
                     names.add(name)
             if cursor == 0:
                 break
@@ -35,21 +42,34 @@ def get_theme_names(keyword: str = '') -> list:
 
 def get_theme_names_with_hot_num(keyword: str = '') -> list:
     """
-    从 Redis 扫描并返回所有题材主题名称及其热度值。
-    - 来源键：theme:{theme_name}（Set）
-    - 排除：theme:detail:*（Hash）
+    返回所有题材主题名称及其热度值。
+    - 有关键字时用题材名索引查出名称，再用 ZMSCORE 从 theme:rank:max 一次取出热度值
+    - 无关键字时直接读取 theme:rank:max 有序集合（已按最大热度值排序）
+    - 旧版本题材数据没有该集合时，扫描 {题材版本前缀}theme:{theme_name}（Set）并读取任一明细的热度值（合并 theme:meta）
     - 过滤：包含 keyword 的名称
     返回：按热度值从高到低排序的主题列表，格式：[{name, hot_num}]
     """
     r = connect_redis()
     try:
-        cursor = 0
-        themes = []
+        prefix = get_active_prefix(r, 'theme')
         kw = (keyword or '').strip()
-        
+        if kw and has_theme_name_index(r, prefix):
+            names = search_theme_names(r, kw, prefix)
+            scores = r.zmscore(f"{prefix}{THEME_RANK_MAX_KEY}", names) if names else []
+            themes = [{'name': name, 'hot_num': int(score or 0)} for name, score in zip(names, scores)]
+            themes.sort(key=lambda x: x['hot_num'], reverse=True)
+            return themes
+
+        ranked = read_theme_rank(r, prefix, 'max')
+        if ranked:
+            return [{'name': name, 'hot_num': hot_num} for name, hot_num in ranked if (not kw) or (kw in name)]
+
+        cursor = 0
+        names = []
         while True:
-            cursor, keys = r.scan(cursor=cursor, match='theme:*', count=500)
+            cursor, keys = r.scan(cursor=cursor, match=f'{prefix}theme:*', count=500, _type='set')
             for k in keys:
+                k = k[len(prefix):]
                 if k.startswith('theme:detail:'):
                     continue
                 # 键名：theme:{name}
@@ -58,23 +78,19 @@ def get_theme_names_with_hot_num(keyword: str = '') -> list:
                     continue
                 name = parts[1]
                 if (not kw) or (kw in name):
-                    # 获取该主题的热度值（从任意一个股票详情中获取）
-                    codes = r.smembers(f"theme:{name}") or set()
-                    hot_num = 0
-                    if codes:
-                        # 取第一个股票代码来获取热度值
-                        first_code = next(iter(codes))
-                        detail_key = f"theme:detail:{name}:{first_code}"
-                        theme_detail = r.hgetall(detail_key) or {}
-                        hot_num = int(theme_detail.get('hot_num', 0))
-                    
-                    themes.append({
-                        'name': name,
-                        'hot_num': hot_num
-                    })
+                    names.append(name)
             if cursor == 0:
                 break
-        
+
+        # 热度值取任一成分股的明细；拆分存储的题材级 hot_num 在 theme:meta 中，由 read_theme_detail_fields 补齐
+        pipe = r.pipeline(transaction=False)
+        for name in names:
+            pipe.srandmember(f"{prefix}theme:{name}")
+        pairs = [(name, code) for name, code in zip(names, pipe.execute() if names else []) if code]
+        hot = {name: hot_value(values[0]) for (name, _), values in
+               zip(pairs, read_theme_detail_fields(r, pairs, prefix, ('hot_num',)))}
+        themes = [{'name': name, 'hot_num': hot.get(name, 0)} for name in names]
+
         # 按热度值从高到低排序
         themes.sort(key=lambda x: x['hot_num'], reverse=True)
         return themes
@@ -88,39 +104,26 @@ def get_theme_codes(theme_name: str) -> list:
         return []
     r = connect_redis()
     try:
-        codes = r.smembers(f"theme:{theme_name}") or set()
+        prefix = get_active_prefix(r, 'theme')
+        codes = r.smembers(f"{prefix}theme:{theme_name}") or set()
         return sorted([c for c in codes if c])
     finally:
         r.close()
 
 
-def get_theme_stock_details(theme_name: str) -> list:
+def get_theme_stock_details(theme_name: str, sort_by: str = 'code', order: str = 'asc',
+                            offset: int = 0, limit: int | None = None) -> list:
     """
     仅读取 theme:detail:{theme_name}:{code} 哈希并返回（不合并 code:{code} 字段）。
+    - 排序在服务端完成（theme:heat:{theme_name} / theme:codes:{theme_name} 有序集合），明细一次 pipeline 读取
+    - 默认按 code 升序返回全部成分股；传入 offset/limit 时只读取该页
     返回：[{ code, name, theme, desc, trade_date, ts_code, con_code, hot_num }]
     """
     if not theme_name:
         return []
     r = connect_redis()
     try:
-        codes = r.smembers(f"theme:{theme_name}") or set()
-        out = []
-        for code in codes:
-            if not code:
-                continue
-            detail_key = f"theme:detail:{theme_name}:{code}"
-            theme_detail = r.hgetall(detail_key) or {}
-            if not theme_detail:
-                # 若明细不存在，至少返回 code 字段
-                theme_detail = {'code': code, 'theme': theme_name, 'hot_num': '0'}
-            # 确保hot_num字段存在，如果不存在则默认为0
-            if 'hot_num' not in theme_detail:
-                theme_detail['hot_num'] = '0'
-            out.append(theme_detail)
-        # 稳定输出顺序：按 code 排序
-        out.sort(key=lambda x: str(x.get('code', '')))
-        return out
+        prefix = get_active_prefix(r, 'theme')
+        return read_theme_page(r, theme_name, prefix, sort_by, order, offset, limit)['items']
     finally:
         r.close()
-
-
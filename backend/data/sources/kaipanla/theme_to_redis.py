@@ -3,13 +3,26 @@ import os
 
 # 使用相对导入或从已配置的PYTHONPATH导入
 # from .token_manager import get_valid_token
+import pandas as pd
 import tushare as ts
 from datetime import datetime, timedelta
 import schedule
+import threading
 import time
 
 # 使用相对导入
 from ....app.services.data_service import connect_redis
+from ....app.services.response_cache import cached_fetch, prune_cache
+from ....app.services.ingest_profiler import IngestProfiler
+from ....app.services.redis_writer import bulk_sadd_groups, bulk_hset, bulk_zadd_groups
+from ....app.services.bitmap_index import bitmap_key, write_bitmaps
+from ....app.services.theme_index import (build_theme_stats, write_theme_stats, code_themes_groups,
+                                          theme_name_groups, write_theme_names, theme_order_groups,
+                                          split_theme_details, write_theme_meta)
+from ....app.services.keyspace import (allocate_version, version_prefix, publish_version, discard_version,
+                                       dated_prefix, dated_index_key, reclaim_dated)
+from ....app.services.fetch_pool import FetchPool
+from ....app.config import Config
 
 def init_tushare():
     """
@@ -19,6 +32,20 @@ def init_tushare():
     pro = ts.pro_api()
     return pro
 
+# 进程内共享的 tushare 客户端
+_pro = None
+_pro_lock = threading.Lock()
+
+def get_tushare_client():
+    """
+    获取进程内共享的 tushare pro_api 客户端（首次调用时初始化，之后复用，可在拉取线程间共享）
+    """
+    global _pro
+    with _pro_lock:
+        if _pro is None:
+            _pro = init_tushare()
+        return _pro
+
 def get_concept_cons(pro, trade_date: str | None = None):
     """
     获取题材成分股数据
@@ -27,95 +54,209 @@ def get_concept_cons(pro, trade_date: str | None = None):
     """
     # 获取昨天的日期
     date = trade_date or (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
-    df = pro.kpl_concept_cons(trade_date=date)
+    df = cached_fetch('tushare', f'kpl_concept_cons:{date}', date, lambda: pro.kpl_concept_cons(trade_date=date))
     return df
 
-def _first_six(code: str) -> str:
-    """提取股票代码前六位（忽略后缀，如 .SZ/.SH/.KP）。"""
-    if not code:
-        return ''
+def _first_six(codes):
+    """提取股票代码前六位（忽略后缀，如 .SZ/.SH/.KP），向量化处理整列。"""
     # 可能是 300651.SZ 或 000233.KP
-    head = code.split('.')[0]
-    return head[:6]
+    codes = codes.fillna('').astype(str).str.strip()
+    return codes.str.split('.').str[0].str[:6]
+
+def _text(df, column: str):
+    """取一列并转换为字符串，缺失列/空值为 ''"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[column].fillna('').astype(str)
+
+def build_theme_frame(df):
+    """
+    将 kpl_concept_cons 结果整理为题材明细表（向量化）
+    tushare 字段示例： name(题材名), con_code, con_name(股票名), desc, trade_date, hot_num
+    返回：DataFrame，列为 code, name, theme, desc, trade_date, con_code, hot_num（均为字符串），
+         去除代码或题材名为空的行，同一题材+个股保留最后一条
+    """
+    frame = pd.DataFrame({
+        'code': _first_six(df['con_code']) if 'con_code' in df.columns else '',
+        'name': _text(df, 'con_name'),
+        'theme': _text(df, 'name').str.strip(),
+        'desc': _text(df, 'desc'),
+        'trade_date': _text(df, 'trade_date'),
+        'con_code': _text(df, 'con_code'),
+    }, index=df.index)
+    # 热度值统一为整数字符串，缺失记为 0
+    hot_num = pd.to_numeric(df['hot_num'], errors='coerce') if 'hot_num' in df.columns else pd.Series(index=df.index, dtype=float)
+    frame['hot_num'] = hot_num.fillna(0).astype('int64').astype(str)
+    frame = frame[(frame['code'] != '') & (frame['theme'] != '')]
+    return frame.drop_duplicates(['theme', 'code'], keep='last')
 
-def theme_to_redis(trade_date: str | None = None):
+def write_themes(r, frame, prefix: str = '', chunk_size: int | None = None) -> dict:
     """
-    将题材数据写入 Redis：
-    - 集合：theme:{题材名} -> 成分股 6 位代码集合
-    - 哈希：theme:detail:{题材名}:{代码} -> { code, name, theme, desc, trade_date, ts_code, con_code }
+    批量写入题材数据，全部通过固定大小的非事务 pipeline 发送
+    - 集合：{prefix}theme:{题材名} -> 成分股 6 位代码集合
+    - 哈希：{prefix}theme:meta:{题材名} -> 题材内取值相同的 { theme, trade_date, hot_num, desc }
+    - 哈希：{prefix}theme:detail:{题材名}:{代码} -> { code, name, con_code } 及题材内取值不同的字段
+    - 位图：{prefix}bm:theme:{题材名}
+    - 统计：{prefix}theme:stats 哈希，{prefix}theme:rank:max / theme:rank:total 有序集合
+    - 反向索引：{prefix}code:themes:{代码} -> 所属题材名集合
+    - 题材名索引：{prefix}theme:names 有序集合（前缀查询）、{prefix}theme:gram:{片段} 倒排集合（子串查询）
+    - 成分股排序：{prefix}theme:heat:{题材名}（按热度值）、{prefix}theme:codes:{题材名}（按代码）有序集合，供分页读取
+    frame:DataFrame build_theme_frame() 的结果
+    prefix:str 题材版本键前缀，如 'tv5:'
+    chunk_size:int 每个 pipeline 携带的命令数，默认取 Config.REDIS_WRITE_CHUNK_SIZE
+    返回：dict 写入统计
     """
-    pro = init_tushare()
-    df = get_concept_cons(pro, trade_date)
-    if df is None or df.empty:
-        return None
+    chunk_size = chunk_size or Config.REDIS_WRITE_CHUNK_SIZE
+    groups = frame.groupby('theme', sort=False)['code'].agg(list)
+
+    # 1) 题材 -> 成分股集合
+    stats = bulk_sadd_groups(r, {f"{prefix}theme:{theme}": codes for theme, codes in groups.items()}, chunk_size)
+
+    # 2) 题材级字段只写一次，题材+个股 -> 个股自己的详情字段
+    meta, detail_frames = split_theme_details(frame)
+    stats['commands'] += write_theme_meta(r, meta, prefix, chunk_size)
+    stats['written'] = 0
+    for details in detail_frames:
+        hset_stats = bulk_hset(r, f"{prefix}theme:detail:", details, chunk_size)
+        stats['written'] += hset_stats['written']
+        stats['commands'] += hset_stats['commands']
+        stats['round_trips'] += hset_stats['round_trips']
+
+    # 3) 题材 -> 成分股位图，供筛选时 BITOP AND 求交集
+    if Config.BITMAP_INDEX_ENABLED:
+        stats['commands'] += write_bitmaps(
+            r, {bitmap_key(prefix, f"theme:{theme}"): codes for theme, codes in groups.items()}, chunk_size
+        )
+
+    # 4) 题材统计（成分股数量、最大/总热度值），题材列表直接读取，无需扫描明细
+    stats['commands'] += write_theme_stats(r, build_theme_stats(frame), prefix)
+
+    # 5) 个股 -> 所属题材反向索引
+    reverse_stats = bulk_sadd_groups(r, code_themes_groups(frame, prefix), chunk_size)
+    stats['commands'] += reverse_stats['commands']
+    stats['round_trips'] += reverse_stats['round_trips']
+
+    # 6) 题材名索引
+    gram_stats = bulk_sadd_groups(r, theme_name_groups(groups.index, prefix), chunk_size)
+    stats['commands'] += gram_stats['commands'] + write_theme_names(r, groups.index, prefix)
+    stats['round_trips'] += gram_stats['round_trips']
 
-    # 删除redis中的数据
-    delete_redis()
+    # 7) 题材成分股排序集合，成分股分页按页读取，不随题材大小变慢
+    order_stats = bulk_zadd_groups(r, theme_order_groups(frame, prefix), chunk_size)
+    stats['commands'] += order_stats['commands']
+    stats['round_trips'] += order_stats['round_trips']
+    stats['themes'] = len(groups)
+    return stats
 
+def theme_to_redis(trade_date: str | None = None, profiler: IngestProfiler | None = None):
+    """
+    将题材数据写入 Redis（见 write_themes）
+    先写入新的暂存版本（tv{N}:theme:*），全部写完后一次性切换题材版本指针，旧版本在后台 UNLINK 回收；
+    写入期间读取方始终看到上一个完整的题材数据
+    profiler:IngestProfiler 由调用方统一保存的性能记录；不传时本函数自行创建并保存
+    """
+    own_profiler = profiler is None
+    profiler = profiler or IngestProfiler()
+    prune_cache()
     r = connect_redis()
 
     try:
-        for _, row in df.iterrows():
-            # tushare 字段示例： name(题材名), con_code, con_name(股票名), desc, trade_date, hot_num
-            con_code = (row.get('con_code') or '')
-            stock_name = (row.get('con_name') or '')
-            theme_name = (row.get('name') or '')
-            description = (row.get('desc') or '')
-            date = (row.get('trade_date') or '')
-            hot_num = (row.get('hot_num') or None)
-
-            code6 = _first_six(con_code)
-            if not code6 or not theme_name:
-                continue
-
-            # 1) 题材 -> 成分股集合
-            r.sadd(f"theme:{theme_name}", code6)
-
-            # 2) 题材+个股 -> 详情哈希
-            r.hset(
-                f"theme:detail:{theme_name}:{code6}",
-                mapping={
-                    'code': code6,
-                    'name': stock_name,
-                    'theme': theme_name,
-                    'desc': description,
-                    'trade_date': str(date),
-                    'con_code': con_code,
-                    'hot_num': str(hot_num),
-                },
-            )
-        print(f"写入 {len(df)} 个键")
+        with profiler.step('theme_to_redis') as metrics:
+            with profiler.timed(metrics, 'upstream_s'):
+                pro = get_tushare_client()
+                df = get_concept_cons(pro, trade_date)
+            if df is None or df.empty:
+                return None
+            metrics['rows'] = len(df)
+            frame = build_theme_frame(df)
+
+            with profiler.timed(metrics, 'redis_s'):
+                version = allocate_version(r, 'theme')
+                try:
+                    stats = write_themes(r, frame, version_prefix(version, 'theme'))
+                except Exception:
+                    discard_version(r, version, 'theme')
+                    raise
+                # 切换版本指针并广播版本事件，Web 进程据此刷新题材缓存
+                publish_version(r, version, 'theme')
+            metrics['members'] = stats['written']
+            metrics['redis_commands'] = stats['commands']
+        print(f"写入 {stats['themes']} 个题材、{stats['written']} 条题材明细，{stats['round_trips']} 次往返")
         return df
     finally:
+        if own_profiler:
+            profiler.save(r)
         r.close()
 
-def delete_redis():
+def trade_dates_between(pro, start: str, end: str) -> list:
     """
-    删除redis中的数据
+    区间内的交易日 YYYYMMDD（升序）：优先读取 tushare 交易日历，失败时退回工作日
     """
-    r = connect_redis()
-
-    prefix = 'theme:'
-
-    # 使用管道批量删除
-    cursor = '0'
-    pipe = r.pipeline()
-    count = 0
+    try:
+        cal = pro.trade_cal(exchange='SSE', start_date=start, end_date=end, is_open='1')
+        if cal is not None and not cal.empty:
+            return sorted(cal['cal_date'].astype(str).tolist())
+    except Exception as e:
+        print(f"读取交易日历失败，按工作日回补: {e}")
+    return [d.strftime('%Y%m%d') for d in pd.bdate_range(start, end)]
 
-    while cursor != 0:
-        cursor, keys = r.scan(cursor=cursor, match=f'{prefix}*')
-        if keys:
-            pipe.delete(*keys)
-            count += len(keys)
+def theme_backfill(start: str, end: str, max_workers: int | None = None, rate_limit: float | None = None,
+                   profiler: IngestProfiler | None = None) -> dict:
+    """
+    回补一段时间的题材历史：并发拉取各交易日的 kpl_concept_cons，按完成顺序写入各自的日期命名空间
+    - 拉取在有界线程池中执行，所有线程共用一个 tushare 客户端，请求速率受 rate_limit 限制
+    - 每个交易日写入 td{交易日}:theme:*（结构与 write_themes 相同），重跑某天时先删除该天旧数据
+    - 已回补的交易日记录在 meta:history:theme 有序集合中
+    - 不影响当前生效的题材版本（tv{N}:）
+    start/end:str 起止日期 YYYYMMDD（含）
+    max_workers:int 并发数，默认取 Config.THEME_BACKFILL_WORKERS
+    rate_limit:float tushare 每秒请求数，默认取 Config.TUSHARE_RATE_LIMIT
+    返回:dict {'written': [交易日], 'empty': [交易日], 'failed': [交易日]}
+    """
+    own_profiler = profiler is None
+    profiler = profiler or IngestProfiler()
+    pro = get_tushare_client()
+    dates = trade_dates_between(pro, start, end)
+    result = {'written': [], 'empty': [], 'failed': []}
+    print(f"回补题材历史 {start} ~ {end}：{len(dates)} 个交易日")
 
-    # 执行所有删除命令
-    pipe.execute()
-    print(f"删除 {count} 个键")
-    r.close()
+    r = connect_redis()
+    rate_limits = {'tushare': Config.TUSHARE_RATE_LIMIT if rate_limit is None else rate_limit}
+    try:
+        with FetchPool(max_workers or Config.THEME_BACKFILL_WORKERS, rate_limits) as pool:
+            for date in dates:
+                pool.submit('tushare', date, get_concept_cons, pro, date)
+            for date, df, error, elapsed in pool.iter_completed():
+                if error is not None:
+                    print(f"拉取 {date} 题材数据失败: {error}")
+                    result['failed'].append(date)
+                    continue
+                if df is None or df.empty:
+                    result['empty'].append(date)
+                    continue
+                with profiler.step(f"theme_backfill({date})", upstream_s=elapsed) as metrics:
+                    metrics['rows'] = len(df)
+                    frame = build_theme_frame(df)
+                    with profiler.timed(metrics, 'redis_s'):
+                        reclaim_dated(r, date)
+                        stats = write_themes(r, frame, dated_prefix(date))
+                        r.zadd(dated_index_key(), {date: int(date)})
+                    metrics['members'] = stats['written']
+                    metrics['redis_commands'] = stats['commands']
+                result['written'].append(date)
+                print(f"{date}：写入 {stats['themes']} 个题材、{stats['written']} 条题材明细")
+        for key in result:
+            result[key].sort()
+        print(f"题材历史回补完成：写入 {len(result['written'])} 天，无数据 {len(result['empty'])} 天，"
+              f"失败 {len(result['failed'])} 天 {result['failed'] or ''}")
+        return result
+    finally:
+        if own_profiler:
+            profiler.save(r)
+        r.close()
 
 if __name__ == '__main__':
     # 执行写入（默认取昨天）
-    # schedule.every().day.at("08:29").do(delete_redis)
     # schedule.every().day.at("08:30").do(theme_to_redis)
     # print("定时器开始启动...")
     # try:
@@ -125,7 +266,6 @@ if __name__ == '__main__':
     # except Exception as e:
     #     print(f"定时器运行失败: {e}")
     # print("定时器结束")
-    # delete_redis()
     theme_to_redis()
     # pro = init_tushare()
     # df = pro.query('daily', ts_code='000001.SZ', start_date='20180701', end_date='20180718')
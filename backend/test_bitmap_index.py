@@ -0,0 +1,56 @@
+# 测试位图编码、ID 字典和位图求交
+
+import numpy as np
+
+from app.services.bitmap_index import (CODE_TO_ID_KEY, ID_TO_CODE_KEY, ID_SEQ_KEY, encode_bitmap, decode_bitmap,
+                                       ensure_ids, write_bitmap, bitmap_intersect, ids_to_codes)
+
+
+def test_encode_decode_round_trip():
+    for ids in ([0], [7], [8], [0, 1, 2, 3, 4, 5, 6, 7], [3, 64, 65, 1000], list(range(0, 5000, 3))):
+        assert decode_bitmap(encode_bitmap(ids)).tolist() == sorted(ids)
+    assert encode_bitmap([]) == b''
+    assert decode_bitmap(b'').size == 0
+    assert decode_bitmap(None).size == 0
+
+
+def test_bit_order_matches_setbit(r, raw):
+    for i in (0, 9, 17):
+        raw.setbit('bits', i, 1)
+    assert raw.get('bits') == encode_bitmap([0, 9, 17])
+    assert decode_bitmap(raw.get('bits')).tolist() == [0, 9, 17]
+
+
+def test_ensure_ids_is_stable(r):
+    first = ensure_ids(r, ['000001', '000002', '000001'])
+    assert sorted(first.values()) == [0, 1]
+    second = ensure_ids(r, ['000003', '000002'])
+    assert second['000002'] == first['000002']
+    assert second['000003'] == 2
+
+
+def test_intersect_matches_sinter(r, raw):
+    sets = {
+        'factor:A': ['000001', '000002', '000003', '600000'],
+        'factor:B': ['000002', '600000', '300750'],
+        'theme:X': ['600000', '000002', '688001'],
+    }
+    for key, codes in sets.items():
+        r.sadd(key, *codes)
+        write_bitmap(r, f"bm:{key}", codes)
+    for keys in (['factor:A'], ['factor:A', 'factor:B'], list(sets)):
+        assert bitmap_intersect(raw, [f"bm:{key}" for key in keys]) == r.sinter(*keys)
+    assert bitmap_intersect(raw, ['bm:factor:A', 'bm:factor:missing']) is None
+
+
+def test_cache_follows_reset_dictionary(r, raw):
+    ids = ensure_ids(r, ['000001', '000002'])
+    assert ids_to_codes(raw, list(ids.values())) == {'000001', '000002'}
+    # 其他进程清空后重新分配：同一个ID对应另一只股票，本进程的缓存不能继续使用旧的映射
+    r.flushall()
+    r.hset(ID_TO_CODE_KEY, mapping={0: '600000'})
+    r.hset(CODE_TO_ID_KEY, mapping={'600000': 0})
+    r.set(ID_SEQ_KEY, 2)
+    raw.set('bm:factor:A', encode_bitmap([0]))
+    assert bitmap_intersect(raw, ['bm:factor:A']) == {'600000'}
+    assert ids_to_codes(raw, np.array([0])) == {'600000'}
@@ -0,0 +1,71 @@
+# 测试基本面、资金面数值在本地划分区间的边界
+
+import pandas as pd
+
+from app.services.factor_buckets import METRIC_BUCKETS, assign_buckets, bucket_factor_names
+
+
+def _bucket_of(groups: dict, code: str):
+    """代码所在的区间因子名称，不在任何区间时返回 None"""
+    found = [name for name, codes in groups.items() if code in codes]
+    assert len(found) <= 1, f"{code} 同时落入多个区间: {found}"
+    return found[0] if found else None
+
+
+def test_edges_are_left_closed():
+    values = pd.Series({'a': 4.99, 'b': 5, 'c': 9.99, 'd': 10, 'e': 20, 'f': -3})
+    groups = assign_buckets('ROE', values)
+    assert _bucket_of(groups, 'a') == 'ROE_小于5'
+    assert _bucket_of(groups, 'b') == 'ROE_5~10'
+    assert _bucket_of(groups, 'c') == 'ROE_5~10'
+    assert _bucket_of(groups, 'd') == 'ROE_10~20'
+    assert _bucket_of(groups, 'e') == 'ROE_大于20'
+    assert _bucket_of(groups, 'f') == 'ROE_小于5'
+
+
+def test_zero_edge_for_loss_and_outflow():
+    # 小额亏损展示为 -0.0 亿，仍属于“亏损”
+    groups = assign_buckets('净利润', pd.Series({'loss': -10000, 'zero': 0, 'gain': 1e8}))
+    assert _bucket_of(groups, 'loss') == '净利润_亏损'
+    assert _bucket_of(groups, 'zero') == '净利润_0~1亿'
+    assert _bucket_of(groups, 'gain') == '净利润_1~3亿'
+
+    groups = assign_buckets('大单净额', pd.Series({'out': -1, 'zero': 0}))
+    assert _bucket_of(groups, 'out') == '大单净额_小于0'
+    assert _bucket_of(groups, 'zero') == '大单净额_0~1000万'
+
+
+def test_edges_use_display_units():
+    # 营业收入按亿元、大单净额按万元划分，按未取整的数值比较边界
+    values = pd.Series({'a': 499999999, 'b': 500000000, 'c': 4.996e8})
+    groups = assign_buckets('营业收入', values)
+    assert _bucket_of(groups, 'a') == '营业收入_小于5亿'
+    assert _bucket_of(groups, 'b') == '营业收入_5~10亿'
+    assert _bucket_of(groups, 'c') == '营业收入_小于5亿'
+
+    groups = assign_buckets('大单净额', pd.Series({'a': 9999999, 'b': 50000000}))
+    assert _bucket_of(groups, 'a') == '大单净额_0~1000万'
+    assert _bucket_of(groups, 'b') == '大单净额_大于5000万'
+
+
+def test_missing_values_are_skipped():
+    values = pd.Series({'a': None, 'b': 'nan', 'c': '--', 'd': '1.2'}, dtype=object)
+    groups = assign_buckets('市净率', values)
+    assert _bucket_of(groups, 'a') is None
+    assert _bucket_of(groups, 'b') is None
+    assert _bucket_of(groups, 'c') is None
+    assert _bucket_of(groups, 'd') == '市净率_1~1.5'
+
+
+def test_every_bucket_is_returned():
+    for field, (_, labels) in METRIC_BUCKETS.items():
+        groups = assign_buckets(field, pd.Series(dtype=float))
+        assert list(groups) == [f"{field}_{label}" for label in labels]
+        assert all(codes == [] for codes in groups.values())
+    assert set(bucket_factor_names(METRIC_BUCKETS)) == {
+        name for field in METRIC_BUCKETS for name in assign_buckets(field, pd.Series(dtype=float))
+    }
+
+
+def test_unknown_field():
+    assert assign_buckets('股票简称', pd.Series({'a': 1})) == {}
@@ -0,0 +1,91 @@
+# 测试区间条件校验、区间集合、按指标排序分页（缺少指标的代码排在最后）和增量写入时移除旧成员
+
+import math
+
+import pandas as pd
+import pytest
+
+from app.services.metric_index import (parse_range_clauses, range_key, read_sorted_page, metric_members,
+                                       write_metrics)
+
+
+@pytest.fixture
+def r(r):
+    """结果集合 6 只股票，其中 000005、000006 没有 ROE"""
+    r.sadd('v1:factor:A', '000001', '000002', '000003', '000004', '000005', '000006')
+    r.zadd('v1:metric:ROE', {'000001': 12.5, '000002': -3, '000003': 30, '000004': 12.5, '000009': 99})
+    return r
+
+
+def test_parse_range_clauses():
+    assert parse_range_clauses([{'metric': 'ROE', 'min': '10', 'max': 20}]) == [('ROE', 10.0, 20.0)]
+    assert parse_range_clauses([{'metric': 'ROE', 'min': 5}]) == [('ROE', 5.0, None)]
+    assert parse_range_clauses([{'metric': 'ROE', 'max': 0}]) == [('ROE', None, 0.0)]
+    assert parse_range_clauses([{'metric': 'ROE', 'min': 3, 'max': 3}]) == [('ROE', 3.0, 3.0)]
+    assert parse_range_clauses([]) == []
+
+
+@pytest.mark.parametrize('clauses', [
+    {'metric': 'ROE', 'min': 1},
+    [{'min': 1}],
+    [{'metric': 'ROE'}],
+    [{'metric': 'ROE', 'min': 'abc'}],
+    [{'metric': 'ROE', 'min': [1]}],
+    [{'metric': 'ROE', 'min': 20, 'max': 10}],
+    [{'metric': 'ROE', 'min': 'nan'}],
+    [{'metric': 'ROE', 'max': math.inf}],
+    [{'metric': 'ROE', 'min': '-inf', 'max': 1}],
+])
+def test_parse_range_clauses_rejects(clauses):
+    with pytest.raises(ValueError):
+        parse_range_clauses(clauses)
+
+
+def test_range_key_is_closed_interval(r):
+    key = range_key(r, 'ROE', 12.5, 30, 'v1:')
+    assert r.smembers(key) == {'000001', '000003', '000004'}
+    assert range_key(r, 'ROE', 12.5, 30, 'v1:') == key
+    assert r.smembers(range_key(r, 'ROE', None, 0, 'v1:')) == {'000002'}
+    assert not r.exists(range_key(r, 'ROE', 200, None, 'v1:'))
+    with pytest.raises(ValueError):
+        range_key(r, 'ROE', 1, 2, 'v2:')
+
+
+def test_sorted_page_puts_missing_metric_last(r):
+    page = read_sorted_page(r, 'v1:factor:A', 'v1:metric:ROE', 'desc', 0, 10)
+    assert page['total'] == 6
+    assert page['codes'][:4] == ['000003', '000004', '000001', '000002']
+    assert sorted(page['codes'][4:]) == ['000005', '000006']
+    assert page['scores'] == [30, 12.5, 12.5, -3, None, None]
+
+    page = read_sorted_page(r, 'v1:factor:A', 'v1:metric:ROE', 'asc', 0, 10)
+    assert page['codes'][:4] == ['000002', '000001', '000004', '000003']
+    assert sorted(page['codes'][4:]) == ['000005', '000006']
+    assert page['scores'][4:] == [None, None]
+
+
+def test_sorted_page_offsets(r):
+    codes = read_sorted_page(r, 'v1:factor:A', 'v1:metric:ROE', 'desc', 0, 10)['codes']
+    pages = [read_sorted_page(r, 'v1:factor:A', 'v1:metric:ROE', 'desc', offset, 4)['codes'] for offset in (0, 4)]
+    assert pages[0] + pages[1] == codes
+    assert read_sorted_page(r, 'v1:factor:A', 'v1:metric:ROE', 'desc', 6, 4)['codes'] == []
+
+
+def test_sorted_page_without_sort_key(r):
+    page = read_sorted_page(r, 'v1:factor:A', None, 'asc', 0, 10)
+    assert page['codes'] == sorted(r.smembers('v1:factor:A'))
+    assert page['scores'] == [None] * 6
+
+
+def test_incremental_write_prunes_stale_members(r):
+    # 000009 退出股票池，000002 本次没有 ROE；000001 分值更新，000007 新增
+    frame = pd.DataFrame({'ROE': [15.0, None, 30, 12.5, 8], '股票简称': list('abcde')},
+                         index=['000001', '000002', '000003', '000004', '000007'])
+    previous = metric_members(r, frame.columns, 'v1:')
+    assert list(previous) == ['v1:metric:ROE']
+    stats = write_metrics(r, frame, 'v1:', previous=previous)
+    assert stats['removed'] == 2
+    assert r.zrange('v1:metric:ROE', 0, -1, withscores=True) == [
+        ('000007', 8), ('000004', 12.5), ('000001', 15), ('000003', 30)]
+    # 全量写入新版本时不传旧成员，不做额外读取
+    assert write_metrics(r, frame, 'v2:')['removed'] == 0
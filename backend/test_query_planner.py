@@ -0,0 +1,69 @@
+# 测试查询计划：按集合大小排序求交、前缀缓存复用和内容纪元
+
+import pytest
+
+from app.services.query_planner import (INTERSECT_CACHE_PREFIX, cache_key, plan_intersection, order_by_cardinality,
+                                        bump_content_epoch)
+
+
+@pytest.fixture
+def r(r):
+    r.sadd('v1:big', *[f"{i:06d}" for i in range(100)])
+    r.sadd('v1:mid', *[f"{i:06d}" for i in range(0, 100, 2)])
+    r.sadd('v1:small', *[f"{i:06d}" for i in range(0, 100, 10)])
+    r.sadd('v1:other', *[f"{i:06d}" for i in range(0, 100, 5)])
+    return r
+
+
+def test_order_by_cardinality(r):
+    ordered, epoch = order_by_cardinality(r, ['v1:big', 'v1:small', 'v1:mid', 'v1:missing'])
+    assert ordered == [('v1:missing', 0), ('v1:small', 10), ('v1:mid', 50), ('v1:big', 100)]
+    assert epoch == ''
+
+
+def test_result_matches_sinter(r):
+    keys = ['v1:big', 'v1:mid', 'v1:small']
+    result = plan_intersection(r, keys)
+    assert result.startswith(INTERSECT_CACHE_PREFIX)
+    assert r.smembers(result) == r.sinter(*keys)
+    assert r.ttl(result) > 0
+
+
+def test_key_order_does_not_matter(r):
+    first = plan_intersection(r, ['v1:big', 'v1:mid', 'v1:small'])
+    assert plan_intersection(r, ['v1:small', 'v1:big', 'v1:mid', 'v1:small']) == first
+    assert first == cache_key(['v1:mid', 'v1:small', 'v1:big'])
+
+
+def test_prefix_steps_are_cached_smallest_first(r):
+    plan_intersection(r, ['v1:big', 'v1:mid', 'v1:small'])
+    # 中间结果按 small ∩ mid、small ∩ mid ∩ big 的顺序缓存
+    assert r.exists(cache_key(['v1:small', 'v1:mid']))
+    assert not r.exists(cache_key(['v1:small', 'v1:big']))
+    # 共享最小两个集合的筛选从已缓存的前缀继续求交（把前缀换成标记集合以确认被复用）
+    step = cache_key(['v1:small', 'v1:mid'])
+    r.delete(step)
+    r.sadd(step, '000000', 'marker')
+    r.sadd('v1:huge', 'marker', *[f"{i:06d}" for i in range(200)])
+    reused = plan_intersection(r, ['v1:huge', 'v1:small', 'v1:mid'])
+    assert r.smembers(reused) == {'000000', 'marker'}
+
+
+def test_single_and_empty(r):
+    assert plan_intersection(r, ['v1:mid']) == 'v1:mid'
+    assert plan_intersection(r, ['v1:mid', 'v1:missing']) is None
+    assert plan_intersection(r, []) is None
+    r.sadd('v1:disjoint', 'x')
+    assert plan_intersection(r, ['v1:mid', 'v1:disjoint']) is None
+
+
+def test_content_epoch_invalidates(r):
+    keys = ['v1:mid', 'v1:small']
+    first = plan_intersection(r, keys)
+    # 增量更新就地修改集合后递增纪元，不再命中修改前的缓存
+    r.srem('v1:small', '000000')
+    assert plan_intersection(r, keys) == first
+    bump_content_epoch(r)
+    second = plan_intersection(r, keys)
+    assert second != first
+    assert r.smembers(second) == r.sinter(*keys)
@@ -0,0 +1,19 @@
+# 测试按列写入哈希，以及增量更新时删除退出股票池的代码
+
+import pandas as pd
+
+from app.services.redis_writer import bulk_hset
+
+
+def test_bulk_hset_writes_and_drops(r):
+    r.hset('v1:code:000001', mapping={'ROE': '1', '净利润': '5'})
+    r.hset('v1:code:000009', mapping={'ROE': '2', '净利润': '6'})
+    r.hset('v1:code:000008', mapping={'ROE': '3'})
+    frame = pd.DataFrame({'ROE': [12.5, None]}, index=['000001', '000002'])
+    stats = bulk_hset(r, 'v1:code:', frame, dropped=['000009', '000008'])
+    assert stats['written'] == 2 and stats['dropped'] == 2
+    assert r.hgetall('v1:code:000001') == {'ROE': '12.5', '净利润': '5'}
+    assert r.hgetall('v1:code:000002') == {'ROE': 'nan'}
+    # 只删除本次写入的字段；字段全部删除后哈希不再存在
+    assert r.hgetall('v1:code:000009') == {'净利润': '6'}
+    assert not r.exists('v1:code:000008')
@@ -0,0 +1,69 @@
+# 测试进程内筛选引擎与 Redis 集合求交的结果一致
+
+import random
+
+import pytest
+
+from app.services.universe_snapshot import build_snapshot
+from app.services.screen_engine import ScreenEngine
+
+CODES = [f"{i:06d}" for i in range(1, 201)]
+SETS = ['factor:MACD_金叉', 'factor:ROE_5~10', 'factor:大单净额_小于0', 'zhibiao:龙头']
+THEMES = ['theme:机器人', 'theme:算力']
+
+
+@pytest.fixture
+def r(r):
+    """在 v1: / tv1: 版本下写入随机的因子、指标、题材集合和 code 哈希"""
+    rnd = random.Random(20250915)
+    for key in SETS:
+        r.sadd(f"v1:{key}", *rnd.sample(CODES, 80))
+    for key in THEMES:
+        r.sadd(f"tv1:{key}", *rnd.sample(CODES, 60))
+    for code in rnd.sample(CODES, 150):
+        r.hset(f"v1:code:{code}", mapping={'股票简称': f"名{code}", 'ROE': rnd.uniform(-10, 30)})
+    return r
+
+
+def _redis_keys(keys: list) -> list:
+    return [f"tv1:{key}" if key.startswith('theme:') else f"v1:{key}" for key in keys]
+
+
+def test_select_matches_sinter(r):
+    engine = ScreenEngine(build_snapshot(r, 'v1:', 'tv1:'))
+    cases = [[key] for key in SETS + THEMES]
+    cases += [SETS[:2], [SETS[0], THEMES[0]], SETS + THEMES[:1], SETS + THEMES]
+    for keys in cases:
+        assert set(engine.codes_of(engine.select(keys))) == r.sinter(*_redis_keys(keys)), keys
+
+
+def test_select_missing_or_empty(r):
+    engine = ScreenEngine(build_snapshot(r, 'v1:', 'tv1:'))
+    assert engine.select([]).size == 0
+    assert engine.select([SETS[0], 'factor:不存在']).size == 0
+    # 求交不能修改引擎中保存的布尔数组
+    before = engine.masks[SETS[0]].sum()
+    engine.select(SETS)
+    assert engine.masks[SETS[0]].sum() == before
+
+
+def test_is_current(r):
+    frame = build_snapshot(r, 'v1:', 'tv1:')
+    engine = ScreenEngine(frame, sources={'data': '1', 'theme': '1'})
+    assert engine.is_current({'data': 1, 'theme': '1'})
+    assert not engine.is_current({'data': 1, 'theme': 2})
+    assert not engine.is_current({'data': None, 'theme': 1})
+    # 没有记录构建版本的快照视为已过期
+    assert not ScreenEngine(frame).is_current({'data': 1, 'theme': 1})
+
+
+def test_missing_metric_is_none(r):
+    engine = ScreenEngine(build_snapshot(r, 'v1:', 'tv1:'))
+    rows = engine.select([SETS[0]])
+    for code, value in zip(engine.codes_of(rows), engine.values_of('ROE', rows)):
+        raw = r.hget(f"v1:code:{code}", 'ROE')
+        # 没有 code 哈希的股票返回 None，不当作 0
+        assert (value is None) == (raw is None), code
+        if raw is not None:
+            assert value == round(float(raw), 2)
+    assert engine.values_of('不存在', rows) is None
@@ -0,0 +1,83 @@
+# 测试题材明细拆分为 theme:meta 与 theme:detail 后能还原，以及按热度排名读取题材统计
+
+import pandas as pd
+
+from app.services.redis_writer import bulk_hset
+from app.services.theme_index import (THEME_META_FIELDS, split_theme_details, merge_theme_detail, write_theme_meta,
+                                      read_theme_details, hot_value, build_theme_stats, write_theme_stats,
+                                      read_theme_stats)
+
+
+def _frame() -> pd.DataFrame:
+    """
+    与 build_theme_frame() 一样全部为字符串
+    机器人：题材级字段全部相同；算力：hot_num 各不相同；芯片：只有一只股票
+    """
+    rows = [
+        ('机器人', '000001', '平安银行', '机器人描述', '300', '20250915'),
+        ('机器人', '000002', '万科A', '机器人描述', '300', '20250915'),
+        ('算力', '000001', '平安银行', '算力描述', '120', '20250915'),
+        ('算力', '600000', '浦发银行', '算力描述', '80', '20250915'),
+        ('芯片', '688001', '华兴源创', '芯片描述', '50', '20250915'),
+    ]
+    return pd.DataFrame(rows, columns=['theme', 'code', 'name', 'desc', 'hot_num', 'trade_date'])
+
+
+def _rows(frame: pd.DataFrame) -> dict:
+    return {(row['theme'], row['code']): row for row in frame.to_dict('records')}
+
+
+def test_split_moves_constant_fields():
+    frame = _frame()
+    meta, details = split_theme_details(frame)
+    assert set(meta['机器人']) == set(THEME_META_FIELDS)
+    assert set(meta['算力']) == {'theme', 'trade_date', 'desc'}
+    assert set(meta['芯片']) == set(THEME_META_FIELDS)
+    # 提到题材级的字段不再出现在明细中；每个题材-个股组合只出现在一个明细分组中
+    for part in details:
+        themes = {index.split(':', 1)[0] for index in part.index}
+        assert all(not set(meta[theme]) & set(part.columns) for theme in themes)
+    assert sorted(index for part in details for index in part.index) == sorted(frame['theme'] + ':' + frame['code'])
+
+
+def test_split_merge_round_trip():
+    frame = _frame()
+    meta, details = split_theme_details(frame)
+    expected = _rows(frame)
+    restored = {}
+    for part in details:
+        for index, detail in zip(part.index, part.to_dict('records')):
+            theme, code = index.split(':', 1)
+            restored[(theme, code)] = merge_theme_detail(meta[theme], detail, theme, code)
+    assert restored == expected
+
+
+def test_redis_round_trip(r):
+    frame = _frame()
+    meta, details = split_theme_details(frame)
+    write_theme_meta(r, meta, 'tv1:')
+    for part in details:
+        bulk_hset(r, 'tv1:theme:detail:', part)
+    expected = _rows(frame)
+    pairs = list(expected)
+    assert dict(zip(pairs, read_theme_details(r, pairs, 'tv1:'))) == expected
+
+
+def test_hot_value():
+    assert hot_value('300') == 300
+    assert hot_value('12.7') == 12
+    assert hot_value(None) == 0
+    assert hot_value('None') == 0
+    assert hot_value('nan') == 0
+
+
+def test_theme_stats_follow_rank(r):
+    write_theme_stats(r, build_theme_stats(_frame()), 'tv1:')
+    themes = read_theme_stats(r, 'tv1:')
+    assert themes == [
+        {'name': '机器人', 'stock_count': 2, 'max_hot_num': 300, 'total_hot_num': 600},
+        {'name': '算力', 'stock_count': 2, 'max_hot_num': 120, 'total_hot_num': 200},
+        {'name': '芯片', 'stock_count': 1, 'max_hot_num': 50, 'total_hot_num': 50},
+    ]
+    assert read_theme_stats(r, 'tv1:', 1, 1) == themes[1:2]
+    assert read_theme_stats(r, 'tv2:') == []
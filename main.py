@@ -19,12 +19,12 @@ if project_root not in sys.path:
 if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 
-def run_daily_update():
+def run_daily_update(incremental=None):
     """运行每日数据更新任务"""
     try:
         from backend.app.models.daily_updater import update_all_data
         print("开始执行每日数据更新任务...")
-        update_all_data()
+        update_all_data(incremental=incremental)
         print("每日数据更新任务执行完成")
     except Exception as e:
         print(f"执行每日数据更新任务失败: {e}")
@@ -43,6 +43,25 @@ def run_theme_update():
         import traceback
         traceback.print_exc()
 
+def run_theme_backfill(argv):
+    """回补一段时间的题材历史数据"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py theme-backfill', description='并发回补题材历史数据')
+    parser.add_argument('--from', dest='start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--to', dest='end', required=True, help='结束日期 YYYYMMDD（含）')
+    parser.add_argument('--workers', type=int, default=None, help='并发数，默认取 THEME_BACKFILL_WORKERS')
+    parser.add_argument('--rate', type=float, default=None, help='tushare 每秒请求数，默认取 TUSHARE_RATE_LIMIT')
+    args = parser.parse_args(argv)
+    try:
+        from backend.data.sources.kaipanla.theme_to_redis import theme_backfill
+        print("开始执行题材历史回补任务...")
+        theme_backfill(args.start, args.end, args.workers, args.rate)
+        print("题材历史回补任务执行完成")
+    except Exception as e:
+        print(f"执行题材历史回补任务失败: {e}")
+        import traceback
+        traceback.print_exc()
+
 def run_web_server():
     """运行Web服务器"""
     try:
@@ -74,14 +93,19 @@ def show_help():
 
 可用命令:
     daily      - 运行每日数据更新任务
+    incremental - 运行每日数据更新任务（因子集合只应用增量）
     theme      - 运行题材数据更新任务
+    theme-backfill --from YYYYMMDD --to YYYYMMDD [--workers N] [--rate R]
+               - 并发回补题材历史数据（写入 td{交易日}: 命名空间）
     server     - 启动Web服务器
     scheduler  - 启动每日定时更新服务
     help       - 显示此帮助信息
 
 示例:
     python main.py daily     # 运行每日数据更新
+    python main.py incremental # 增量更新因子集合
     python main.py theme     # 运行题材数据更新
+    python main.py theme-backfill --from 20250901 --to 20250930 # 回补9月题材历史
     python main.py server    # 启动Web服务器
     python main.py scheduler # 启动每日定时更新服务
     python main.py help      # 显示帮助信息
@@ -97,8 +121,12 @@ if __name__ == "__main__":
     
     if command == "daily":
         run_daily_update()
+    elif command == "incremental":
+        run_daily_update(incremental=True)
     elif command == "theme":
         run_theme_update()
+    elif command == "theme-backfill":
+        run_theme_backfill(sys.argv[2:])
     elif command == "server":
         run_web_server()
     elif command == "scheduler":
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题材明细去重迁移：把 theme:detail:{题材}:{代码} 中题材内取值相同的字段
+（theme / trade_date / hot_num / desc）提到 theme:meta:{题材}，并从明细哈希中删除
+迁移前后输出 Redis 内存占用（INFO memory 的 used_memory）
+
+用法：
+    python scripts/migrate_theme_meta.py            # 迁移当前生效的题材版本
+    python scripts/migrate_theme_meta.py --dry-run  # 只统计，不写入
+"""
+
+import argparse
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+backend_path = os.path.join(project_root, 'backend')
+sys.path.insert(0, project_root)
+sys.path.insert(0, backend_path)
+
+from backend.app.config import Config
+from backend.app.services.data_service import connect_redis
+from backend.app.services.keyspace import get_active_prefix
+from backend.app.services.theme_index import THEME_META_PREFIX, THEME_META_FIELDS
+
+
+def used_memory(r) -> int | None:
+    """Redis 当前内存占用（字节），服务端不支持 INFO 时返回 None"""
+    try:
+        return int(r.info('memory')['used_memory'])
+    except Exception as e:
+        print(f"读取内存占用失败: {e}")
+        return None
+
+
+def format_bytes(size: int | None) -> str:
+    """字节数转为便于阅读的字符串"""
+    if size is None:
+        return '未知'
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def read_details(r, prefix: str) -> dict:
+    """
+    读取全部题材明细
+    返回:dict 题材名 -> {代码: 明细字段}
+    """
+    detail_prefix = f"{prefix}theme:detail:"
+    keys = list(r.scan_iter(match=f"{detail_prefix}*", count=1000, _type='hash'))
+    themes = {}
+    chunk_size = Config.REDIS_WRITE_CHUNK_SIZE
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        pipe = r.pipeline(transaction=False)
+        for key in chunk:
+            pipe.hgetall(key)
+        for key, detail in zip(chunk, pipe.execute()):
+            theme, code = key[len(detail_prefix):].rsplit(':', 1)
+            themes.setdefault(theme, {})[code] = detail
+    return themes
+
+
+def theme_level_fields(details: dict) -> dict:
+    """
+    同一题材内所有明细都存在且取值相同的字段
+    details:dict 代码 -> 明细字段
+    """
+    fields = {}
+    for field in THEME_META_FIELDS:
+        values = {detail.get(field) for detail in details.values()}
+        if len(values) == 1 and None not in values:
+            fields[field] = values.pop()
+    return fields
+
+
+def migrate(r, prefix: str, dry_run: bool = False) -> dict:
+    """
+    先写 theme:meta 再删除明细中的重复字段（读取方合并两者，迁移过程中始终能读到完整明细）
+    返回:dict 迁移统计
+    """
+    stats = {'themes': 0, 'details': 0, 'fields_removed': 0}
+    chunk_size = Config.REDIS_WRITE_CHUNK_SIZE
+    pipe = r.pipeline(transaction=False)
+    for theme, details in read_details(r, prefix).items():
+        meta = theme_level_fields(details)
+        if not meta:
+            continue
+        stats['themes'] += 1
+        stats['details'] += len(details)
+        stats['fields_removed'] += len(meta) * len(details)
+        if dry_run:
+            continue
+        pipe.hset(f"{prefix}{THEME_META_PREFIX}{theme}", mapping=meta)
+        pipe.execute()
+        for code in details:
+            pipe.hdel(f"{prefix}theme:detail:{theme}:{code}", *meta)
+            if len(pipe) >= chunk_size:
+                pipe.execute()
+        pipe.execute()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='题材明细去重迁移（theme:detail -> theme:meta）')
+    parser.add_argument('--dry-run', action='store_true', help='只统计可去重的字段，不写入')
+    args = parser.parse_args()
+
+    r = connect_redis()
+    try:
+        prefix = get_active_prefix(r, 'theme')
+        before = used_memory(r)
+        print(f"题材版本前缀: {prefix or '(无)'}")
+        print(f"迁移前内存: {format_bytes(before)}")
+
+        stats = migrate(r, prefix, args.dry_run)
+        print(f"{'可迁移' if args.dry_run else '已迁移'} {stats['themes']} 个题材，"
+              f"{stats['details']} 条明细，去除 {stats['fields_removed']} 个重复字段")
+
+        if not args.dry_run:
+            after = used_memory(r)
+            saved = before - after if before is not None and after is not None else None
+            print(f"迁移后内存: {format_bytes(after)}（减少 {format_bytes(saved)}）")
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {str(e)}")
+        return 1
+    finally:
+        r.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())